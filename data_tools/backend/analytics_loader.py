@@ -0,0 +1,91 @@
+import pandas as pd
+import os
+from typing import List, Dict, Any, Optional
+
+class AnalyticsLoader:
+    """
+    Reads the Parquet datasets written by the backend's `export_parquet` command:
+
+        <data_dir>/observations/service_date=YYYY-MM-DD/part-0.parquet
+        <data_dir>/delay_history/service_date=YYYY-MM-DD/part-0.parquet
+
+    Trip/route/stop attributes are already denormalized into the rows, so no
+    joins against GTFS are needed. Date filters are pushed down to the
+    partition directories and only the requested columns are read.
+    """
+
+    def __init__(self, data_dir: str):
+        self.data_dir = data_dir
+        self.observations = pd.DataFrame()
+        self.delay_history = pd.DataFrame()
+
+    def load(self, start_date: Optional[str] = None, end_date: Optional[str] = None):
+        """Load both datasets, optionally restricted to a YYYY-MM-DD date range (inclusive)."""
+        for dataset in ("observations", "delay_history"):
+            try:
+                setattr(self, dataset, self._read(dataset, start_date, end_date))
+            except FileNotFoundError as e:
+                print(f"Warning: Could not load analytics dataset {dataset}: {e}")
+
+    def _read(self, dataset: str, start_date: Optional[str], end_date: Optional[str],
+              columns: Optional[List[str]] = None) -> pd.DataFrame:
+        path = os.path.join(self.data_dir, dataset)
+        if not os.path.isdir(path):
+            raise FileNotFoundError(path)
+
+        filters = []
+        if start_date:
+            filters.append(("service_date", ">=", start_date))
+        if end_date:
+            filters.append(("service_date", "<=", end_date))
+
+        df = pd.read_parquet(path, engine="pyarrow", columns=columns, filters=filters or None)
+        if "service_date" in df.columns:
+            # Partition keys come back as categoricals
+            df["service_date"] = df["service_date"].astype(str)
+        return df
+
+    def get_observations(self, route_id: Optional[str] = None, trip_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        if self.observations.empty:
+            return []
+        df = self.observations
+        if route_id:
+            df = df[df["route_id"] == route_id]
+        if trip_id:
+            df = df[df["trip_id"] == trip_id]
+        return df.fillna("").to_dict(orient="records")
+
+    def get_delay_history(self, route_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        if self.delay_history.empty:
+            return []
+        df = self.delay_history
+        if route_id:
+            df = df[df["route_id"] == route_id]
+        return df.to_dict(orient="records")
+
+    def get_route_delay_summary(self, delay_threshold_seconds: int = 300) -> List[Dict[str, Any]]:
+        """
+        Per-route delay statistics over the loaded period:
+        trips analyzed, average delay and share of trips delayed over the threshold.
+        """
+        if self.delay_history.empty:
+            return []
+
+        df = self.delay_history.assign(
+            is_delayed=self.delay_history["avg_delay_seconds"] > delay_threshold_seconds
+        )
+        summary = df.groupby(["route_id", "route_short_name"], observed=True).agg(
+            total_trips_analyzed=("trip_id", "count"),
+            avg_delay_seconds=("avg_delay_seconds", "mean"),
+            pct_trips_delayed=("is_delayed", "mean"),
+        ).reset_index()
+        summary["avg_delay_seconds"] = summary["avg_delay_seconds"].round().astype(int)
+        summary["pct_trips_delayed"] = summary["pct_trips_delayed"].round(2)
+        return summary.sort_values("pct_trips_delayed", ascending=False).to_dict(orient="records")
+
+    def get_stop_observation_counts(self) -> List[Dict[str, Any]]:
+        """Number of observations per stop and type (columnar scan of three columns)."""
+        if self.observations.empty:
+            return []
+        counts = self.observations.groupby(["stop_id", "stop_name", "type"], observed=True).size()
+        return counts.rename("count").reset_index().to_dict(orient="records")
@@ -19,6 +19,8 @@ TRIPS_PER_ROUTE = 10
 START_HOUR = 6
 END_HOUR = 26  # Will create trips up to 02:00 (26:00 in GTFS format)
 FREQUENCY_MINUTES = 30
+# Write one template trip per route plus frequencies.txt instead of every trip
+USE_FREQUENCIES = False
 
 AGENCY_NAME = "Small World Transit"
 AGENCY_TIMEZONE = "Asia/Kolkata"
@@ -123,6 +125,11 @@ class GTFSGenerator:
         st_writer = csv.writer(st_file)
         st_writer.writerow(["trip_id", "arrival_time", "departure_time", "stop_id", "stop_sequence"])
         
+        if USE_FREQUENCIES:
+            freq_file = open(f"{OUTPUT_DIR}/frequencies.txt", "w", newline="")
+            freq_writer = csv.writer(freq_file)
+            freq_writer.writerow(["trip_id", "start_time", "end_time", "headway_secs", "exact_times"])
+        
         trip_counter = 1
         
         for route in self.routes:
@@ -131,6 +138,15 @@ class GTFSGenerator:
             current_minutes = START_HOUR * 60
             end_minutes = END_HOUR * 60
             
+            if USE_FREQUENCIES:
+                # One template trip; frequencies.txt repeats it every FREQUENCY_MINUTES
+                freq_writer.writerow([
+                    f"T_{route['id']}_{trip_counter:04d}",
+                    f"{START_HOUR:02d}:00:00", f"{END_HOUR:02d}:00:00",
+                    FREQUENCY_MINUTES * 60, 1
+                ])
+                end_minutes = current_minutes + 1
+            
             while current_minutes < end_minutes:
                 trip_id = f"T_{route['id']}_{trip_counter:04d}"
                 service_id = "WEEKDAY"
@@ -168,7 +184,11 @@ class GTFSGenerator:
                 
         trips_file.close()
         st_file.close()
-        print("Generated trips.txt and stop_times.txt")
+        if USE_FREQUENCIES:
+            freq_file.close()
+            print("Generated trips.txt, stop_times.txt and frequencies.txt")
+        else:
+            print("Generated trips.txt and stop_times.txt")
 
     def generate_shapes(self):
         print("Generating shapes...")
@@ -0,0 +1,2 @@
+# Standalone benchmarks over synthetic feeds (no database needed).
+# Run from the backend directory, e.g. `python -m benchmarks.bench_trip_matcher`
@@ -0,0 +1,133 @@
+"""
+Benchmark: offline timetable bundles.
+
+Encodes the synthetic city's route and region bundles as build_bundles does
+and compares their size against the same trips as gzipped trip-detail JSON
+(what a client would otherwise download through the API). Checks that every
+bundle decodes back to exactly its trips, and times decoding plus a
+"next departures at a stop" lookup on the decoded data, as a client would.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_bundles [--routes 150] [--lookups 2000]
+"""
+
+import argparse
+import bisect
+import gzip
+import json
+import random
+import time
+
+from benchmarks.synthetic import generate_city, percentile
+from gtfs.utils.time_helpers import seconds_to_gtfs_time
+from gtfs.utils.timetable_bundle import decode_bundle, encode_bundle, group_trips
+
+
+def city_tables(feed):
+    """The synthetic feed as load_feed() returns it."""
+    stops = {stop_id: (f'Stop {stop_id}', lat, lon) for stop_id, (lat, lon) in feed.stops.items()}
+    routes = {}
+    trips = []
+    for trip in feed.trips:
+        routes[trip.route_id] = (trip.route_id, f'Route {trip.route_id}')
+        start = trip.departures[0]
+        trips.append((
+            trip.trip_id, trip.route_id, f'Stop {trip.stop_ids[-1]}', 'WEEKDAY', trip.stop_ids,
+            [arrival - start for arrival in trip.arrivals],
+            [departure - start for departure in trip.departures],
+            start, feed.frequencies.get(trip.trip_id, []),
+        ))
+    return stops, routes, trips
+
+
+def api_json(stops, routes, trips):
+    """Gzipped size of the trips as trip-detail responses."""
+    payloads = []
+    for trip_id, route_id, headsign, _, stop_ids, arrivals, departures, start, _ in trips:
+        payloads.append({
+            'trip_id': trip_id, 'route': route_id, 'route_name': routes[route_id][0], 'headed_to': headsign,
+            'stop_times': [
+                {'stop': stop_id, 'stop_name': stops[stop_id][0], 'stop_lat': stops[stop_id][1],
+                 'stop_lon': stops[stop_id][2], 'stop_sequence': i + 1,
+                 'arrival_seconds': start + arrival, 'departure_seconds': start + departure,
+                 'arrival_time': seconds_to_gtfs_time(start + arrival),
+                 'departure_time': seconds_to_gtfs_time(start + departure)}
+                for i, (stop_id, arrival, departure) in enumerate(zip(stop_ids, arrivals, departures))
+            ],
+        })
+    return len(gzip.compress(json.dumps(payloads).encode()))
+
+
+def departure_index(bundle):
+    """stop_id -> sorted departure seconds, built from a decoded bundle."""
+    index = {}
+    for _, _, _, _, stop_ids, _, departures, start, _ in bundle['trips']:
+        for stop_id, departure in zip(stop_ids, departures):
+            index.setdefault(stop_id, []).append(start + departure)
+    for times in index.values():
+        times.sort()
+    return index
+
+
+def run(num_routes, num_lookups, seed):
+    rng = random.Random(seed)
+    feed = generate_city(num_routes=num_routes, seed=seed)
+    stops, routes, trips = city_tables(feed)
+    by_route, by_region = group_trips(stops, trips)
+    print(f'Feed: {len(stops)} stops, {len(routes)} routes, {len(trips)} trips; '
+          f'{len(by_region)} regions with stops')
+
+    for label, groups in (('route', by_route), ('region', by_region)):
+        start = time.perf_counter()
+        bundles = {key: encode_bundle(1, stops, routes, group) for key, group in groups.items()}
+        encode_seconds = time.perf_counter() - start
+        raw = sum(len(encode_bundle(1, stops, routes, group, compress=False)) for group in groups.values())
+        size = sum(len(data) for data in bundles.values())
+
+        sample = rng.sample(sorted(groups), min(10, len(groups)))
+        json_size = sum(api_json(stops, routes, groups[key]) for key in sample)
+        sample_size = sum(len(bundles[key]) for key in sample)
+
+        mismatches = 0
+        decode_times = []
+        for key, data in bundles.items():
+            start = time.perf_counter()
+            bundle = decode_bundle(data)
+            decode_times.append(time.perf_counter() - start)
+            expected = sorted((trip[0], tuple(trip[4]), tuple(trip[5]), tuple(trip[6]), trip[7]) for trip in groups[key])
+            got = sorted((trip[0], tuple(trip[4]), tuple(trip[5]), tuple(trip[6]), trip[7]) for trip in bundle['trips'])
+            mismatches += expected != got
+        decode_times.sort()
+
+        print(f'{label:>7} bundles: {len(bundles)}, {size / 1e6:.2f} MB ({raw / 1e6:.2f} MB uncompressed), '
+              f'encoded in {encode_seconds:.1f}s')
+        print(f'{"":>9}sample vs gzipped trip-detail JSON: {sample_size / 1e3:.0f} kB vs {json_size / 1e3:.0f} kB '
+              f'({json_size / sample_size:.0f}x smaller)')
+        print(f'{"":>9}decode p50 {percentile(decode_times, 50) * 1000:.1f} ms, '
+              f'p99 {percentile(decode_times, 99) * 1000:.1f} ms; {mismatches} bundles differ from their trips')
+
+    # Client-side lookup on one decoded route bundle
+    bundle = decode_bundle(encode_bundle(1, stops, routes, by_route[sorted(by_route)[0]]))
+    index = departure_index(bundle)
+    stop_ids = sorted(index)
+    lookup_times = []
+    for _ in range(num_lookups):
+        stop_id = rng.choice(stop_ids)
+        now = rng.randrange(5 * 3600, 23 * 3600)
+        start = time.perf_counter()
+        times = index[stop_id]
+        i = bisect.bisect_left(times, now)
+        _ = times[i:i + 5]
+        lookup_times.append(time.perf_counter() - start)
+    lookup_times.sort()
+    print(f'Next-5-departures lookup on a decoded bundle: p50 {percentile(lookup_times, 50) * 1e6:.1f} us, '
+          f'p99 {percentile(lookup_times, 99) * 1e6:.1f} us')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--routes', type=int, default=150)
+    parser.add_argument('--lookups', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+    run(args.routes, args.lookups, args.seed)
@@ -0,0 +1,146 @@
+"""
+Benchmark: per-trip delay fusion, replayed offline.
+
+Simulates trips whose true delay drifts over time (random-walk delay rate),
+and a stream of crowd observations of mixed type:
+- ARRIVED / PASSED / ON_BUS / HEARTBEAT: true delay plus type-dependent noise
+- WAITING: the rider has been at the stop for a while, so "now - scheduled"
+  understates the delay (a lower bound)
+- a share of outliers (wrong trip, wrong stop, stale app state)
+
+The stream is replayed, in time order across all trips, through:
+- latest: the old behaviour, delay = last observation's delay
+- filter: realtime.estimator.DelayEstimator
+
+Accuracy is measured every CHECK_EVERY seconds, i.e. what a rider looking at
+the app would have seen. Throughput is the filter's observe() rate.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_delay_filter [--trips 5000] [--outliers 0.08]
+"""
+
+import argparse
+import heapq
+import math
+import random
+import time
+
+from benchmarks.synthetic import percentile
+from realtime.estimator import DelayEstimator
+
+CHECK_EVERY = 60
+TRIP_DURATION = 3600
+
+# Noise the simulated riders actually produce (std, seconds)
+TYPE_MIX = [
+    ('ARRIVED', 0.20, 25.0),
+    ('PASSED', 0.10, 40.0),
+    ('ON_BUS', 0.15, 60.0),
+    ('HEARTBEAT', 0.25, 80.0),
+    ('WAITING', 0.30, None),
+]
+
+
+def simulate_trip(rng, trip_id, start, mean_gap):
+    """
+    Returns:
+        (true_delay_at(t) callable, list of (t, trip_id, type, measured_delay))
+    """
+    # Piecewise-linear true delay: rate changes every 5 minutes
+    knots = [(start, rng.gauss(60, 150), 0.0)]
+    t, delay, rate = knots[0]
+    while t < start + TRIP_DURATION:
+        rate = max(-0.3, min(0.3, rate + rng.gauss(0, 0.05)))
+        delay += rate * 300
+        t += 300
+        knots.append((t, delay, rate))
+
+    def true_delay(at):
+        i = min(int((at - start) // 300), len(knots) - 2)
+        t0, d0, _ = knots[i]
+        t1, d1, _ = knots[i + 1]
+        return d0 + (d1 - d0) * (at - t0) / (t1 - t0)
+
+    observations = []
+    at = start + rng.expovariate(1.0 / mean_gap)
+    types, weights = [m[0] for m in TYPE_MIX], [m[1] for m in TYPE_MIX]
+    noise = {m[0]: m[2] for m in TYPE_MIX}
+    while at < start + TRIP_DURATION:
+        obs_type = rng.choices(types, weights)[0]
+        truth = true_delay(at)
+        if obs_type == 'WAITING':
+            measured = truth - rng.uniform(0, 600)
+        else:
+            measured = truth + rng.gauss(0, noise[obs_type])
+        observations.append((at, trip_id, obs_type, measured))
+        at += rng.expovariate(1.0 / mean_gap)
+    return true_delay, observations
+
+
+def run(num_trips, mean_gap, outlier_rate, seed):
+    rng = random.Random(seed)
+
+    truths = {}
+    streams = []
+    for n in range(num_trips):
+        trip_id = f'T{n}'
+        start = rng.uniform(0, 12 * 3600)
+        true_delay, observations = simulate_trip(rng, trip_id, start, mean_gap)
+        for i, (at, tid, obs_type, measured) in enumerate(observations):
+            if rng.random() < outlier_rate:
+                observations[i] = (at, tid, obs_type, measured + rng.choice((-1, 1)) * rng.uniform(600, 1800))
+        truths[trip_id] = (start, true_delay)
+        streams.append(observations)
+
+    events = list(heapq.merge(*streams))
+    print(f'{num_trips} trips, {len(events)} observations '
+          f'(mean gap {mean_gap}s, {outlier_rate:.0%} outliers)')
+
+    # Throughput: the filter alone
+    estimator = DelayEstimator()
+    t0 = time.perf_counter()
+    for at, trip_id, obs_type, measured in events:
+        estimator.observe(trip_id, at, measured, obs_type)
+    elapsed = time.perf_counter() - t0
+    print(f'Filter throughput: {len(events) / elapsed:,.0f} observations/s '
+          f'({elapsed / len(events) * 1e6:.1f} us each)')
+
+    # Accuracy: replay per trip, sampling what is shown every CHECK_EVERY seconds
+    estimator = DelayEstimator()
+    errors = {'latest': [], 'filter': []}
+    by_trip = {}
+    for event in events:
+        by_trip.setdefault(event[1], []).append(event)
+
+    for trip_id, observations in by_trip.items():
+        start, true_delay = truths[trip_id]
+        shown = {'latest': None, 'filter': None}
+        i = 0
+        check = math.ceil(observations[0][0] / CHECK_EVERY) * CHECK_EVERY
+        while check < start + TRIP_DURATION:
+            while i < len(observations) and observations[i][0] <= check:
+                at, _, obs_type, measured = observations[i]
+                shown['latest'] = measured
+                shown['filter'] = estimator.observe(trip_id, at, measured, obs_type).delay_seconds
+                i += 1
+            truth = true_delay(check)
+            for name, value in shown.items():
+                errors[name].append(abs(value - truth))
+            check += CHECK_EVERY
+
+    print(f'\nError of the delay shown, sampled every {CHECK_EVERY}s ({len(errors["filter"])} samples):')
+    for name, values in errors.items():
+        values.sort()
+        rmse = math.sqrt(sum(v * v for v in values) / len(values))
+        print(f'  {name:>6}: RMSE {rmse:6.1f}s, median {percentile(values, 50):6.1f}s, '
+              f'p90 {percentile(values, 90):6.1f}s, p99 {percentile(values, 99):7.1f}s')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--trips', type=int, default=5000)
+    parser.add_argument('--mean-gap', type=float, default=120.0, help='Mean seconds between observations of a trip')
+    parser.add_argument('--outliers', type=float, default=0.08, help='Share of grossly wrong observations')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+    run(args.trips, args.mean_gap, args.outliers, args.seed)
@@ -0,0 +1,94 @@
+"""
+Benchmark: streaming NDJSON / CSV exports.
+
+Feeds the synthetic city's stop times (and observation-like rows with
+timestamps) through the export encoders as streaming_export does and
+reports rows per second, bytes, and peak Python memory while streaming
+compared to building the whole body at once.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_exports [--routes 150] [--observations 200000]
+"""
+
+import argparse
+import datetime
+import random
+import time
+import tracemalloc
+
+from benchmarks.synthetic import generate_city
+from gtfs.utils.export import csv_blocks, ndjson_blocks
+
+STOP_TIME_FIELDS = ['trip_id', 'stop_id', 'stop_sequence', 'arrival_seconds', 'departure_seconds']
+OBSERVATION_FIELDS = ['id', 'timestamp', 'user_id', 'type', 'trip_id', 'stop_id', 'lat', 'lon',
+                      'distance_from_trip', 'is_deviation', 'match_score', 'notes']
+
+
+def stop_time_rows(feed):
+    for trip in feed.trips:
+        for sequence, (stop_id, arrival, departure) in enumerate(zip(trip.stop_ids, trip.arrivals, trip.departures)):
+            yield (trip.trip_id, stop_id, sequence + 1, arrival, departure)
+
+
+def observation_rows(feed, count, seed):
+    rng = random.Random(seed)
+    day = datetime.datetime(2026, 10, 17, tzinfo=datetime.timezone.utc)
+    stop_ids = sorted(feed.stops)
+    for i in range(count):
+        trip = feed.trips[rng.randrange(len(feed.trips))]
+        stop_id = rng.choice(stop_ids)
+        lat, lon = feed.stops[stop_id]
+        yield (i + 1, day + datetime.timedelta(seconds=i * 86400 / count), f'user-{rng.randrange(5000)}',
+               'ARRIVED', trip.trip_id, stop_id, lat, lon, rng.random() * 50, False, None, '')
+
+
+def drain(blocks):
+    """Consume a block generator like the WSGI server would; returns bytes sent."""
+    return sum(len(block.encode()) for block in blocks)
+
+
+def measure(make_blocks):
+    """
+    Returns:
+        (seconds, bytes, peak traced memory) - timed without tracemalloc, which slows Python down severalfold
+    """
+    start = time.perf_counter()
+    size = drain(make_blocks())
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    drain(make_blocks())
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, size, peak
+
+
+def run(num_routes, num_observations, seed):
+    feed = generate_city(num_routes=num_routes, seed=seed)
+    num_stop_times = sum(len(trip.stop_ids) for trip in feed.trips)
+    print(f'Stop times: {num_stop_times}, observations: {num_observations}')
+
+    cases = [
+        ('stop_times', STOP_TIME_FIELDS, lambda: stop_time_rows(feed), num_stop_times),
+        ('observations', OBSERVATION_FIELDS, lambda: observation_rows(feed, num_observations, seed), num_observations),
+    ]
+    for name, fields, rows, count in cases:
+        for output, encoder in (('ndjson', ndjson_blocks), ('csv', csv_blocks)):
+            seconds, size, peak = measure(lambda: encoder(fields, rows()))
+            print(f'{name:>12} {output:>6}: {count / seconds:>9,.0f} rows/s, {size / 1e6:>7.1f} MB, '
+                  f'peak memory streaming {peak / 1e6:.1f} MB')
+
+    # The same stop times materialized in one body, as a non-streaming response would
+    tracemalloc.start()
+    body = ''.join(ndjson_blocks(STOP_TIME_FIELDS, list(stop_time_rows(feed))))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f'{"stop_times":>12} ndjson built in memory: peak {peak / 1e6:.1f} MB for a {len(body) / 1e6:.1f} MB body')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--routes', type=int, default=150)
+    parser.add_argument('--observations', type=int, default=200000)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+    run(args.routes, args.observations, args.seed)
@@ -0,0 +1,141 @@
+"""
+Benchmark: feed change sets.
+
+Snapshots the synthetic city as feed_diff.snapshot() would, derives two
+successive "next versions" with typical timetable edits (renamed and
+moved stops, retimed routes, a withdrawn route, a new route), and reports:
+
+- diff time per version
+- gzipped size of the full download vs of /changes since each older version
+- whether applying the collapsed changes to the old copy reproduces the
+  new one exactly
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_feed_diff [--routes 150] [--edits 0.02]
+"""
+
+import argparse
+import copy
+import gzip
+import json
+import random
+import time
+
+from benchmarks.synthetic import generate_city
+from gtfs.utils.feed_diff import ENTITY_FIELDS, collapse, diff
+
+
+def city_snapshot(feed):
+    """The synthetic feed in snapshot() form."""
+    stops = {
+        stop_id: [stop_id, f'Stop {stop_id}', round(lat, 6), round(lon, 6), None, None, '', '']
+        for stop_id, (lat, lon) in feed.stops.items()
+    }
+    routes = {}
+    trips = {}
+    for trip in feed.trips:
+        routes[trip.route_id] = [trip.route_id, trip.route_id, f'Route {trip.route_id}', 'A1']
+        start = trip.departures[0]
+        trips[trip.trip_id] = [
+            trip.trip_id, trip.route_id, 'WEEKDAY', f'Stop {trip.stop_ids[-1]}', trip.shape_id, start,
+            list(trip.stop_ids),
+            [arrival - start for arrival in trip.arrivals],
+            [departure - start for departure in trip.departures],
+            [list(window) for window in feed.frequencies.get(trip.trip_id, [])],
+        ]
+    return {'stop': stops, 'route': routes, 'trip': trips}
+
+
+def next_version(snapshot, edit_fraction, rng, tag):
+    """A copy of `snapshot` with a fraction of stops and routes edited."""
+    new = copy.deepcopy(snapshot)
+    stops, routes, trips = new['stop'], new['route'], new['trip']
+
+    for stop_id in rng.sample(sorted(stops), int(len(stops) * edit_fraction)):
+        if rng.random() < 0.5:
+            stops[stop_id][1] += ' (renamed)'
+        else:
+            stops[stop_id][2] = round(stops[stop_id][2] + 0.0001, 6)
+
+    route_trips = {}
+    for trip_id, values in trips.items():
+        route_trips.setdefault(values[1], []).append(trip_id)
+    edited = rng.sample(sorted(route_trips), max(2, int(len(route_trips) * edit_fraction)))
+    withdrawn, retimed = edited[0], edited[1:]
+
+    del routes[withdrawn]
+    for trip_id in route_trips[withdrawn]:
+        del trips[trip_id]
+    for route_id in retimed:
+        for trip_id in route_trips[route_id]:
+            trips[trip_id][5] += 60
+
+    # A new route reusing the first retimed route's stops
+    template = trips[route_trips[retimed[0]][0]]
+    new_route = f'R_{tag}'
+    routes[new_route] = [new_route, new_route, f'Route {new_route}', 'A1']
+    for n in range(40):
+        trip_id = f'T_{new_route}_{n:04d}'
+        values = copy.deepcopy(template)
+        values[0], values[1], values[5] = trip_id, new_route, 6 * 3600 + n * 900
+        trips[trip_id] = values
+    return new
+
+
+def apply_changes(snapshot, changes):
+    """What a client does with a /changes response."""
+    result = copy.deepcopy(snapshot)
+    for kind, kind_changes in changes.items():
+        entities = result[kind]
+        for values in kind_changes['added'] + kind_changes['updated']:
+            entities[values[0]] = values
+        for entity_id in kind_changes['removed']:
+            del entities[entity_id]
+    return result
+
+
+def gzipped_size(data):
+    return len(gzip.compress(json.dumps(data, separators=(',', ':')).encode()))
+
+
+def full_download(snapshot):
+    """Everything, in the same columnar layout."""
+    return {kind: {'fields': ENTITY_FIELDS[kind], 'rows': list(snapshot[kind].values())} for kind in ENTITY_FIELDS}
+
+
+def run(num_routes, edit_fraction, seed):
+    rng = random.Random(seed)
+    feed = generate_city(num_routes=num_routes, seed=seed)
+    versions = [city_snapshot(feed)]
+    for tag in ('v2', 'v3'):
+        versions.append(next_version(versions[-1], edit_fraction, rng, tag))
+    sizes = ', '.join(f'{len(versions[0][kind])} {kind}s' for kind in ENTITY_FIELDS)
+    print(f'Feed: {sizes}; {edit_fraction:.0%} of stops and routes edited per version')
+
+    change_sets = []
+    for old, new in zip(versions, versions[1:]):
+        start = time.perf_counter()
+        changes = diff(old, new)
+        seconds = time.perf_counter() - start
+        change_sets.append(changes)
+        print(f'Diff v{len(change_sets)} -> v{len(change_sets) + 1}: {len(changes)} changes in {seconds * 1000:.0f} ms')
+
+    full = gzipped_size(full_download(versions[-1]))
+    print(f'{"full download":>18}: {full / 1e3:>8.1f} kB gzipped')
+    for since in range(len(versions) - 1):
+        start = time.perf_counter()
+        changes = collapse(change for change_set in change_sets[since:] for change in change_set)
+        seconds = time.perf_counter() - start
+        size = gzipped_size({'since': since + 1, 'version': len(versions), 'changes': changes})
+        exact = apply_changes(versions[since], changes) == versions[-1]
+        print(f'{f"changes since v{since + 1}":>18}: {size / 1e3:>8.1f} kB gzipped ({full / size:.0f}x smaller), '
+              f'collapse {seconds * 1000:.0f} ms, applied copy {"matches" if exact else "DIFFERS"}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--routes', type=int, default=150)
+    parser.add_argument('--edits', type=float, default=0.02)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+    run(args.routes, args.edits, args.seed)
@@ -0,0 +1,79 @@
+"""
+Benchmark: connection-scan isochrones.
+
+Generates a grid city, builds the connection arrays, saves them as .npy and
+maps them back (as every worker does), then times single-departure
+isochrones and departure-window profiles from random stops.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_isochrone [--routes 150] [--queries 200] [--duration 30] [--window 60]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.synthetic import generate_city, percentile
+from gtfs.routing.csa import ConnectionScan, build_arrays
+from gtfs.routing.timetable import Timetable
+
+
+def report(name, latencies, sizes):
+    latencies.sort()
+    print(f'\n{name}: {len(latencies)} queries, mean {sum(sizes) / len(sizes):.0f} stops reached')
+    print(f'  latency ms: mean {sum(latencies) / len(latencies):.1f}, p50 {percentile(latencies, 50):.1f}, '
+          f'p95 {percentile(latencies, 95):.1f}, p99 {percentile(latencies, 99):.1f}, max {latencies[-1]:.1f}')
+
+
+def run(num_routes, num_queries, duration, window, seed):
+    rng = random.Random(seed)
+
+    feed = generate_city(num_routes=num_routes, seed=seed)
+    tt = Timetable(feed.stops, ((t.trip_id, t.route_id, t.stop_ids, t.arrivals, t.departures) for t in feed.trips))
+
+    t0 = time.perf_counter()
+    arrays = build_arrays(tt)
+    t1 = time.perf_counter()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = os.path.join(tmp, 'v1')
+        ConnectionScan.save(arrays, directory)
+        t2 = time.perf_counter()
+        scan = ConnectionScan.load(directory)
+        t3 = time.perf_counter()
+
+        size_mb = sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory)) / 1e6
+        print(f'Feed: {len(feed.stops)} stops, {len(scan.departures)} connections')
+        print(f'Arrays: build {t1 - t0:.2f}s, save {t2 - t1:.2f}s, mmap load {(t3 - t2) * 1000:.1f}ms, {size_mb:.1f} MB on disk')
+
+        served = [code for code in range(scan.num_stops) if tt.stop_patterns[code]]
+        queries = [(rng.choice(served), rng.randrange(6 * 3600, 20 * 3600)) for _ in range(num_queries)]
+
+        latencies, sizes = [], []
+        for origin, departure in queries:
+            start = time.perf_counter()
+            reached = scan.earliest_arrivals(origin, departure, duration * 60)
+            latencies.append((time.perf_counter() - start) * 1000.0)
+            sizes.append(len(reached))
+        report(f'{duration} min isochrone', latencies, sizes)
+
+        latencies, sizes = [], []
+        for origin, departure in queries[:max(1, num_queries // 5)]:
+            start = time.perf_counter()
+            reached = scan.profile(origin, departure, window * 60, duration * 60)
+            latencies.append((time.perf_counter() - start) * 1000.0)
+            sizes.append(len(reached))
+        report(f'{duration} min isochrone over a {window} min departure window', latencies, sizes)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--routes', type=int, default=150)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--duration', type=int, default=30, help='Travel time budget in minutes')
+    parser.add_argument('--window', type=int, default=60, help='Departure window in minutes for profile queries')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+    run(args.routes, args.queries, args.duration, args.window, args.seed)
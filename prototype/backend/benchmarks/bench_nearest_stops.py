@@ -0,0 +1,91 @@
+"""
+Benchmark: nearest-stops KNN on the in-process grid.
+
+Scatters stops over a city-sized area - half uniformly, half in dense
+clusters around a few centres, as real feeds are - then times
+NearestStopIndex.nearest for random points (inside and just outside the
+area) and checks every answer against a brute-force sort by distance.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_nearest_stops [--stops 50000] [--queries 2000] [--k 10]
+"""
+
+import argparse
+import math
+import random
+import time
+
+from benchmarks.synthetic import percentile
+from gtfs.utils.nearest_stops import NearestStopIndex
+
+CENTER = (19.076, 72.877)
+
+
+def random_stops(num_stops, area_km, rng):
+    dlat = area_km * 1000 / 2 / 111320.0
+    dlon = dlat / math.cos(math.radians(CENTER[0]))
+    centres = [(CENTER[0] + rng.uniform(-dlat, dlat), CENTER[1] + rng.uniform(-dlon, dlon)) for _ in range(20)]
+    stops = []
+    for i in range(num_stops):
+        if i % 2:
+            lat, lon = rng.choice(centres)
+            lat, lon = lat + rng.gauss(0, dlat / 50), lon + rng.gauss(0, dlon / 50)
+        else:
+            lat, lon = CENTER[0] + rng.uniform(-dlat, dlat), CENTER[1] + rng.uniform(-dlon, dlon)
+        stops.append((f'S{i:06d}', f'Stop {i}', None, '', '', lat, lon))
+    return stops, dlat, dlon
+
+
+def brute_force(index, lat, lon, k, max_distance):
+    x, y = index.projection.project(lat, lon)
+    distances = []
+    for code, (px, py) in enumerate(index.points):
+        distance = math.hypot(px - x, py - y)
+        if max_distance is None or distance <= max_distance:
+            distances.append((distance, code))
+    distances.sort()
+    return [index.stops[code].stop_id for _, code in distances[:k]]
+
+
+def run(num_stops, num_queries, k, area_km, num_check, seed):
+    rng = random.Random(seed)
+    stops, dlat, dlon = random_stops(num_stops, area_km, rng)
+
+    start = time.perf_counter()
+    index = NearestStopIndex(stops)
+    print(f'Index: {len(index)} stops, {len(index.grid.cells)} cells - built in {time.perf_counter() - start:.2f}s')
+
+    # 10% of the points lie outside the area, where the search has to expand further
+    points = [
+        (CENTER[0] + rng.uniform(-1.2, 1.2) * dlat, CENTER[1] + rng.uniform(-1.2, 1.2) * dlon)
+        for _ in range(num_queries)
+    ]
+    for label, max_distance in [('k nearest', None), ('within 500 m', 500.0)]:
+        times = []
+        for lat, lon in points:
+            t0 = time.perf_counter()
+            index.nearest(lat, lon, k, max_distance)
+            times.append(time.perf_counter() - t0)
+        times.sort()
+        print(f'{label:>13}: {num_queries} queries  '
+              f'p50 {percentile(times, 50) * 1e6:.0f} us  '
+              f'p99 {percentile(times, 99) * 1e6:.0f} us')
+
+        mismatches = 0
+        for lat, lon in points[:num_check]:
+            got = [stop.stop_id for stop in index.nearest(lat, lon, k, max_distance)]
+            if got != brute_force(index, lat, lon, k, max_distance):
+                mismatches += 1
+        print(f'{"":>13}  checked {min(num_check, num_queries)} against brute force: {mismatches} mismatches')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stops', type=int, default=50000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--area-km', type=float, default=30)
+    parser.add_argument('--check', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+    run(args.stops, args.queries, args.k, args.area_km, args.check, args.seed)
@@ -0,0 +1,69 @@
+"""
+Benchmark: stop pattern deduplication.
+
+Generates a grid city, deduplicates its stop_times into patterns and timings
+(as ingest does) and reports row counts, an estimate of the table size
+before and after, and the cost of expanding everything back in memory.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_patterns [--routes 150]
+"""
+
+import argparse
+import time
+
+from benchmarks.synthetic import generate_city
+from gtfs.utils.patterns import extract_patterns
+
+# Rough PostgreSQL sizes: 24-byte tuple header + 4-byte line pointer per row,
+# plus the columns (and the primary key / unique index entries for StopTime)
+ROW_OVERHEAD = 28
+STOPTIME_ROW = ROW_OVERHEAD + 8 + 24 + 8 + 4 + 4 + 4 + 2 * 40   # id, trip_id, stop_id, 3 ints, 2 index entries
+PATTERNSTOP_ROW = ROW_OVERHEAD + 8 + 8 + 4 + 24 + 4 + 20          # id, pattern, position, stop_id, sequence, index
+TIMING_ROW = ROW_OVERHEAD + 8 + 8 + 2 * 24                         # id, pattern, 2 array headers (+4 bytes per offset)
+TRIP_EXTRA = 8 + 8 + 4                                             # pattern, timing, start_seconds
+
+
+def run(num_routes, seed):
+    feed = generate_city(num_routes=num_routes, seed=seed)
+    trip_stop_times = {
+        trip.trip_id: [
+            (i + 1, stop_id, arrival, departure)
+            for i, (stop_id, arrival, departure) in enumerate(zip(trip.stop_ids, trip.arrivals, trip.departures))
+        ]
+        for trip in feed.trips
+    }
+    num_stop_times = sum(len(rows) for rows in trip_stop_times.values())
+
+    start = time.perf_counter()
+    patterns, timings, trips = extract_patterns(trip_stop_times)
+    extract_seconds = time.perf_counter() - start
+
+    num_pattern_stops = sum(len(stops) for stops in patterns)
+    num_offsets = sum(2 * len(arrivals) for _, arrivals, _ in timings)
+
+    before = num_stop_times * STOPTIME_ROW
+    after = (num_pattern_stops * PATTERNSTOP_ROW + len(timings) * TIMING_ROW + num_offsets * 4
+             + len(trips) * TRIP_EXTRA)
+
+    print(f'Feed: {len(trips)} trips, {num_stop_times} stop times')
+    print(f'Patterns: {len(patterns)} ({num_pattern_stops} pattern stops), {len(timings)} timings '
+          f'- extracted in {extract_seconds:.2f}s')
+    print(f'Estimated storage: {before / 1e6:.1f} MB -> {after / 1e6:.2f} MB ({before / after:.0f}x smaller)')
+
+    # Expansion, as load_schedules does for timetable scans
+    start = time.perf_counter()
+    for _, timing, start_seconds in trips.values():
+        _, arrival_offsets, departure_offsets = timings[timing]
+        [start_seconds + offset for offset in arrival_offsets]
+        [start_seconds + offset for offset in departure_offsets]
+    expand_seconds = time.perf_counter() - start
+    print(f'In-memory expansion of all {num_stop_times} stop times: {expand_seconds:.2f}s')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--routes', type=int, default=150)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+    run(args.routes, args.seed)
@@ -0,0 +1,138 @@
+"""
+Benchmark: RAPTOR journey planning over random origin-destination pairs.
+
+Generates a grid city, builds the Timetable and runs earliest-arrival
+queries between random stops at random times of day. Reports build time,
+query latency (with and without a realtime delay overlay) and how many
+queries found a journey.
+
+--frequencies stores each route direction as one frequency-based template
+trip, expanded lazily by the planner instead of as explicit trips.
+
+--verify N checks N queries against a straightforward connection scan
+(unlimited transfers, no transfer slack) - the arrival of RAPTOR's last
+round must match exactly. Run it at more than one size: --routes 60
+--verify 100 is the one that caught walk -> walk chains within a round.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_raptor [--routes 150] [--queries 1000] [--verify 100] [--frequencies]
+    python -m benchmarks.bench_raptor --routes 60 --verify 100
+"""
+
+import argparse
+import random
+import time
+
+from benchmarks.synthetic import generate_city, percentile
+from gtfs.routing import raptor
+from gtfs.routing.raptor import INF, Raptor
+from gtfs.routing.timetable import Timetable
+
+
+def reference_earliest_arrival(tt, connections, origin, destination, departure):
+    """Connection scan with footpaths; unlimited transfers, no slack."""
+    source, target = tt.stop_index[origin], tt.stop_index[destination]
+    arrival = [INF] * tt.num_stops
+    arrival[source] = departure
+    for other, walk in tt.footpaths[source]:
+        arrival[other] = min(arrival[other], departure + walk)
+
+    boarded = set()
+    for dep, arr, from_stop, to_stop, trip in connections:
+        if dep < departure:
+            continue
+        if dep >= arrival[target]:
+            break
+        if trip in boarded or arrival[from_stop] <= dep:
+            boarded.add(trip)
+            if arr < arrival[to_stop]:
+                arrival[to_stop] = arr
+                for other, walk in tt.footpaths[to_stop]:
+                    if arr + walk < arrival[other]:
+                        arrival[other] = arr + walk
+    return arrival[target]
+
+
+def build_connections(tt):
+    connections = []
+    for p, stops in enumerate(tt.pattern_stops):
+        for t, arrivals in enumerate(tt.pattern_arrivals[p]):
+            for pos in range(len(stops) - 1):
+                connections.append((
+                    tt.pattern_departures[p][pos][t], arrivals[pos + 1], stops[pos], stops[pos + 1], (p, t)
+                ))
+    connections.sort()
+    return connections
+
+
+def run(num_routes, num_queries, verify, seed, frequencies=False):
+    rng = random.Random(seed)
+
+    t0 = time.perf_counter()
+    feed = generate_city(num_routes=num_routes, seed=seed, frequencies=frequencies)
+    t1 = time.perf_counter()
+    tt = Timetable(
+        feed.stops,
+        ((t.trip_id, t.route_id, t.stop_ids, t.arrivals, t.departures) for t in feed.trips),
+        frequencies=feed.frequencies,
+    )
+    t2 = time.perf_counter()
+
+    num_footpaths = sum(len(f) for f in tt.footpaths)
+    print(f'Feed: {len(feed.stops)} stops, {len(feed.trips)} trips (generated in {t1 - t0:.1f}s)')
+    print(f'Timetable build: {t2 - t1:.2f}s, {len(tt.pattern_stops)} patterns, {num_footpaths} footpaths')
+
+    router = Raptor(tt)
+    served = [s for s in tt.stop_ids if tt.stop_patterns[tt.stop_index[s]]]
+    queries = [
+        (rng.choice(served), rng.choice(served), rng.randrange(6 * 3600, 21 * 3600))
+        for _ in range(num_queries)
+    ]
+
+    # Realtime overlay: 10% of trips delayed by up to 10 minutes
+    delays = {t.trip_id: rng.randint(-60, 600) for t in feed.trips if rng.random() < 0.1}
+
+    for name, kwargs in (('scheduled', {}), (f'realtime ({len(delays)} delayed trips)', {'delays': delays})):
+        latencies = []
+        found = 0
+        transfers = 0
+        for origin, destination, departure in queries:
+            start = time.perf_counter()
+            journeys = router.plan(origin, destination, departure, **kwargs)
+            latencies.append((time.perf_counter() - start) * 1000.0)
+            if journeys:
+                found += 1
+                transfers += journeys[-1].transfers
+        latencies.sort()
+        print(f'\n{name}: {num_queries} queries')
+        print(f'  latency ms: mean {sum(latencies) / len(latencies):.1f}, p50 {percentile(latencies, 50):.1f}, '
+              f'p95 {percentile(latencies, 95):.1f}, p99 {percentile(latencies, 99):.1f}, max {latencies[-1]:.1f}')
+        print(f'  journeys found: {found / num_queries:.1%}, '
+              f'mean transfers of fastest: {transfers / max(found, 1):.2f}')
+
+    if verify:
+        connections = build_connections(tt)
+        saved_slack = raptor.MIN_TRANSFER_SECONDS
+        raptor.MIN_TRANSFER_SECONDS = 0
+        mismatches = 0
+        try:
+            for origin, destination, departure in queries[:verify]:
+                journeys = router.plan(origin, destination, departure, max_transfers=20)
+                got = journeys[-1].arrival if journeys else INF
+                expected = reference_earliest_arrival(tt, connections, origin, destination, departure)
+                if got != expected:
+                    mismatches += 1
+        finally:
+            raptor.MIN_TRANSFER_SECONDS = saved_slack
+        print(f'\nVerified {verify} queries against connection scan: {mismatches} mismatches')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--routes', type=int, default=150)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--verify', type=int, default=0)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--frequencies', action='store_true')
+    args = parser.parse_args()
+    run(args.routes, args.queries, args.verify, args.seed, args.frequencies)
@@ -0,0 +1,129 @@
+"""
+Benchmark: shape levels of detail.
+
+Turns the synthetic city's shapes into GPS-traced-looking ones (a point
+every 5 m, gently winding, with jitter), builds every level of detail as
+build_shape_lods does, and compares per level:
+
+- points and response bytes against the raw geometry as GeoJSON
+- serialization time (json.dumps of the GeoJSON coordinates vs of the
+  stored polyline string)
+
+and checks that no raw point is further from its simplified polyline
+(decoded back from the stored string) than the level's tolerance plus the
+polyline rounding.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_shape_lods [--routes 40] [--check 5]
+"""
+
+import argparse
+import json
+import math
+import random
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import generate_city
+from gtfs.utils.shape_lod import LOD_TOLERANCES, build_lods, decode_polyline, level_for_zoom
+from gtfs.utils.spatial_index import LocalProjection
+
+STEP_METERS = 5.0
+WIGGLE_METERS = 15.0
+WIGGLE_WAVELENGTH = 300.0
+JITTER_METERS = 0.5
+ROUNDING_METERS = 1.0   # 5-decimal polyline precision
+
+
+def traced(coords, projection, rng):
+    """Resample a polyline every STEP_METERS, adding a sideways wiggle and GPS jitter."""
+    points = [projection.project(lat, lon) for lat, lon in coords]
+    result = []
+    walked = 0.0
+    for (ax, ay), (bx, by) in zip(points, points[1:]):
+        length = math.hypot(bx - ax, by - ay)
+        if length == 0:
+            continue
+        nx, ny = -(by - ay) / length, (bx - ax) / length
+        for i in range(int(length // STEP_METERS)):
+            d = i * STEP_METERS
+            side = WIGGLE_METERS * math.sin(2 * math.pi * (walked + d) / WIGGLE_WAVELENGTH)
+            x = ax + (bx - ax) * d / length + nx * side + rng.gauss(0, JITTER_METERS)
+            y = ay + (by - ay) * d / length + ny * side + rng.gauss(0, JITTER_METERS)
+            result.append(projection.unproject(x, y))
+        walked += length
+    result.append(coords[-1])
+    return result
+
+
+def max_deviation(coords, simplified, projection):
+    """Largest distance from a raw point to the simplified polyline, in meters."""
+    p = np.array([projection.project(lat, lon) for lat, lon in coords])
+    s = np.array([projection.project(lat, lon) for lat, lon in simplified])
+    worst = 0.0
+    for chunk in np.array_split(p, max(1, len(p) // 500)):
+        a = s[:-1][None, :, :]
+        ab = (s[1:] - s[:-1])[None, :, :]
+        ap = chunk[:, None, :] - a
+        length_sq = np.maximum((ab ** 2).sum(axis=2), 1e-12)
+        t = np.clip((ap * ab).sum(axis=2) / length_sq, 0.0, 1.0)
+        d = np.hypot(ap[..., 0] - t * ab[..., 0], ap[..., 1] - t * ab[..., 1]).min(axis=1)
+        worst = max(worst, float(d.max()))
+    return worst
+
+
+def run(num_routes, num_check, seed):
+    rng = random.Random(seed)
+    feed = generate_city(num_routes=num_routes, seed=seed)
+    projection = LocalProjection.around(feed.stops.values())
+    shapes = {shape_id: traced(coords, projection, rng) for shape_id, coords in feed.shapes.items()}
+    raw_points = sum(len(coords) for coords in shapes.values())
+    print(f'Shapes: {len(shapes)}, {raw_points} points ({raw_points / len(shapes):.0f} per shape)')
+
+    start = time.perf_counter()
+    lods = {shape_id: build_lods(coords) for shape_id, coords in shapes.items()}
+    print(f'Built {len(LOD_TOLERANCES)} levels per shape in {time.perf_counter() - start:.2f}s')
+
+    # Raw geometry as the GeoJSON a serializer would emit
+    start = time.perf_counter()
+    geojson_bytes = sum(
+        len(json.dumps({'type': 'LineString', 'coordinates': [[lon, lat] for lat, lon in coords]}))
+        for coords in shapes.values()
+    )
+    geojson_seconds = time.perf_counter() - start
+    print(f'{"raw GeoJSON":>16}: {raw_points:>8} points {geojson_bytes / 1e6:>8.2f} MB  '
+          f'serialize {geojson_seconds * 1000:.1f} ms')
+
+    zooms = {}
+    for zoom in range(8, 19):
+        zooms.setdefault(level_for_zoom(zoom), []).append(zoom)
+
+    for level, tolerance in enumerate(LOD_TOLERANCES):
+        polylines = [shape_lods[level][3] for shape_lods in lods.values()]
+        points = sum(shape_lods[level][2] for shape_lods in lods.values())
+        start = time.perf_counter()
+        size = sum(len(json.dumps({'polyline': polyline})) for polyline in polylines)
+        seconds = time.perf_counter() - start
+        zoom_range = zooms.get(level)
+        label = f'z{zoom_range[0]}-{zoom_range[-1]}' if zoom_range else 'unused'
+        print(f'{f"level {level} ({tolerance:g} m)":>16}: {points:>8} points {size / 1e6:>8.3f} MB  '
+              f'serialize {seconds * 1000:.1f} ms  ({geojson_bytes / size:.0f}x smaller, {label})')
+
+    violations = 0
+    for shape_id in rng.sample(sorted(shapes), min(num_check, len(shapes))):
+        for level, tolerance, _, polyline in lods[shape_id]:
+            deviation = max_deviation(shapes[shape_id], decode_polyline(polyline), projection)
+            if deviation > tolerance + ROUNDING_METERS:
+                violations += 1
+    print(f'Checked {min(num_check, len(shapes))} shapes x {len(LOD_TOLERANCES)} levels: '
+          f'{violations} exceed tolerance + rounding')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--routes', type=int, default=40)
+    parser.add_argument('--check', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+    run(args.routes, args.check, args.seed)
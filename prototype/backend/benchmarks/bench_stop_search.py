@@ -0,0 +1,132 @@
+"""
+Benchmark: stop search / autocomplete.
+
+Builds a StopSearchIndex over synthetic stops named like a real city
+("Koramangala 5th Block", "Indiranagar Metro", ...), with same-name pairs on
+opposite sides of the road grouped into stations, then replays autocomplete
+sessions - every prefix of a stop name as it is typed, plus misspelt
+queries - with and without a user position and reports latency percentiles.
+
+The index's text scores are checked against the plain-Python ranking
+functions (the ones search_db re-ranks with) on a sample of queries.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_stop_search [--stops 50000] [--sessions 500] [--check 50]
+"""
+
+import argparse
+import math
+import random
+import time
+
+from benchmarks.synthetic import percentile
+from gtfs.utils.stop_search import (
+    SIMILARITY_THRESHOLD, StopSearchIndex, normalize, prefix_bonus, similarity,
+)
+
+CENTER = (12.9716, 77.5946)
+AREA_KM = 40
+SYLLABLES = ['ko', 'ra', 'man', 'ga', 'la', 'in', 'di', 'na', 'gar', 'ja', 'ya', 'pu', 'ram', 'ha', 'li',
+             'ba', 'sa', 'va', 'ne', 'hal', 'li', 'ka', 'tte', 'ma', 'ru', 'thi', 'ke', 'shi', 'vaj', 'pet']
+SUFFIXES = ['', '', 'Bus Stand', 'Metro', 'Circle', 'Cross', 'Main Road', 'Gate', 'Depot', 'Market',
+            'Layout', 'Sector 1', 'Sector 2', '1st Block', '5th Block', 'Junction', 'Post Office', 'Temple']
+
+
+def random_stops(num_stops, rng):
+    areas = sorted({''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).title()
+                    for _ in range(num_stops // 8)})
+    dlat = AREA_KM * 1000 / 2 / 111320.0
+    dlon = dlat / math.cos(math.radians(CENTER[0]))
+    stops = []
+    while len(stops) < num_stops:
+        name = f'{rng.choice(areas)} {rng.choice(SUFFIXES)}'.strip()
+        lat = CENTER[0] + rng.uniform(-dlat, dlat)
+        lon = CENTER[1] + rng.uniform(-dlon, dlon)
+        stop_id = f'S{len(stops):06d}'
+        if rng.random() < 0.4:
+            # Opposite side of the road: same name, ~30 m away, one station
+            stops.append((stop_id, name, lat, lon, stop_id))
+            stops.append((f'S{len(stops):06d}', name, lat + 0.0003, lon, stop_id))
+        else:
+            stops.append((stop_id, name, lat, lon, None))
+    return stops
+
+
+def typo(text, rng):
+    i = rng.randrange(len(text))
+    return text[:i] + rng.choice('aeioulnrst') + text[i + 1:]
+
+
+def sessions(stops, num_sessions, rng):
+    """Queries as typed: every prefix of a few names (from 2 characters), plus misspelt full names."""
+    queries = []
+    for _ in range(num_sessions):
+        name = rng.choice(stops)[1]
+        queries.extend(name[:n] for n in range(2, len(name) + 1))
+        queries.append(typo(name, rng))
+    return queries
+
+
+def text_scores(stops, query):
+    query = normalize(query)
+    scores = {}
+    for stop_id, name, _, _, _ in stops:
+        name = normalize(name)
+        sim = similarity(query, name)
+        bonus = prefix_bonus(query, name)
+        if bonus:
+            scores[stop_id] = sim + bonus
+        elif sim >= SIMILARITY_THRESHOLD:
+            scores[stop_id] = sim
+    return scores
+
+
+def timed(index, queries, position, limit):
+    times = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query, *position, limit=limit)
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return times
+
+
+def run(num_stops, num_sessions, num_check, limit, seed):
+    rng = random.Random(seed)
+    stops = random_stops(num_stops, rng)
+
+    start = time.perf_counter()
+    index = StopSearchIndex(stops)
+    build_seconds = time.perf_counter() - start
+    print(f'Index: {len(index)} stops, {index.num_names} distinct names - built in {build_seconds:.2f}s')
+
+    queries = sessions(stops, num_sessions, rng)
+    dlat = AREA_KM * 1000 / 2 / 111320.0
+    for label, position in [('text only', (None, None)),
+                            ('with position', (CENTER[0] + rng.uniform(-dlat, dlat), CENTER[1]))]:
+        times = timed(index, queries, position, limit)
+        print(f'{label:>14}: {len(queries)} queries  '
+              f'p50 {percentile(times, 50) * 1000:.2f} ms  '
+              f'p99 {percentile(times, 99) * 1000:.2f} ms  '
+              f'max {times[-1] * 1000:.2f} ms')
+
+    # Index scores vs the plain-Python ranking functions
+    mismatches = 0
+    for query in rng.sample(queries, min(num_check, len(queries))):
+        expected = text_scores(stops, query)
+        hits = index.search(query, limit=len(stops), collapse=False)
+        got = {hit.stop_id: hit.score for hit in hits}
+        if set(got) != set(expected) or any(abs(got[s] - round(expected[s], 4)) > 1e-3 for s in expected):
+            mismatches += 1
+    print(f'Checked {min(num_check, len(queries))} queries against brute force: {mismatches} mismatches')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stops', type=int, default=50000)
+    parser.add_argument('--sessions', type=int, default=500)
+    parser.add_argument('--check', type=int, default=50)
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+    run(args.stops, args.sessions, args.check, args.limit, args.seed)
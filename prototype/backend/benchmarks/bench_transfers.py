@@ -0,0 +1,74 @@
+"""
+Benchmark: walking transfer generation.
+
+Scatters stops uniformly over a city-sized area, times find_transfers (the
+grid-index search build_transfers runs) and checks it against a brute-force
+all-pairs comparison on the same stops.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_transfers [--stops 10000] [--area-km 25] [--max-distance 500] [--check 2000]
+"""
+
+import argparse
+import math
+import random
+import time
+
+from gtfs.utils.spatial_index import LocalProjection
+from gtfs.utils.transfers import find_transfers
+
+CENTER = (19.076, 72.877)
+
+
+def random_stops(num_stops, area_km, rng):
+    dlat = area_km * 1000 / 2 / 111320.0
+    dlon = dlat / math.cos(math.radians(CENTER[0]))
+    return {
+        f'S{i}': (CENTER[0] + rng.uniform(-dlat, dlat), CENTER[1] + rng.uniform(-dlon, dlon))
+        for i in range(num_stops)
+    }
+
+
+def brute_force(stops, max_distance):
+    projection = LocalProjection.around(stops.values())
+    points = [(stop_id, *projection.project(*coords)) for stop_id, coords in stops.items()]
+    max_sq = max_distance * max_distance
+    pairs = set()
+    for i, (a, ax, ay) in enumerate(points):
+        for b, bx, by in points[i + 1:]:
+            if (bx - ax) ** 2 + (by - ay) ** 2 <= max_sq:
+                pairs.add((a, b))
+                pairs.add((b, a))
+    return pairs
+
+
+def run(num_stops, area_km, max_distance, check, seed):
+    rng = random.Random(seed)
+    stops = random_stops(num_stops, area_km, rng)
+
+    start = time.perf_counter()
+    pairs = find_transfers(stops, max_distance)
+    elapsed = time.perf_counter() - start
+    print(f'{num_stops} stops over {area_km}x{area_km} km, max distance {max_distance:.0f}m')
+    print(f'Grid index: {len(pairs)} transfers in {elapsed:.2f}s '
+          f'({len(pairs) / num_stops:.1f} per stop)')
+
+    if check:
+        subset = dict(list(stops.items())[:check])
+        expected_start = time.perf_counter()
+        expected = brute_force(subset, max_distance)
+        brute_elapsed = time.perf_counter() - expected_start
+        got = {(a, b) for a, b, _ in find_transfers(subset, max_distance)}
+        print(f'Brute force on {len(subset)} stops: {brute_elapsed:.2f}s, '
+              f'{len(expected)} transfers, {len(got ^ expected)} mismatches')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stops', type=int, default=10000)
+    parser.add_argument('--area-km', type=float, default=25.0)
+    parser.add_argument('--max-distance', type=float, default=500.0)
+    parser.add_argument('--check', type=int, default=2000, help='Stops to verify against brute force (0 to skip)')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+    run(args.stops, args.area_km, args.max_distance, args.check, args.seed)
@@ -0,0 +1,153 @@
+"""
+Benchmark: implicit trip matching over synthetic traces.
+
+Generates a grid city, builds a TripMatcher, then simulates riders: each
+trip runs with its own random delay, and each trace is a random trip at a
+random moment with GPS noise, plus an earlier fix of the same rider
+TRACE_GAP seconds before. Each trace is matched from the single latest fix,
+from the two-fix trace, and from the trace with the other trips' current
+delays known (as ActiveTrips give them in production).
+
+Reports build time, per-query latency, how often the best candidate is the
+true trip (and route), and - what production actually does - precision and
+recall of the assignments that pass TripMatcher.MIN_SCORE and
+MIN_PROBABILITY, with a sweep over MIN_PROBABILITY.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_trip_matcher [--routes 150] [--queries 5000]
+"""
+
+import argparse
+import bisect
+import random
+import time
+
+from benchmarks.synthetic import generate_city, percentile
+from realtime.matching import TripMatcher
+
+TRACE_GAP = 90  # seconds between the two fixes of a trace
+KNOWN_DELAY_STD = 60.0  # error of the ActiveTrip delays in the known-delays mode
+PROBABILITY_SWEEP = (0.3, 0.4, 0.5, 0.6, 0.7, 0.8)
+
+
+def position_at(feed, trip, service_seconds):
+    """Interpolated (lat, lon) of a trip at a scheduled time."""
+    arrivals, departures = trip.arrivals, trip.departures
+    j = bisect.bisect_right(arrivals, service_seconds)
+    if j == 0:
+        return feed.stops[trip.stop_ids[0]]
+    if j >= len(arrivals):
+        return feed.stops[trip.stop_ids[-1]]
+    i = j - 1
+    if service_seconds <= departures[i]:
+        return feed.stops[trip.stop_ids[i]]  # dwelling at stop i
+    frac = (service_seconds - departures[i]) / (arrivals[j] - departures[i])
+    (lat0, lon0), (lat1, lon1) = feed.stops[trip.stop_ids[i]], feed.stops[trip.stop_ids[j]]
+    return lat0 + frac * (lat1 - lat0), lon0 + frac * (lon1 - lon0)
+
+
+def run(num_routes, num_queries, delay_sigma, gps_sigma, seed):
+    rng = random.Random(seed)
+
+    t0 = time.perf_counter()
+    feed = generate_city(num_routes=num_routes, seed=seed)
+    t1 = time.perf_counter()
+    matcher = TripMatcher(
+        feed.stops,
+        feed.shapes,
+        ((t.trip_id, t.shape_id, t.stop_ids, t.arrivals, t.departures) for t in feed.trips),
+    )
+    t2 = time.perf_counter()
+
+    num_stop_times = sum(len(t.stop_ids) for t in feed.trips)
+    print(f'Feed: {len(feed.stops)} stops, {len(feed.shapes)} shapes, '
+          f'{len(feed.trips)} trips, {num_stop_times} stop_times (generated in {t1 - t0:.1f}s)')
+    print(f'Matcher build: {t2 - t1:.2f}s')
+
+    route_of = {t.trip_id: t.route_id for t in feed.trips}
+    projection = matcher.projection
+    # Every trip runs with its own delay, so neighbouring trips of a route differ
+    true_delay = {
+        t.trip_id: max(-matcher.MAX_EARLY, min(matcher.MAX_LATE, rng.gauss(120, delay_sigma)))
+        for t in feed.trips
+    }
+
+    def known_delays(trip_ids):
+        # ActiveTrip estimates of the running trips, as other riders' reports leave them
+        return {
+            trip_id: (round(true_delay[trip_id] + rng.gauss(0, KNOWN_DELAY_STD)), KNOWN_DELAY_STD, None)
+            for trip_id in trip_ids
+        }
+
+    modes = ('single fix', 'two-fix trace', 'two-fix trace, known delays')
+    latencies = {mode: [] for mode in modes}
+    results = {mode: [] for mode in modes}  # (score, probability, exact trip, same route) of the best candidate
+
+    def noisy(lat, lon):
+        x, y = projection.project(lat, lon)
+        return projection.unproject(x + rng.gauss(0, gps_sigma), y + rng.gauss(0, gps_sigma))
+
+    for _ in range(num_queries):
+        trip = rng.choice(feed.trips)
+        delay = true_delay[trip.trip_id]
+        scheduled = rng.uniform(trip.departures[0] + TRACE_GAP, trip.arrivals[-1])
+
+        lat, lon = noisy(*position_at(feed, trip, scheduled))
+        prev_lat, prev_lon = noisy(*position_at(feed, trip, scheduled - TRACE_GAP))
+        now = int(scheduled + delay)
+        previous = (prev_lat, prev_lon, now - TRACE_GAP)
+
+        for mode, kwargs in zip(modes, (
+            {},
+            {'previous': previous},
+            {'previous': previous, 'expected_delays': known_delays},
+        )):
+            start = time.perf_counter()
+            result = matcher.match(lat, lon, now, **kwargs)
+            latencies[mode].append((time.perf_counter() - start) * 1000.0)
+            if result is not None:
+                results[mode].append((
+                    result.score, result.probability,
+                    result.trip_id == trip.trip_id, route_of[result.trip_id] == trip.route_id,
+                ))
+
+    def rates(rows, min_score, min_probability):
+        assigned = [row for row in rows if row[0] >= min_score and row[1] >= min_probability]
+        exact = sum(1 for row in assigned if row[2])
+        wrong_same_route = sum(1 for row in assigned if row[3] and not row[2])
+        return (len(assigned) / num_queries, exact / len(assigned) if assigned else 1.0,
+                exact / num_queries, wrong_same_route / len(assigned) if assigned else 0.0)
+
+    print(f'\n{num_queries} traces (delay sigma {delay_sigma}s, GPS sigma {gps_sigma}m, fix gap {TRACE_GAP}s, '
+          f'known delays +-{KNOWN_DELAY_STD:.0f}s)')
+    print(f'Assignment at MIN_SCORE {matcher.MIN_SCORE}, MIN_PROBABILITY {matcher.MIN_PROBABILITY}: '
+          f'precision = right trip / assigned, recall = right trip / traces')
+    for mode in modes:
+        values = sorted(latencies[mode])
+        rows = results[mode]
+        assigned, precision, recall, wrong_same_route = rates(rows, matcher.MIN_SCORE, matcher.MIN_PROBABILITY)
+        top_exact = sum(1 for row in rows if row[2]) / num_queries
+        top_route = sum(1 for row in rows if row[3]) / num_queries
+        print(f'  {mode}:')
+        print(f'    latency ms: mean {sum(values) / len(values):.3f}, p50 {percentile(values, 50):.3f}, '
+              f'p95 {percentile(values, 95):.3f}, p99 {percentile(values, 99):.3f}, max {values[-1]:.3f}')
+        print(f'    best candidate: exact trip {top_exact:.1%}, same route {top_route:.1%}, '
+              f'unmatched {1 - len(rows) / num_queries:.1%}')
+        print(f'    assigned {assigned:.1%}: precision {precision:.1%}, recall {recall:.1%}, '
+              f'wrong trip of the right route {wrong_same_route:.1%} of assignments')
+        sweep = ', '.join(
+            '{:.1f}: {:.0%}/{:.0%}'.format(p, *rates(rows, matcher.MIN_SCORE, p)[1:3])
+            for p in PROBABILITY_SWEEP
+        )
+        print(f'    precision/recall by MIN_PROBABILITY {sweep}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--routes', type=int, default=150)
+    parser.add_argument('--queries', type=int, default=5000)
+    parser.add_argument('--delay-sigma', type=float, default=180.0)
+    parser.add_argument('--gps-sigma', type=float, default=20.0)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+    run(args.routes, args.queries, args.delay_sigma, args.gps_sigma, args.seed)
@@ -0,0 +1,137 @@
+"""
+Synthetic City Feed
+
+Generates a grid city for benchmarks: every grid node is a stop, routes are
+random walks along grid streets (so routes share stops and street segments),
+and each route runs in both directions at a fixed headway - either as
+explicit trips or, with frequencies=True, as one frequency-based template
+trip per direction.
+
+Shapes follow the grid nodes, so the straight line between consecutive stops
+is exactly the shape - handy for generating ground-truth positions.
+"""
+
+import random
+from collections import namedtuple
+
+from gtfs.utils.spatial_index import LocalProjection
+
+SyntheticTrip = namedtuple('SyntheticTrip', [
+    'trip_id', 'route_id', 'shape_id', 'stop_ids', 'arrivals', 'departures'
+])
+
+SyntheticFeed = namedtuple('SyntheticFeed', [
+    'stops',    # dict stop_id -> (lat, lon)
+    'shapes',   # dict shape_id -> list of (lat, lon)
+    'trips',    # list of SyntheticTrip
+    'frequencies',  # dict trip_id -> list of (start, end, headway); templates only
+])
+
+DIRECTIONS = [(1, 0), (0, 1), (-1, 0), (0, -1)]
+
+
+def generate_city(grid_size=40, spacing=400.0, num_routes=150, min_route_stops=20,
+                  max_route_stops=50, headway=600, first_departure=5 * 3600,
+                  last_departure=23 * 3600, dwell=20, seed=42,
+                  center=(12.9716, 77.5946), frequencies=False):
+    """
+    Build a synthetic feed.
+
+    Args:
+        grid_size: Nodes per side (grid_size ** 2 stops)
+        spacing: Meters between neighbouring nodes
+        num_routes: Routes to generate (each runs in both directions)
+        headway: Seconds between departures of a route
+        first_departure, last_departure: Service span in service-day seconds
+        dwell: Seconds spent at each stop
+        frequencies: Emit one template trip per direction plus its headway
+                     window instead of every trip
+
+    Returns:
+        SyntheticFeed
+    """
+    rng = random.Random(seed)
+    projection = LocalProjection(*center)
+    offset = (grid_size - 1) * spacing / 2.0
+
+    def node_id(i, j):
+        return f'S{i:03d}_{j:03d}'
+
+    stops = {}
+    for i in range(grid_size):
+        for j in range(grid_size):
+            stops[node_id(i, j)] = projection.unproject(i * spacing - offset, j * spacing - offset)
+
+    shapes = {}
+    trips = []
+    frequency_windows = {}
+
+    for r in range(num_routes):
+        route_id = f'R{r:04d}'
+        target_len = rng.randint(min_route_stops, max_route_stops)
+
+        # Random walk with direction persistence, no revisits
+        i, j = rng.randrange(grid_size), rng.randrange(grid_size)
+        direction = rng.choice(DIRECTIONS)
+        path = [(i, j)]
+        visited = {(i, j)}
+        while len(path) < target_len:
+            options = [direction] * 6 + DIRECTIONS
+            rng.shuffle(options)
+            for di, dj in options:
+                ni, nj = i + di, j + dj
+                if 0 <= ni < grid_size and 0 <= nj < grid_size and (ni, nj) not in visited:
+                    i, j, direction = ni, nj, (di, dj)
+                    path.append((i, j))
+                    visited.add((i, j))
+                    break
+            else:
+                break
+        if len(path) < 2:
+            continue
+
+        speed = rng.uniform(4.5, 7.5)  # m/s, 16-27 km/h
+        hop_seconds = int(spacing / speed)
+
+        for direction_id, nodes in enumerate((path, path[::-1])):
+            shape_id = f'SH_{route_id}_{direction_id}'
+            stop_ids = [node_id(a, b) for a, b in nodes]
+            shapes[shape_id] = [stops[sid] for sid in stop_ids]
+
+            # Offsets relative to the first departure
+            arr_offsets = []
+            dep_offsets = []
+            t = 0
+            for k in range(len(stop_ids)):
+                if k > 0:
+                    t += hop_seconds
+                arr_offsets.append(t)
+                if 0 < k < len(stop_ids) - 1:
+                    t += dwell
+                dep_offsets.append(t)
+
+            start = first_departure + rng.randrange(headway)
+            if frequencies:
+                frequency_windows[f'T_{route_id}_{direction_id}_0000'] = [(start, last_departure + 1, headway)]
+            n = 0
+            while start <= last_departure and not (frequencies and n):
+                trips.append(SyntheticTrip(
+                    trip_id=f'T_{route_id}_{direction_id}_{n:04d}',
+                    route_id=route_id,
+                    shape_id=shape_id,
+                    stop_ids=stop_ids,
+                    arrivals=[start + o for o in arr_offsets],
+                    departures=[start + o for o in dep_offsets],
+                ))
+                start += headway
+                n += 1
+
+    return SyntheticFeed(stops=stops, shapes=shapes, trips=trips, frequencies=frequency_windows)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
@@ -0,0 +1,245 @@
+"""
+Request and Command Metrics
+
+MetricsMiddleware records, per view and action (StopViewSet / upcoming,
+ActiveTripViewSet / list, ...):
+
+- request latency
+- database queries per request
+- database time per request
+
+as Prometheus histograms, plus a count of 5xx responses; `/metrics` serves
+them in the Prometheus text format. Hidden N+1 query patterns show up as
+a db_queries histogram whose mass sits in the high buckets.
+
+The hot path allocates nothing per request: each (view function, HTTP
+method) gets its Series once, with bucket counts preallocated and label
+text pre-rendered; queries are counted by one reusable execute wrapper per
+thread. For streaming responses (the NDJSON / CSV exports) latency and
+queries are measured until the body has been sent, since that is when the
+rows are read. Metrics are per process - with several workers, scrape each.
+
+Management commands subclassing InstrumentedCommand record the same
+histograms under view "command:<name>" and print a one-line summary when
+they finish.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.http import HttpResponse
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)   # seconds
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+DB_TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)     # seconds
+
+
+class Histogram:
+    """Fixed buckets; counts[i] is the number of values <= buckets[i] and > buckets[i - 1]."""
+    __slots__ = ('buckets', 'counts', 'sum')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # last slot: +Inf
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def render(self, name, labels, lines):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound:g}"}} {cumulative}')
+        cumulative += self.counts[-1]
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {cumulative}')
+        lines.append(f'{name}_sum{{{labels}}} {self.sum:.6f}')
+        lines.append(f'{name}_count{{{labels}}} {cumulative}')
+
+
+class Series:
+    """All metrics of one view + action."""
+    __slots__ = ('labels', 'latency', 'queries', 'db_time', 'errors')
+
+    def __init__(self, view, action):
+        self.labels = f'view="{_escape(view)}",action="{_escape(action)}"'
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.db_time = Histogram(DB_TIME_BUCKETS)
+        self.errors = 0
+
+    def observe(self, seconds, queries, db_seconds, error):
+        self.latency.observe(seconds)
+        self.queries.observe(queries)
+        self.db_time.observe(db_seconds)
+        if error:
+            self.errors += 1
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_view = {}     # view function -> {HTTP method -> Series}
+        self._by_name = {}     # (view, action) -> Series, for commands and unresolved requests
+
+    def series_for_view(self, func, method):
+        """Series of a resolved view function and method; created on first use."""
+        methods = self._by_view.get(func)
+        series = methods.get(method) if methods is not None else None
+        if series is None:
+            cls = getattr(func, 'cls', None)
+            if cls is not None:
+                # DRF: one function per route, mapping methods to viewset actions
+                view, action = cls.__name__, getattr(func, 'actions', {}).get(method.lower(), method.lower())
+            else:
+                view, action = getattr(func, '__name__', repr(func)), method.lower()
+            named = self.series(view, action)
+            with self._lock:
+                series = self._by_view.setdefault(func, {}).setdefault(method, named)
+        return series
+
+    def series(self, view, action):
+        series = self._by_name.get((view, action))
+        if series is None:
+            with self._lock:
+                series = self._by_name.setdefault((view, action), Series(view, action))
+        return series
+
+    def observe(self, series, seconds, queries, db_seconds, error):
+        with self._lock:
+            series.observe(seconds, queries, db_seconds, error)
+
+    def render(self):
+        """Prometheus text exposition format."""
+        with self._lock:
+            all_series = sorted(self._by_name.values(), key=lambda series: series.labels)
+            lines = [
+                '# HELP http_request_duration_seconds Time from the request reaching Django to the response (or the last streamed chunk) leaving it.',
+                '# TYPE http_request_duration_seconds histogram',
+            ]
+            for series in all_series:
+                series.latency.render('http_request_duration_seconds', series.labels, lines)
+            lines += ['# HELP db_queries Database queries per request.', '# TYPE db_queries histogram']
+            for series in all_series:
+                series.queries.render('db_queries', series.labels, lines)
+            lines += ['# HELP db_query_duration_seconds Time spent in database queries per request.',
+                      '# TYPE db_query_duration_seconds histogram']
+            for series in all_series:
+                series.db_time.render('db_query_duration_seconds', series.labels, lines)
+            lines += ['# HELP http_request_errors_total Responses with a 5xx status.',
+                      '# TYPE http_request_errors_total counter']
+            for series in all_series:
+                lines.append(f'http_request_errors_total{{{series.labels}}} {series.errors}')
+        lines.append('')
+        return '\n'.join(lines)
+
+
+registry = Registry()
+
+
+class QueryTimer:
+    """Database execute wrapper counting queries and their time (see connection.execute_wrapper)."""
+    __slots__ = ('queries', 'seconds')
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.queries += 1
+
+
+_local = threading.local()
+
+
+class MetricsMiddleware:
+    """Records latency and query metrics of every request (module docstring)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = getattr(_local, 'timer', None)
+        if timer is None:
+            timer = _local.timer = QueryTimer()
+        timer.queries = 0
+        timer.seconds = 0.0
+
+        start = time.perf_counter()
+        with connection.execute_wrapper(timer):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        if match is not None:
+            series = registry.series_for_view(match.func, request.method)
+        else:
+            series = registry.series('unresolved', request.method.lower())
+        error = response.status_code >= 500
+
+        if response.streaming and not response.is_async:
+            # The queries of a streamed export run while the body is iterated, after
+            # this returns: keep counting until the stream is exhausted or closed.
+            # A timer of its own, as the thread's is reset by the next request.
+            stream_timer = QueryTimer()
+            stream_timer.queries, stream_timer.seconds = timer.queries, timer.seconds
+            response.streaming_content = self._measured_stream(
+                response.streaming_content, series, start, stream_timer, error
+            )
+            return response
+
+        registry.observe(series, elapsed, timer.queries, timer.seconds, error)
+        return response
+
+    @staticmethod
+    def _measured_stream(content, series, start, timer, error):
+        """Yield a streaming body, recording the request's metrics once it is done."""
+        try:
+            with connection.execute_wrapper(timer):
+                yield from content
+        finally:
+            registry.observe(series, time.perf_counter() - start, timer.queries, timer.seconds, error)
+
+
+def metrics_view(request):
+    """GET /metrics - Prometheus text format."""
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class InstrumentedCommand(BaseCommand):
+    """
+    BaseCommand that times handle() and counts its database queries,
+    records them as view "command:<name>" and prints a summary line.
+    Nested call_command()s are included in the outer command's numbers.
+    """
+
+    def execute(self, *args, **options):
+        name = self.__class__.__module__.rsplit('.', 1)[-1]
+        timer = QueryTimer()
+        start = time.perf_counter()
+        failed = True
+        try:
+            with connection.execute_wrapper(timer):
+                result = super().execute(*args, **options)
+            failed = False
+            return result
+        finally:
+            elapsed = time.perf_counter() - start
+            registry.observe(registry.series(f'command:{name}', 'handle'), elapsed, timer.queries, timer.seconds, failed)
+            self.stdout.write(
+                f'{name}: {elapsed:.1f}s, {timer.queries} queries, {timer.seconds:.1f}s in the database'
+                f'{" (failed)" if failed else ""}'
+            )
@@ -38,6 +38,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'django.contrib.gis',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework_gis',
     'corsheaders',
@@ -48,6 +49,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timing and query count cover the rest of the stack (config/metrics.py)
+    'config.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -136,6 +139,30 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 CORS_ALLOW_ALL_ORIGINS = True
 
+# Detached Observation partitions are dumped here by `manage_partitions`
+OBSERVATION_ARCHIVE_DIR = BASE_DIR / 'archive' / 'observations'
+
+# Parquet datasets for offline analytics, written by `export_parquet`
+ANALYTICS_EXPORT_DIR = BASE_DIR / 'exports'
+
+# Memory-mapped routing arrays, one subdirectory per feed version (gtfs/routing/csa.py)
+ROUTING_CACHE_DIR = BASE_DIR / 'cache' / 'routing'
+
+# Gzipped map vector tiles, one subdirectory per feed version (gtfs/utils/vector_tiles.py)
+TILE_CACHE_DIR = BASE_DIR / 'cache' / 'tiles'
+
+# Offline timetable bundles, one subdirectory per feed version (gtfs/utils/timetable_bundle.py);
+# immutable once written, so in production let the web server serve /api/gtfs/bundles/v<id>/ from here
+BUNDLE_DIR = BASE_DIR / 'cache' / 'bundles'
+
+# /api/gtfs/stops/search/ uses an in-process index per feed version (gtfs/utils/stop_search.py);
+# set to False to query the pg_trgm index instead, e.g. when many small workers share one database
+STOP_SEARCH_IN_PROCESS = True
+
+# Feed versions whose change sets `ingest_gtfs` keeps for /api/gtfs/changes/ (gtfs/utils/feed_diff.py);
+# clients further behind get 410 Gone and download everything again
+FEED_CHANGE_RETENTION = 10
+
 REST_FRAMEWORK = {
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
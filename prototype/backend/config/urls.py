@@ -1,8 +1,10 @@
 from django.contrib import admin
 from django.urls import path, include
+from .metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
     path('api/gtfs/', include('gtfs.urls')),
     path('api/realtime/', include('realtime.urls')),
     path('api/evidence/', include('evidence.urls')),
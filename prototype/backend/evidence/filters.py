@@ -0,0 +1,25 @@
+from django_filters import rest_framework as filters
+
+from .models import Observation
+
+
+class ObservationFilter(filters.FilterSet):
+    """
+    Filters for /api/evidence/observations/.
+
+    Equality on trip / stop / user_id plus a timestamp window line up with
+    the (trip, timestamp), (stop, timestamp) and (user_id, timestamp)
+    indexes, and the window prunes the monthly partitions.
+
+    Query params:
+    - trip, stop, user_id, type: exact match
+    - route: observations of the route's trips
+    - since, until: ISO 8601 timestamps, since <= timestamp < until
+    """
+    since = filters.IsoDateTimeFilter(field_name='timestamp', lookup_expr='gte')
+    until = filters.IsoDateTimeFilter(field_name='timestamp', lookup_expr='lt')
+    route = filters.CharFilter(field_name='trip__route_id')
+
+    class Meta:
+        model = Observation
+        fields = ['trip', 'stop', 'user_id', 'type']
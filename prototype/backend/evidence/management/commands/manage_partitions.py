@@ -0,0 +1,84 @@
+"""
+Management command to maintain the partitioned Observation table.
+
+This command:
+1. Creates monthly partitions for the current month and the next N months
+2. Detaches partitions older than the retention window, archives them to
+   gzipped CSV files and drops them
+
+Designed to run daily as a cron job.
+"""
+
+from django.conf import settings
+from config.metrics import InstrumentedCommand
+from evidence.partitions import (
+    ensure_partitions, expired_partitions, archive_partition, list_partitions
+)
+
+
+class Command(InstrumentedCommand):
+    help = 'Create future Observation partitions and archive expired ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months-ahead',
+            type=int,
+            default=2,
+            help='Pre-create partitions for this many future months (default: 2)'
+        )
+        parser.add_argument(
+            '--retain-months',
+            type=int,
+            default=12,
+            help='Keep this many full months before the current one (default: 12)'
+        )
+        parser.add_argument(
+            '--archive-dir',
+            type=str,
+            default=str(settings.OBSERVATION_ARCHIVE_DIR),
+            help='Directory for archived partitions (default: settings.OBSERVATION_ARCHIVE_DIR)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show what would be done without making changes'
+        )
+
+    def handle(self, *args, **options):
+        months_ahead = options['months_ahead']
+        retain_months = options['retain_months']
+        archive_dir = options['archive_dir']
+        dry_run = options['dry_run']
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING('DRY RUN MODE - No changes will be made'))
+
+        partitions = list_partitions()
+        self.stdout.write(f'Found {len(partitions)} monthly partitions')
+
+        # 1. Future partitions
+        self.stdout.write(f'\n--- Ensuring partitions up to {months_ahead} months ahead ---')
+        created = []
+        if not dry_run:
+            created = ensure_partitions(months_ahead)
+        for name in created:
+            self.stdout.write(self.style.SUCCESS(f'  ✓ Created: {name}'))
+
+        # 2. Retention
+        self.stdout.write(f'\n--- Archiving partitions older than {retain_months} months ---')
+        archived_count = 0
+        for name, start, end in expired_partitions(retain_months):
+            if dry_run:
+                self.stdout.write(f'  [DRY RUN] Would archive: {name} ({start:%Y-%m-%d} to {end:%Y-%m-%d})')
+                continue
+            try:
+                path = archive_partition(name, archive_dir)
+                archived_count += 1
+                self.stdout.write(self.style.SUCCESS(f'  ✓ Archived: {name} -> {path}'))
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'  ✗ Failed to archive {name}: {e}'))
+
+        # Summary
+        self.stdout.write(self.style.SUCCESS(
+            f'\nSummary: Created {len(created)} partitions, archived {archived_count} partitions'
+        ))
@@ -0,0 +1,101 @@
+# Converts evidence_observation into a PostgreSQL table range-partitioned by month
+# on "timestamp". The Django model is unchanged: "id" stays the model primary key,
+# the database primary key becomes (id, timestamp) because a partitioned table's
+# unique constraints must include the partition key.
+#
+# Partition maintenance (future partitions, retention/archival) lives in
+# evidence/partitions.py and the `manage_partitions` command.
+
+from django.db import migrations
+
+FORWARD_SQL = """
+ALTER TABLE evidence_observation RENAME TO evidence_observation_legacy;
+ALTER TABLE evidence_observation_legacy RENAME CONSTRAINT evidence_observation_pkey TO evidence_observation_legacy_pkey;
+
+CREATE TABLE evidence_observation (
+    LIKE evidence_observation_legacy INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING STORAGE
+) PARTITION BY RANGE ("timestamp");
+
+ALTER TABLE evidence_observation ADD CONSTRAINT evidence_observation_pkey PRIMARY KEY (id, "timestamp");
+
+-- Catch-all for rows outside the managed months; ensure_partitions() moves them out
+CREATE TABLE evidence_observation_default PARTITION OF evidence_observation DEFAULT;
+
+-- Monthly partitions from the oldest observation up to two months ahead
+DO $$
+DECLARE
+    month_start timestamp := date_trunc('month', COALESCE(
+        (SELECT min("timestamp") FROM evidence_observation_legacy), now()
+    ) AT TIME ZONE 'UTC');
+    last_month timestamp := date_trunc('month', now() AT TIME ZONE 'UTC') + interval '2 months';
+BEGIN
+    WHILE month_start <= last_month LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF evidence_observation FOR VALUES FROM (%L) TO (%L)',
+            'evidence_observation_p' || to_char(month_start, 'YYYYMM'),
+            month_start AT TIME ZONE 'UTC',
+            (month_start + interval '1 month') AT TIME ZONE 'UTC'
+        );
+        month_start := month_start + interval '1 month';
+    END LOOP;
+END $$;
+
+INSERT INTO evidence_observation SELECT * FROM evidence_observation_legacy;
+
+DROP TABLE evidence_observation_legacy;
+
+-- Identity columns are not allowed on partitioned tables (PostgreSQL < 17)
+CREATE SEQUENCE evidence_observation_id_seq OWNED BY evidence_observation.id;
+SELECT setval('evidence_observation_id_seq', COALESCE((SELECT max(id) FROM evidence_observation), 0) + 1, false);
+ALTER TABLE evidence_observation ALTER COLUMN id SET DEFAULT nextval('evidence_observation_id_seq');
+
+-- Partitioned indexes: created on every current and future partition
+CREATE INDEX evidence_ob_trip_id_0bb55d_idx ON evidence_observation (trip_id, "timestamp");
+CREATE INDEX evidence_ob_stop_id_49343b_idx ON evidence_observation (stop_id, "timestamp");
+CREATE INDEX evidence_ob_user_id_47ff1a_idx ON evidence_observation (user_id, "timestamp");
+
+ALTER TABLE evidence_observation
+    ADD CONSTRAINT evidence_observation_stop_id_55ce8d4f_fk_gtfs_stop_stop_id
+    FOREIGN KEY (stop_id) REFERENCES gtfs_stop (stop_id) DEFERRABLE INITIALLY DEFERRED;
+ALTER TABLE evidence_observation
+    ADD CONSTRAINT evidence_observation_trip_id_78e7388e_fk_gtfs_trip_trip_id
+    FOREIGN KEY (trip_id) REFERENCES gtfs_trip (trip_id) DEFERRABLE INITIALLY DEFERRED;
+"""
+
+REVERSE_SQL = """
+CREATE TABLE evidence_observation_flat (
+    LIKE evidence_observation INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING STORAGE
+);
+ALTER TABLE evidence_observation_flat ALTER COLUMN id DROP DEFAULT;
+
+INSERT INTO evidence_observation_flat SELECT * FROM evidence_observation;
+
+DROP TABLE evidence_observation CASCADE;
+ALTER TABLE evidence_observation_flat RENAME TO evidence_observation;
+
+ALTER TABLE evidence_observation ADD CONSTRAINT evidence_observation_pkey PRIMARY KEY (id);
+ALTER TABLE evidence_observation ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY;
+SELECT setval(pg_get_serial_sequence('evidence_observation', 'id'), COALESCE((SELECT max(id) FROM evidence_observation), 0) + 1, false);
+
+CREATE INDEX evidence_ob_trip_id_0bb55d_idx ON evidence_observation (trip_id, "timestamp");
+CREATE INDEX evidence_ob_stop_id_49343b_idx ON evidence_observation (stop_id, "timestamp");
+CREATE INDEX evidence_ob_user_id_47ff1a_idx ON evidence_observation (user_id, "timestamp");
+
+ALTER TABLE evidence_observation
+    ADD CONSTRAINT evidence_observation_stop_id_55ce8d4f_fk_gtfs_stop_stop_id
+    FOREIGN KEY (stop_id) REFERENCES gtfs_stop (stop_id) DEFERRABLE INITIALLY DEFERRED;
+ALTER TABLE evidence_observation
+    ADD CONSTRAINT evidence_observation_trip_id_78e7388e_fk_gtfs_trip_trip_id
+    FOREIGN KEY (trip_id) REFERENCES gtfs_trip (trip_id) DEFERRABLE INITIALLY DEFERRED;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('evidence', '0003_observation_distance_from_trip_and_more'),
+    ]
+
+    operations = [
+        migrations.RunSQL(FORWARD_SQL, REVERSE_SQL),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.10 on 2026-10-18 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('evidence', '0004_partition_observation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='observation',
+            name='match_score',
+            field=models.FloatField(blank=True, help_text='Matcher score if the trip was inferred from position and time', null=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.10 on 2026-10-18 19:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('evidence', '0005_observation_match_score'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='observation',
+            index=models.Index(fields=['timestamp', 'id'], name='evidence_ob_timestamp_id_idx'),
+        ),
+    ]
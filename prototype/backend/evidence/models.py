@@ -32,6 +32,10 @@ class Observation(models.Model):
     # Deviation Detection
     distance_from_trip = models.FloatField(null=True, blank=True, help_text="Meters from the linked trip's shape")
     is_deviation = models.BooleanField(default=False, help_text="True if distance > 200m")
+
+    # Implicit trip matching
+    match_score = models.FloatField(null=True, blank=True,
+                                    help_text="Matcher score if the trip was inferred from position and time")
     
     # Additional metadata
     notes = models.TextField(blank=True, help_text="Optional user notes or details")
@@ -42,6 +46,8 @@ class Observation(models.Model):
             models.Index(fields=['trip', 'timestamp']),
             models.Index(fields=['stop', 'timestamp']),
             models.Index(fields=['user_id', 'timestamp']),
+            # Keyset pagination of the unfiltered list (ObservationPagination)
+            models.Index(fields=['timestamp', 'id'], name='evidence_ob_timestamp_id_idx'),
         ]
 
     def __str__(self):
@@ -0,0 +1,166 @@
+"""
+Observation Table Partitioning
+
+evidence_observation is range-partitioned by month on "timestamp" (see migration
+0004_partition_observation). Inserts and recent-window queries (confidence,
+aggregation) filter on timestamp, so PostgreSQL prunes them to the current
+partition; old months can be detached and archived without touching hot data.
+
+Partition naming: evidence_observation_pYYYYMM, bounds are UTC month starts.
+Rows outside every managed month land in evidence_observation_default.
+"""
+
+import datetime
+import gzip
+import os
+
+from django.db import connection, transaction
+
+PARENT_TABLE = 'evidence_observation'
+DEFAULT_PARTITION = 'evidence_observation_default'
+PARTITION_PREFIX = 'evidence_observation_p'
+
+
+def month_start(dt: datetime.datetime) -> datetime.datetime:
+    """First instant (UTC) of the month containing dt."""
+    dt = dt.astimezone(datetime.timezone.utc)
+    return datetime.datetime(dt.year, dt.month, 1, tzinfo=datetime.timezone.utc)
+
+
+def add_months(dt: datetime.datetime, months: int) -> datetime.datetime:
+    """Shift a month-start datetime by a number of months (can be negative)."""
+    index = dt.year * 12 + (dt.month - 1) + months
+    return dt.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(start: datetime.datetime) -> str:
+    return f'{PARTITION_PREFIX}{start:%Y%m}'
+
+
+def list_partitions():
+    """
+    List the monthly partitions currently attached to the observation table.
+
+    Returns:
+        List of (name, lower_bound, upper_bound) sorted by lower bound.
+        The default partition is not included.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = %s AND child.relname LIKE %s
+            """,
+            [PARENT_TABLE, PARTITION_PREFIX + '%'],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = []
+    for name in names:
+        start = datetime.datetime.strptime(name[len(PARTITION_PREFIX):], '%Y%m').replace(
+            tzinfo=datetime.timezone.utc
+        )
+        partitions.append((name, start, add_months(start, 1)))
+    partitions.sort(key=lambda p: p[1])
+    return partitions
+
+
+def create_partition(start: datetime.datetime) -> str:
+    """
+    Create and attach the partition for the month starting at `start`.
+
+    Rows for that month that already landed in the default partition are moved
+    into the new partition before it is attached, so attaching never fails.
+
+    Returns:
+        Name of the created partition
+    """
+    end = add_months(start, 1)
+    name = partition_name(start)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TABLE {name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+        )
+        cursor.execute(
+            f"""
+            WITH moved AS (
+                DELETE FROM {DEFAULT_PARTITION}
+                WHERE "timestamp" >= %s AND "timestamp" < %s
+                RETURNING *
+            )
+            INSERT INTO {name} SELECT * FROM moved
+            """,
+            [start, end],
+        )
+        cursor.execute(
+            f'ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)',
+            [start, end],
+        )
+    return name
+
+
+def ensure_partitions(months_ahead=2, now=None):
+    """
+    Make sure partitions exist from the current month up to `months_ahead` months ahead.
+
+    Args:
+        months_ahead: Number of future months to pre-create
+        now: Reference time (default: current time)
+
+    Returns:
+        List of partition names that were created
+    """
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    existing = {name for name, _, _ in list_partitions()}
+
+    created = []
+    current = month_start(now)
+    for offset in range(months_ahead + 1):
+        start = add_months(current, offset)
+        if partition_name(start) not in existing:
+            created.append(create_partition(start))
+    return created
+
+
+def expired_partitions(retain_months, now=None):
+    """
+    Partitions whose whole range is older than the retention window.
+
+    Args:
+        retain_months: Number of full months to keep before the current month
+        now: Reference time (default: current time)
+
+    Returns:
+        List of (name, lower_bound, upper_bound)
+    """
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    cutoff = add_months(month_start(now), -retain_months)
+    return [p for p in list_partitions() if p[2] <= cutoff]
+
+
+def archive_partition(name, archive_dir):
+    """
+    Detach a partition, dump it to a gzipped CSV file and drop it.
+
+    Detaching first means the API never reads a half-archived month, and the
+    dump reads from a table no longer involved in inserts.
+
+    Returns:
+        Path of the archive file
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f'{name}.csv.gz')
+
+    # One transaction: if the dump fails the partition is re-attached by rollback
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}')
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            # Raw psycopg2 cursor for COPY streaming
+            cursor.cursor.copy_expert(f'COPY {name} TO STDOUT WITH (FORMAT csv, HEADER true)', f)
+        cursor.execute(f'DROP TABLE {name}')
+
+    return path
@@ -5,4 +5,4 @@ class ObservationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Observation
         fields = '__all__'
-        read_only_fields = ['timestamp']
+        read_only_fields = ['timestamp', 'match_score']
@@ -1,13 +1,27 @@
 from rest_framework import viewsets, mixins
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from .filters import ObservationFilter
 from .models import Observation
 from .serializers import ObservationSerializer
 from realtime.models import ActiveTrip, TripPosition
-from gtfs.models import Agency
+from realtime.matching import TripMatcher
+from realtime.estimator import delay_estimator
+from realtime.propagation import predict_arrivals
+from realtime.segments import HistoricalSegmentTimes, SegmentTimeStore
+from gtfs.models import Trip
+from gtfs.utils.pagination import KeysetPagination
 from gtfs.utils.spatial import get_distance_on_shape
 from django.contrib.gis.geos import Point
-from gtfs.utils.time_helpers import get_current_service_time, datetime_to_service_seconds
+from gtfs.utils.frequencies import nearest_instance_start
+from gtfs.utils.time_helpers import datetime_to_service_seconds
 from django.utils import timezone as django_timezone
-from datetime import timedelta
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+
+class ObservationPagination(KeysetPagination):
+    # id breaks timestamp ties so the order is total
+    ordering = ('-timestamp', '-id')
 
 
 class ObservationViewSet(mixins.CreateModelMixin,
@@ -15,6 +29,47 @@ class ObservationViewSet(mixins.CreateModelMixin,
                          viewsets.GenericViewSet):
     queryset = Observation.objects.all()
     serializer_class = ObservationSerializer
+    pagination_class = ObservationPagination
+    filterset_class = ObservationFilter
+
+    # Implicit trip matching: earlier fixes of the user considered (thresholds: TripMatcher)
+    MATCH_TRACE_WINDOW = timedelta(minutes=5)
+
+    # Observation types that put the bus at the reported stop
+    BUS_AT_STOP_TYPES = {
+        Observation.ObservationType.BUS_ARRIVED,
+        Observation.ObservationType.BUS_PASSED,
+    }
+
+    EXPORT_FIELDS = [
+        'id', 'timestamp', 'user_id', 'type', 'trip_id', 'stop_id', 'lat', 'lon',
+        'distance_from_trip', 'is_deviation', 'match_score', 'notes',
+    ]
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Observations as a streamed download:
+        GET /api/evidence/observations/export/?since=2026-10-17T00:00:00Z&until=...&output=csv
+
+        Oldest first, read through a server-side cursor (gtfs/utils/export.py)
+        instead of thousands of paginated requests.
+
+        Query params:
+        - output: ndjson or csv (default: ndjson)
+        - since (required), until, trip, stop, route, user_id, type: as for the list (ObservationFilter)
+        """
+        from gtfs.utils.export import OUTPUTS, streaming_export
+
+        output = request.query_params.get('output', 'ndjson')
+        if output not in OUTPUTS:
+            return Response({"error": f"output must be one of {', '.join(OUTPUTS)}"}, status=400)
+        if not request.query_params.get('since'):
+            # The window is what limits the scan to a few partitions
+            return Response({"error": "since parameter required"}, status=400)
+
+        observations = self.filter_queryset(self.get_queryset()).order_by('timestamp', 'id')
+        return streaming_export(observations, self.EXPORT_FIELDS, output, 'observations')
 
     def perform_create(self, serializer):
         """
@@ -22,13 +77,23 @@ class ObservationViewSet(mixins.CreateModelMixin,
         
         Core logic:
         1. Save the observation
-        2. If observation has trip_id, try to update corresponding ActiveTrip:
+        2. If it has no trip but has a position, try to infer the trip
+           (implicit matching, see realtime/matching.py)
+        3. If observation has trip_id, try to update corresponding ActiveTrip:
            - Update last_observed_at timestamp
-           - Calculate delay_seconds (actual vs scheduled time)
-           - Update confidence_score based on recent observation count
+           - Calculate the observed delay (actual vs scheduled time) and fold it
+             into the trip's delay filter (realtime/estimator.py). For a
+             frequency-based trip this is against one instance of the template,
+             which the ActiveTrip then follows (instance_start)
+           - Set delay_seconds / confidence_score from the filter's estimate
+           - Predict arrivals at the remaining stops (realtime/propagation.py)
            - Update TripPosition if stop information available
         """
         observation = serializer.save()
+
+        match = None
+        if not observation.trip and observation.lat is not None and observation.lon is not None:
+            match = self._match_trip(observation)
         
         # Only process if observation is linked to a trip
         if not observation.trip:
@@ -48,7 +113,11 @@ class ObservationViewSet(mixins.CreateModelMixin,
                     observation.is_deviation = True
                     print(f"Warning: Deviation detected! Observation {observation.id} is {dist:.2f}m from route.")
                 
-                observation.save()
+                # Filter on timestamp too so the update is pruned to the current partition
+                Observation.objects.filter(pk=observation.pk, timestamp=observation.timestamp).update(
+                    distance_from_trip=observation.distance_from_trip,
+                    is_deviation=observation.is_deviation
+                )
             except Exception as e:
                 print(f"Error calculating deviation for {observation.id}: {e}")
 
@@ -62,18 +131,55 @@ class ObservationViewSet(mixins.CreateModelMixin,
                 }
             )
             
-            # Update timestamp
-            active_trip.last_observed_at = django_timezone.now()
+            windows = list(observation.trip.frequencies.values_list(
+                'start_seconds', 'end_seconds', 'headway_seconds'
+            ))
             
-            # Calculate delay if we have stop information
+            # Observed delay: from the stop schedule, else from the implicit match
+            obs_type = observation.type
+            delay = None
+            instance_start = None
             if observation.stop:
-                delay = self._calculate_delay(observation)
-                if delay is not None:
-                    active_trip.delay_seconds = delay
+                delay, instance_start = self._calculate_delay(observation, windows)
+            if delay is None and match is not None:
+                delay = match.delay_seconds
+                instance_start = match.start_seconds if windows else None
+                obs_type = 'MATCHED'
+            if delay is None:
+                instance_start = active_trip.instance_start
+            
+            # The row's estimate; newer than this process's filter if another worker wrote it since
+            seed = (
+                active_trip.delay_seconds,
+                active_trip.delay_uncertainty_seconds,
+                active_trip.delay_rate,
+                (active_trip.estimated_at or active_trip.last_observed_at).timestamp(),
+            )
+            if instance_start != active_trip.instance_start:
+                # Another instance of the template: the last one's delay says nothing about it
+                delay_estimator.forget(observation.trip_id)
+                seed = None
+                active_trip.instance_start = instance_start
             
-            # Update confidence score based on recent observation count
-            confidence = self._calculate_confidence(observation.trip)
-            active_trip.confidence_score = confidence
+            # Fuse it with what we already know about this trip
+            estimate = delay_estimator.observe(
+                observation.trip_id,
+                observation.timestamp.timestamp(),
+                delay,
+                obs_type,
+                distance_meters=observation.distance_from_trip,
+                seed=seed,
+            )
+            active_trip.delay_seconds = estimate.delay_seconds
+            active_trip.delay_rate = estimate.rate
+            active_trip.delay_uncertainty_seconds = estimate.std_seconds
+            active_trip.confidence_score = estimate.confidence
+            active_trip.estimated_at = datetime.fromtimestamp(estimate.updated_at, tz=dt_timezone.utc)
+            
+            self._update_predictions(active_trip, observation, estimate)
+            
+            # Update timestamp
+            active_trip.last_observed_at = django_timezone.now()
             
             active_trip.save()
             
@@ -85,22 +191,88 @@ class ObservationViewSet(mixins.CreateModelMixin,
             # Log error but don't fail the observation save
             print(f"Error processing observation {observation.id}: {e}")
     
-    def _calculate_delay(self, observation):
+    def _match_trip(self, observation):
+        """
+        Infer the trip of an observation from its position and time.
+
+        The user's previous fix (within MATCH_TRACE_WINDOW) is passed along
+        so the matcher can tell directions and shared streets apart. The trip
+        is only assigned when the best candidate is both close enough and
+        clearly ahead of the alternatives (TripMatcher.is_confident).
+
+        Args:
+            observation: Saved Observation with lat/lon and no trip
+
+        Returns:
+            MatchResult if a trip was assigned, otherwise None
+        """
+        try:
+            matcher = TripMatcher.current()
+            if matcher is None or matcher.timezone is None:
+                return None
+
+            _, service_seconds = datetime_to_service_seconds(observation.timestamp, matcher.timezone)
+
+            previous = None
+            previous_obs = Observation.objects.filter(
+                user_id=observation.user_id,
+                timestamp__gte=observation.timestamp - self.MATCH_TRACE_WINDOW,
+                timestamp__lt=observation.timestamp,
+                lat__isnull=False,
+                lon__isnull=False,
+            ).order_by('-timestamp').values('lat', 'lon', 'timestamp').first()
+            if previous_obs:
+                _, previous_seconds = datetime_to_service_seconds(previous_obs['timestamp'], matcher.timezone)
+                previous = (previous_obs['lat'], previous_obs['lon'], previous_seconds)
+
+            def expected_delays(trip_ids):
+                # Only the trips that could be there, not every active trip
+                return {
+                    trip_id: (delay, std, instance_start)
+                    for trip_id, delay, std, instance_start in ActiveTrip.objects.filter(
+                        trip_id__in=trip_ids,
+                    ).values_list('trip_id', 'delay_seconds', 'delay_uncertainty_seconds', 'instance_start')
+                }
+
+            result = matcher.match(
+                observation.lat, observation.lon, service_seconds,
+                expected_delays=expected_delays, previous=previous,
+            )
+            if result is None or not matcher.is_confident(result):
+                return None
+
+            observation.trip = Trip.objects.select_related('shape', 'route__agency').get(trip_id=result.trip_id)
+            observation.match_score = result.score
+            Observation.objects.filter(pk=observation.pk, timestamp=observation.timestamp).update(
+                trip=observation.trip,
+                match_score=observation.match_score,
+            )
+            return result
+        except Exception as e:
+            print(f"Error matching trip for observation {observation.id}: {e}")
+            return None
+
+    def _calculate_delay(self, observation, windows):
         """
         Calculate delay in seconds: actual_time - scheduled_time.
         
         Args:
             observation: Observation with trip and stop
+            windows: The trip's frequency windows, empty if it is not frequency-based
             
         Returns:
-            Delay in seconds (positive = late, negative = early), or None if can't calculate
+            (delay, instance start) - delay in seconds (positive = late, negative = early),
+            or None if can't calculate. For WAITING / NO_SHOW this is only a lower bound -
+            the estimator knows. For a frequency-based trip the delay is against the
+            instance scheduled nearest the observation at this stop, whose start is
+            returned; otherwise the instance start is None.
         """
         try:
             # Find the scheduled time for this trip at this stop
             stop_time = observation.trip.stop_times.filter(stop=observation.stop).first()
             
             if not stop_time:
-                return None  # Stop not in this trip's schedule
+                return None, None  # Stop not in this trip's schedule
             
             # Get agency timezone
             agency = observation.trip.route.agency
@@ -113,40 +285,63 @@ class ObservationViewSet(mixins.CreateModelMixin,
             
             # Calculate delay: actual - scheduled
             # Use arrival_seconds as the reference point
-            delay = actual_seconds - stop_time.arrival_seconds
+            scheduled_seconds = stop_time.arrival_seconds
+            instance_start = None
+            if windows:
+                # Template stop times are for its first departure: shift to the instance
+                offset = stop_time.arrival_seconds - observation.trip.start_seconds
+                instance_start = nearest_instance_start(windows, actual_seconds - offset)
+                scheduled_seconds = instance_start + offset
+            delay = actual_seconds - scheduled_seconds
             
-            return delay
+            return delay, instance_start
             
         except Exception as e:
             print(f"Error calculating delay: {e}")
-            return None
+            return None, None
     
-    def _calculate_confidence(self, trip):
+    def _update_predictions(self, active_trip, observation, estimate):
         """
-        Calculate confidence score based on recent observation count.
-        
-        Formula: min(1.0, num_recent_observations / 5.0)
-        - 0 observations = 0.0
-        - 5+ observations = 1.0
+        Recompute the predicted arrivals at the trip's remaining stops.
         
         Args:
-            trip: Trip object
-            
-        Returns:
-            Float between 0.0 and 1.0
+            active_trip: ActiveTrip to update (not saved here)
+            observation: Observation that triggered the update
+            estimate: DelayEstimate after folding in the observation
         """
-        # Count observations from the last 15 minutes
-        cutoff_time = django_timezone.now() - timedelta(minutes=15)
-        
-        recent_count = Observation.objects.filter(
-            trip=trip,
-            timestamp__gte=cutoff_time
-        ).count()
-        
-        # Score: 0.2 per observation, max 1.0
-        confidence = min(1.0, recent_count / 5.0)
-        
-        return confidence
+        try:
+            agency = observation.trip.route.agency
+            service_date, now_seconds = datetime_to_service_seconds(observation.timestamp, agency.timezone)
+            
+            stop_times = list(observation.trip.stop_times.order_by('stop_sequence').values_list(
+                'stop_sequence', 'stop_id', 'arrival_seconds', 'departure_seconds'
+            ))
+            if active_trip.instance_start is not None:
+                # Frequency template: predict for the instance being followed
+                shift = active_trip.instance_start - observation.trip.start_seconds
+                stop_times = [
+                    (seq, stop_id, arrival + shift, departure + shift)
+                    for seq, stop_id, arrival, departure in stop_times
+                ]
+            
+            # The bus is at (or past) the reported stop: predict from the next one
+            after_sequence = None
+            if observation.stop_id and observation.type in self.BUS_AT_STOP_TYPES:
+                after_sequence = next(
+                    (seq for seq, stop_id, _, _ in stop_times if stop_id == observation.stop_id), None
+                )
+            
+            active_trip.predicted_sequences, active_trip.predicted_arrivals = predict_arrivals(
+                stop_times,
+                estimate.delay_seconds,
+                now_seconds,
+                service_date.weekday(),
+                rate=estimate.rate,
+                after_sequence=after_sequence,
+                segment_times=HistoricalSegmentTimes(SegmentTimeStore.current()),
+            )
+        except Exception as e:
+            print(f"Error predicting arrivals for {observation.trip_id}: {e}")
     
     def _update_position(self, active_trip, observation):
         """
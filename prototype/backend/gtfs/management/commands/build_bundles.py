@@ -0,0 +1,92 @@
+"""
+Management command to build offline timetable bundles.
+
+This command:
+1. Loads stops, routes and every trip's schedule once
+2. Encodes one bundle per route and one per REGION_ZOOM map tile with stops
+   (gtfs/utils/timetable_bundle.py)
+3. Writes them with a manifest.json to BUNDLE_DIR/v<current feed version>/
+   and deletes the bundles of older feed versions
+
+Runs at the end of ingest_gtfs, after the new FeedVersion is created.
+"""
+
+import json
+import os
+import time
+
+from config.metrics import InstrumentedCommand
+from gtfs.models import FeedVersion
+from gtfs.utils.timetable_bundle import (
+    FORMAT_VERSION, REGION_ZOOM, encode_bundle, group_trips, load_feed, prune_versions,
+    region_filename, route_filename, version_directory, write_file,
+)
+
+
+class Command(InstrumentedCommand):
+    help = 'Build per-route and per-region offline timetable bundles for the current feed version'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Encode and report sizes without writing files'
+        )
+        parser.add_argument(
+            '--no-compress',
+            action='store_true',
+            help='Store bundle bodies uncompressed'
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        compress = not options['no_compress']
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING('DRY RUN MODE - No changes will be made'))
+
+        version = FeedVersion.current()
+        if version is None:
+            self.stdout.write(self.style.ERROR('✗ No feed version. Run ingest_gtfs first.'))
+            return
+
+        start = time.perf_counter()
+        stops, routes, trips = load_feed()
+        by_route, by_region = group_trips(stops, trips)
+        directory = version_directory(version.id)
+
+        manifest = {
+            'feed_version': version.id,
+            'format': FORMAT_VERSION,
+            'compressed': compress,
+            'region_zoom': REGION_ZOOM,
+            'routes': {},
+            'regions': {},
+        }
+        total_bytes = 0
+        bundles = [
+            ('routes', route_id, route_filename(route_id), route_trips)
+            for route_id, route_trips in sorted(by_route.items())
+        ] + [
+            ('regions', f'{z}/{x}/{y}', region_filename(z, x, y), region_trips)
+            for (z, x, y), region_trips in sorted(by_region.items())
+        ]
+        for section, key, filename, bundle_trips in bundles:
+            data = encode_bundle(version.id, stops, routes, bundle_trips, compress=compress)
+            total_bytes += len(data)
+            manifest[section][key] = {'file': filename, 'bytes': len(data), 'trips': len(bundle_trips)}
+            if not dry_run:
+                write_file(os.path.join(directory, filename), data)
+
+        if not dry_run:
+            # Last, so a manifest only ever lists bundles that exist
+            write_file(os.path.join(directory, 'manifest.json'), json.dumps(manifest).encode())
+            prune_versions(version.id)
+        elapsed = time.perf_counter() - start
+
+        summary = (f'{len(by_route)} route and {len(by_region)} region bundles, '
+                   f'{total_bytes / 1e6:.1f} MB in {elapsed:.1f}s')
+        if dry_run:
+            self.stdout.write(f'Encoded {summary}')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'✓ Wrote {summary} ({version})'))
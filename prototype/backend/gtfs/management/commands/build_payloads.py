@@ -0,0 +1,75 @@
+"""
+Management command to prebuild trip-detail and route-summary payloads.
+
+This command:
+1. Renders every trip's detail and every route's summary as JSON bytes
+   (gtfs/utils/payloads.py)
+2. Stores them as PrebuiltPayload rows of the current feed version
+3. Deletes the payloads of older feed versions
+
+Runs at the end of ingest_gtfs, after the new FeedVersion is created.
+"""
+
+import time
+
+from config.metrics import InstrumentedCommand
+from django.db import transaction
+from gtfs.models import FeedVersion, PrebuiltPayload
+from gtfs.utils.payloads import KIND_ROUTE, KIND_TRIP, encode, route_payloads, trip_payloads
+
+BATCH_SIZE = 2000
+
+
+class Command(InstrumentedCommand):
+    help = 'Prebuild trip-detail and route-summary API payloads for the current feed version'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Render and report sizes without saving'
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING('DRY RUN MODE - No changes will be made'))
+
+        version = FeedVersion.current()
+        if version is None:
+            self.stdout.write(self.style.ERROR('✗ No feed version. Run ingest_gtfs first.'))
+            return
+
+        start = time.perf_counter()
+        counts = {KIND_TRIP: 0, KIND_ROUTE: 0}
+        total_bytes = 0
+        with transaction.atomic():
+            if not dry_run:
+                PrebuiltPayload.objects.filter(feed_version=version).delete()
+
+            batch = []
+            for kind, payloads in ((KIND_TRIP, trip_payloads()), (KIND_ROUTE, route_payloads())):
+                for key, data in payloads:
+                    body = encode(data)
+                    counts[kind] += 1
+                    total_bytes += len(body)
+                    if dry_run:
+                        continue
+                    batch.append(PrebuiltPayload(feed_version=version, kind=kind, key=key, body=body))
+                    if len(batch) >= BATCH_SIZE:
+                        PrebuiltPayload.objects.bulk_create(batch)
+                        batch = []
+            if batch:
+                PrebuiltPayload.objects.bulk_create(batch)
+
+            if not dry_run:
+                PrebuiltPayload.objects.exclude(feed_version=version).delete()
+        elapsed = time.perf_counter() - start
+
+        summary = (f'{counts[KIND_TRIP]} trips and {counts[KIND_ROUTE]} routes, '
+                   f'{total_bytes / 1e6:.1f} MB in {elapsed:.1f}s')
+        if dry_run:
+            self.stdout.write(f'Rendered {summary}')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'✓ Saved payloads for {summary} ({version})'))
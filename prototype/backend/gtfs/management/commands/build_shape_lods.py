@@ -0,0 +1,65 @@
+"""
+Management command to precompute simplified shapes for the map.
+
+This command:
+1. Loads every shape
+2. Simplifies it once per tolerance in LOD_TOLERANCES with Douglas-Peucker
+   (gtfs/utils/shape_lod.py) and encodes each result as a polyline
+3. Replaces the ShapeLOD table with the result
+
+Runs at the end of ingest_gtfs.
+"""
+
+import time
+
+from config.metrics import InstrumentedCommand
+from django.db import transaction
+from gtfs.models import Shape, ShapeLOD
+from gtfs.utils.shape_lod import LOD_TOLERANCES, build_lods
+
+
+class Command(InstrumentedCommand):
+    help = 'Precompute levels of detail of every shape'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show the simplification results without saving'
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING('DRY RUN MODE - No changes will be made'))
+
+        start = time.perf_counter()
+        rows = []
+        raw_points = 0
+        points_per_level = [0] * len(LOD_TOLERANCES)
+        for shape_id, geometry in Shape.objects.values_list('shape_id', 'geometry').iterator(chunk_size=500):
+            coords = [(lat, lon) for lon, lat in geometry.coords]
+            raw_points += len(coords)
+            for level, tolerance, num_points, polyline in build_lods(coords):
+                points_per_level[level] += num_points
+                rows.append(ShapeLOD(
+                    shape_id=shape_id,
+                    level=level,
+                    tolerance_meters=tolerance,
+                    num_points=num_points,
+                    polyline=polyline,
+                ))
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(f'Simplified {len(rows) // len(LOD_TOLERANCES)} shapes ({raw_points} points) in {elapsed:.2f}s')
+        for level, (tolerance, points) in enumerate(zip(LOD_TOLERANCES, points_per_level)):
+            self.stdout.write(f'  level {level} ({tolerance:g} m): {points} points')
+        if dry_run:
+            return
+
+        with transaction.atomic():
+            ShapeLOD.objects.all().delete()
+            ShapeLOD.objects.bulk_create(rows, batch_size=2000)
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Saved {len(rows)} shape levels of detail'))
@@ -0,0 +1,111 @@
+"""
+Management command to compute stop directions and stations.
+
+This command:
+1. Loads stops, shapes and every trip's stop sequence
+2. Computes each stop's bearing, side and most common destination
+   (gtfs/utils/stop_directions.py)
+3. Groups same-name stops within --station-radius into Stations
+4. Saves the result on Stop and replaces the Station table
+
+Runs at the end of ingest_gtfs.
+"""
+
+import time
+from collections import defaultdict
+
+from django.contrib.gis.geos import Point
+from config.metrics import InstrumentedCommand
+from django.db import transaction
+from gtfs.models import Shape, Station, Stop, Trip
+from gtfs.utils.patterns import load_schedules
+from gtfs.utils.stop_directions import STATION_RADIUS_METERS, compass_label, compute_directions, group_stations
+
+
+class Command(InstrumentedCommand):
+    help = 'Compute stop bearings, sides and stations'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--station-radius',
+            type=float,
+            default=STATION_RADIUS_METERS,
+            help=f'Same-name stops within this many meters form a station (default: {STATION_RADIUS_METERS:.0f})'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Compute and report without saving'
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING('DRY RUN MODE - No changes will be made'))
+
+        start = time.perf_counter()
+        stops = {}
+        names = {}
+        for stop_id, name, geom in Stop.objects.values_list('stop_id', 'name', 'geom'):
+            stops[stop_id] = (geom.y, geom.x)
+            names[stop_id] = name
+
+        shapes = {
+            shape_id: [(lat, lon) for lon, lat in geometry.coords]
+            for shape_id, geometry in Shape.objects.values_list('shape_id', 'geometry')
+        }
+        trip_shapes = {}
+        trip_headsigns = {}
+        for trip_id, shape_id, headed_to in Trip.objects.values_list('trip_id', 'shape_id', 'headed_to'):
+            if shape_id:
+                trip_shapes[trip_id] = shape_id
+            trip_headsigns[trip_id] = headed_to
+
+        visits = (
+            (trip.trip_id, stop_id)
+            for trip in load_schedules()
+            for stop_id in trip.stop_ids
+        )
+
+        directions = compute_directions(stops, visits, trip_shapes, shapes, trip_headsigns)
+        stations = group_stations(stops, names, options['station_radius'])
+        elapsed = time.perf_counter() - start
+
+        members = defaultdict(list)
+        for stop_id, station_id in stations.items():
+            members[station_id].append(stop_id)
+        grouped = {station_id: ids for station_id, ids in members.items() if len(ids) > 1}
+
+        with_bearing = sum(1 for bearing, _ in directions.values() if bearing is not None)
+        self.stdout.write(
+            f'Computed in {elapsed:.2f}s: {with_bearing}/{len(stops)} stops with a bearing, '
+            f'{len(grouped)} stations grouping {sum(len(ids) for ids in grouped.values())} stops'
+        )
+        if dry_run:
+            return
+
+        station_rows = []
+        for station_id, ids in grouped.items():
+            lat = sum(stops[stop_id][0] for stop_id in ids) / len(ids)
+            lon = sum(stops[stop_id][1] for stop_id in ids) / len(ids)
+            station_rows.append(Station(station_id=station_id, name=names[station_id], geom=Point(lon, lat)))
+
+        updates = []
+        for stop_id, (bearing, towards) in directions.items():
+            station_id = stations[stop_id]
+            updates.append(Stop(
+                stop_id=stop_id,
+                station_id=station_id if station_id in grouped else None,
+                bearing=bearing,
+                side=compass_label(bearing),
+                towards=towards or '',
+            ))
+
+        with transaction.atomic():
+            Stop.objects.update(station=None)
+            Station.objects.all().delete()
+            Station.objects.bulk_create(station_rows, batch_size=5000)
+            Stop.objects.bulk_update(updates, ['station', 'bearing', 'side', 'towards'], batch_size=2000)
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Saved directions for {len(updates)} stops, {len(station_rows)} stations'))
@@ -0,0 +1,73 @@
+"""
+Management command to build the walking transfer table.
+
+This command:
+1. Loads all stop coordinates
+2. Finds every stop pair within --max-distance using the in-memory grid index
+   (gtfs/utils/transfers.py) - no all-pairs comparison
+3. Replaces the Transfer table with the result
+
+Runs at the end of ingest_gtfs; run it by hand after changing --max-distance.
+"""
+
+import time
+
+from config.metrics import InstrumentedCommand
+from django.db import transaction
+from gtfs.models import Stop, Transfer
+from gtfs.utils.transfers import MAX_WALK_METERS, find_transfers, walking_seconds
+
+
+class Command(InstrumentedCommand):
+    help = 'Build walking transfers between nearby stops'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-distance',
+            type=float,
+            default=MAX_WALK_METERS,
+            help=f'Maximum straight-line distance in meters (default: {MAX_WALK_METERS:.0f})'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show how many transfers would be built without saving'
+        )
+
+    def handle(self, *args, **options):
+        max_distance = options['max_distance']
+        dry_run = options['dry_run']
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING('DRY RUN MODE - No changes will be made'))
+
+        stops = {
+            stop_id: (geom.y, geom.x)
+            for stop_id, geom in Stop.objects.values_list('stop_id', 'geom')
+        }
+        self.stdout.write(f'Finding transfers within {max_distance:.0f}m among {len(stops)} stops...')
+
+        start = time.perf_counter()
+        pairs = find_transfers(stops, max_distance)
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(f'Found {len(pairs)} transfers in {elapsed:.2f}s')
+        if dry_run:
+            return
+
+        with transaction.atomic():
+            Transfer.objects.all().delete()
+            Transfer.objects.bulk_create(
+                (
+                    Transfer(
+                        from_stop_id=from_stop,
+                        to_stop_id=to_stop,
+                        distance_meters=distance,
+                        walking_seconds=walking_seconds(distance),
+                    )
+                    for from_stop, to_stop, distance in pairs
+                ),
+                batch_size=5000,
+            )
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Saved {len(pairs)} transfers'))
@@ -1,11 +1,17 @@
 import csv
 import os
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management import call_command
+from config.metrics import InstrumentedCommand
 from django.contrib.gis.geos import Point, LineString
-from gtfs.models import Agency, Stop, Route, Trip, StopTime, Shape
+from collections import defaultdict
+from gtfs.models import Agency, Stop, Route, Trip, Shape, FeedVersion, StopPattern, PatternStop, PatternTiming, Frequency
+from gtfs.routing.csa import ConnectionScan
+from gtfs.utils.patterns import extract_patterns
 from gtfs.utils.time_helpers import gtfs_time_to_seconds
+from gtfs.utils import feed_diff, vector_tiles
 
-class Command(BaseCommand):
+class Command(InstrumentedCommand):
     help = 'Ingest GTFS data from a directory'
 
     def add_arguments(self, parser):
@@ -14,10 +20,15 @@ class Command(BaseCommand):
     def handle(self, *args, **kwargs):
         folder_path = kwargs['folder_path']
         
+        # What the old feed looked like, to record what this one changes
+        self.stdout.write("Snapshotting current GTFS data...")
+        previous_version = FeedVersion.current()
+        old_snapshot = feed_diff.snapshot()
+        
         self.stdout.write("Clearing existing GTFS data...")
         # Delete in order of dependencies
-        StopTime.objects.all().delete()
         Trip.objects.all().delete()
+        StopPattern.objects.all().delete()
         Route.objects.all().delete()
         Stop.objects.all().delete()
         Shape.objects.all().delete()
@@ -28,10 +39,44 @@ class Command(BaseCommand):
         self.import_stops(os.path.join(folder_path, 'stops.txt'))
         self.import_routes(os.path.join(folder_path, 'routes.txt'))
         self.import_shapes(os.path.join(folder_path, 'shapes.txt'))
-        self.import_trips(os.path.join(folder_path, 'trips.txt'), os.path.join(folder_path, 'stop_times.txt'))
-        self.import_stop_times(os.path.join(folder_path, 'stop_times.txt'))
+        trip_schedules = self.import_stop_times(os.path.join(folder_path, 'stop_times.txt'))
+        self.import_trips(os.path.join(folder_path, 'trips.txt'), trip_schedules)
+        self.import_frequencies(os.path.join(folder_path, 'frequencies.txt'))
+        
+        # Walking transfers (deleting the stops above cascaded to the old ones)
+        call_command('build_transfers', stdout=self.stdout)
+        
+        # Stop bearings / sides and same-name stations
+        call_command('build_stop_directions', stdout=self.stdout)
+        
+        # Simplified shapes for the map (deleting the shapes above cascaded to the old ones)
+        call_command('build_shape_lods', stdout=self.stdout)
+        
+        # New version invalidates every cache derived from the timetable
+        feed_version = FeedVersion.objects.create(source=os.path.abspath(folder_path))
+        
+        # Change set for /api/gtfs/changes/ - unless the old data predates feed versions,
+        # in which case clients cannot have a version to diff from
+        if previous_version is not None or not any(old_snapshot.values()):
+            num_changes = feed_diff.record_changes(feed_version, old_snapshot)
+            self.stdout.write(f"Recorded {num_changes} changes since the previous feed.")
+        feed_diff.prune_changes(feed_version.id, settings.FEED_CHANGE_RETENTION)
+        
+        # Connection arrays for isochrones, so web workers only have to mmap them
+        self.stdout.write("Building connection arrays...")
+        ConnectionScan.build_for_version(feed_version.id)
+        ConnectionScan.prune_versions(feed_version.id)
+        
+        # Trip-detail / route-summary JSON, served as stored bytes
+        call_command('build_payloads', stdout=self.stdout)
         
-        self.stdout.write(self.style.SUCCESS('Successfully ingested GTFS data'))
+        # Offline timetables per route and region, served as static files
+        call_command('build_bundles', stdout=self.stdout)
+        
+        # Map tiles are rendered lazily into a new directory; old versions' tiles are stale
+        vector_tiles.prune_versions(feed_version.id)
+        
+        self.stdout.write(self.style.SUCCESS(f'Successfully ingested GTFS data ({feed_version})'))
 
     def import_agencies(self, path):
         self.stdout.write(f"Importing agencies from {path}...")
@@ -87,23 +132,12 @@ class Command(BaseCommand):
         self.stdout.write(f"Created {len(routes)} routes.")
 
 
-    def import_trips(self, path, stop_times_path):
-        self.stdout.write(f"Calculating trip destinations from {stop_times_path}...")
-        trip_destinations = {} # trip_id -> last_stop_id
-        trip_max_sequence = {} # trip_id -> max_sequence
-
-        # First pass: find last stop ID for each trip
-        with open(stop_times_path, 'r', encoding='utf-8-sig') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                uid = row['trip_id']
-                seq = int(row['stop_sequence'])
-                sid = row['stop_id']
-                
-                if uid not in trip_max_sequence or seq > trip_max_sequence[uid]:
-                    trip_max_sequence[uid] = seq
-                    trip_destinations[uid] = sid
-
+    def import_trips(self, path, trip_schedules):
+        """
+        Args:
+            trip_schedules: dict trip_id -> (pattern_id, timing_id, start_seconds, last_stop_id)
+                            from import_stop_times
+        """
         # Load all stop names to memory for fast lookup
         stop_names = dict(Stop.objects.values_list('stop_id', 'name'))
 
@@ -114,7 +148,7 @@ class Command(BaseCommand):
             reader = csv.DictReader(f)
             for row in reader:
                 tid = row['trip_id']
-                last_stop_id = trip_destinations.get(tid)
+                pattern_id, timing_id, start_seconds, last_stop_id = trip_schedules.get(tid, (None, None, None, None))
                 headed_to = stop_names.get(last_stop_id, "Unknown")
 
                 trips.append(Trip(
@@ -122,11 +156,45 @@ class Command(BaseCommand):
                     route_id=row['route_id'], # Referencing the PK directly
                     service_id=row['service_id'],
                     shape_id=row.get('shape_id'),
-                    headed_to=headed_to
+                    headed_to=headed_to,
+                    pattern_id=pattern_id,
+                    timing_id=timing_id,
+                    start_seconds=start_seconds
                 ))
-        Trip.objects.bulk_create(trips)
+        Trip.objects.bulk_create(trips, batch_size=5000)
         self.stdout.write(f"Created {len(trips)} trips.")
 
+    def import_frequencies(self, path):
+        """Headway windows of frequency-based trips (optional file); the trips stay templates."""
+        if not os.path.exists(path):
+            return
+
+        self.stdout.write(f"Importing frequencies from {path}...")
+        trip_ids = set(Trip.objects.values_list('trip_id', flat=True))
+        frequencies = []
+        skipped = 0
+        with open(path, 'r', encoding='utf-8-sig') as f:
+            reader = csv.DictReader(f)
+            for row in reader:
+                headway = int(row['headway_secs'])
+                start_seconds = gtfs_time_to_seconds(row['start_time'])
+                end_seconds = gtfs_time_to_seconds(row['end_time'])
+                # An empty window (end <= start) has no instances
+                if row['trip_id'] not in trip_ids or headway <= 0 or end_seconds <= start_seconds:
+                    skipped += 1
+                    continue
+                frequencies.append(Frequency(
+                    trip_id=row['trip_id'],
+                    start_seconds=start_seconds,
+                    end_seconds=end_seconds,
+                    headway_seconds=headway,
+                    exact_times=row.get('exact_times', '0').strip() == '1'
+                ))
+        Frequency.objects.bulk_create(frequencies)
+        self.stdout.write(f"Created {len(frequencies)} frequency windows.")
+        if skipped:
+            self.stdout.write(self.style.WARNING(f"Skipped {skipped} rows (unknown trip, invalid headway or end_time not after start_time)."))
+
     def import_shapes(self, path):
         self.stdout.write(f"Importing shapes from {path}...")
         if not os.path.exists(path):
@@ -158,20 +226,51 @@ class Command(BaseCommand):
         self.stdout.write(f"Created {len(shapes)} shapes.")
 
     def import_stop_times(self, path):
+        """
+        Store stop_times deduplicated as stop patterns and shared timings
+        (see gtfs/utils/patterns.py); trips are linked to them in import_trips.
+
+        Returns:
+            dict trip_id -> (pattern_id, timing_id, start_seconds, last_stop_id)
+        """
         self.stdout.write(f"Importing stop_times from {path}...")
-        stop_times = []
+        trip_stop_times = defaultdict(list)
+        num_stop_times = 0
         with open(path, 'r', encoding='utf-8-sig') as f:
             reader = csv.DictReader(f)
             for row in reader:
-                stop_times.append(StopTime(
-                    trip_id=row['trip_id'],
-                    stop_id=row['stop_id'],
-                    stop_sequence=int(row['stop_sequence']),
-                    arrival_seconds=gtfs_time_to_seconds(row['arrival_time']),
-                    departure_seconds=gtfs_time_to_seconds(row['departure_time'])
+                trip_stop_times[row['trip_id']].append((
+                    int(row['stop_sequence']),
+                    row['stop_id'],
+                    gtfs_time_to_seconds(row['arrival_time']),
+                    gtfs_time_to_seconds(row['departure_time'])
                 ))
-        # Large file, chunk it
-        batch_size = 5000
-        for i in range(0, len(stop_times), batch_size):
-            StopTime.objects.bulk_create(stop_times[i:i+batch_size])
-        self.stdout.write(f"Created {len(stop_times)} stop times.")
+                num_stop_times += 1
+
+        patterns, timings, trips = extract_patterns(trip_stop_times)
+
+        pattern_rows = StopPattern.objects.bulk_create([StopPattern(stop_count=len(stops)) for stops in patterns])
+        PatternStop.objects.bulk_create(
+            (
+                PatternStop(pattern=pattern_rows[p], position=position, stop_id=stop_id, stop_sequence=sequence)
+                for p, stops in enumerate(patterns)
+                for position, (sequence, stop_id) in enumerate(stops)
+            ),
+            batch_size=5000
+        )
+        timing_rows = PatternTiming.objects.bulk_create(
+            [
+                PatternTiming(pattern=pattern_rows[p], arrival_offsets=list(arrivals), departure_offsets=list(departures))
+                for p, arrivals, departures in timings
+            ],
+            batch_size=5000
+        )
+        self.stdout.write(
+            f"Stored {num_stop_times} stop times of {len(trips)} trips as "
+            f"{len(patterns)} stop patterns with {len(timings)} timings."
+        )
+
+        return {
+            trip_id: (pattern_rows[p].id, timing_rows[timing].id, start, patterns[p][-1][1])
+            for trip_id, (p, timing, start) in trips.items()
+        }
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.10 on 2026-02-14 08:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gtfs', '0005_shape_remove_trip_shape_id_trip_shape'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('source', models.CharField(blank=True, help_text='Folder the feed was ingested from', max_length=1024)),
+            ],
+            options={
+                'ordering': ['-id'],
+            },
+        ),
+    ]
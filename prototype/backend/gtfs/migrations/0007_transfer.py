@@ -0,0 +1,27 @@
+# Generated by Django 5.2.10 on 2026-10-18 15:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gtfs', '0006_feedversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Transfer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('distance_meters', models.FloatField(help_text='Straight-line distance')),
+                ('walking_seconds', models.IntegerField(help_text='Estimated walking time, including detour factor')),
+                ('from_stop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transfers_from', to='gtfs.stop')),
+                ('to_stop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transfers_to', to='gtfs.stop')),
+            ],
+            options={
+                'unique_together': {('from_stop', 'to_stop')},
+            },
+        ),
+    ]
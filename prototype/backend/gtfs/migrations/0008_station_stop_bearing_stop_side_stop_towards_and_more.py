@@ -0,0 +1,43 @@
+# Generated by Django 5.2.10 on 2026-10-18 16:02
+
+import django.contrib.gis.db.models.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gtfs', '0007_transfer'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Station',
+            fields=[
+                ('station_id', models.CharField(help_text='Smallest stop_id of its stops', max_length=255, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=255)),
+                ('geom', django.contrib.gis.db.models.fields.PointField(help_text='Centroid of its stops', srid=4326)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='stop',
+            name='bearing',
+            field=models.FloatField(blank=True, help_text='Direction buses leave in, degrees clockwise from north. Null if served in mixed directions', null=True),
+        ),
+        migrations.AddField(
+            model_name='stop',
+            name='side',
+            field=models.CharField(blank=True, help_text='Compass label of the bearing (N, NE, ...)', max_length=2),
+        ),
+        migrations.AddField(
+            model_name='stop',
+            name='towards',
+            field=models.CharField(blank=True, help_text='Most common destination of departing trips', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='stop',
+            name='station',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stops', to='gtfs.station'),
+        ),
+    ]
@@ -0,0 +1,206 @@
+# Generated by Django 5.2.10 on 2026-10-18 16:40
+
+import django.contrib.postgres.fields
+import django.db.models.deletion
+from collections import defaultdict
+from django.db import migrations, models
+
+
+STOPTIME_VIEW_SQL = """
+CREATE VIEW gtfs_stoptime AS
+SELECT
+    t.trip_id AS trip_id,
+    ps.stop_id AS stop_id,
+    ps.stop_sequence AS stop_sequence,
+    t.start_seconds + tm.arrival_offsets[ps.position + 1] AS arrival_seconds,
+    t.start_seconds + tm.departure_offsets[ps.position + 1] AS departure_seconds
+FROM gtfs_trip t
+JOIN gtfs_patternstop ps ON ps.pattern_id = t.pattern_id
+JOIN gtfs_patterntiming tm ON tm.id = t.timing_id
+"""
+
+
+def extract_patterns(trip_stop_times):
+    """
+    Frozen copy of gtfs.utils.patterns.extract_patterns as of this migration,
+    so later changes to that module cannot change what the migration does.
+
+    Returns:
+        (patterns, timings, trips) - see gtfs/utils/patterns.py
+    """
+    pattern_numbers = {}
+    timing_numbers = {}
+    timings = []
+    trips = {}
+
+    for trip_id, rows in trip_stop_times.items():
+        rows = sorted(rows)
+        stops = tuple((sequence, stop_id) for sequence, stop_id, _, _ in rows)
+        pattern = pattern_numbers.setdefault(stops, len(pattern_numbers))
+
+        start = rows[0][3]
+        arrival_offsets = tuple(arrival - start for _, _, arrival, _ in rows)
+        departure_offsets = tuple(departure - start for _, _, _, departure in rows)
+        key = (pattern, arrival_offsets, departure_offsets)
+        timing = timing_numbers.get(key)
+        if timing is None:
+            timing = timing_numbers[key] = len(timings)
+            timings.append(key)
+
+        trips[trip_id] = (pattern, timing, start)
+
+    return list(pattern_numbers), timings, trips
+
+
+def stop_times_to_patterns(apps, schema_editor):
+    StopTime = apps.get_model('gtfs', 'StopTime')
+    StopPattern = apps.get_model('gtfs', 'StopPattern')
+    PatternStop = apps.get_model('gtfs', 'PatternStop')
+    PatternTiming = apps.get_model('gtfs', 'PatternTiming')
+    Trip = apps.get_model('gtfs', 'Trip')
+
+    trip_stop_times = defaultdict(list)
+    for trip_id, sequence, stop_id, arrival, departure in StopTime.objects.values_list(
+        'trip_id', 'stop_sequence', 'stop_id', 'arrival_seconds', 'departure_seconds'
+    ).iterator(chunk_size=20000):
+        trip_stop_times[trip_id].append((sequence, stop_id, arrival, departure))
+    if not trip_stop_times:
+        return
+
+    patterns, timings, trips = extract_patterns(trip_stop_times)
+    pattern_rows = StopPattern.objects.bulk_create([StopPattern(stop_count=len(stops)) for stops in patterns])
+    PatternStop.objects.bulk_create(
+        (
+            PatternStop(pattern=pattern_rows[p], position=position, stop_id=stop_id, stop_sequence=sequence)
+            for p, stops in enumerate(patterns)
+            for position, (sequence, stop_id) in enumerate(stops)
+        ),
+        batch_size=5000,
+    )
+    timing_rows = PatternTiming.objects.bulk_create(
+        [
+            PatternTiming(pattern=pattern_rows[p], arrival_offsets=list(arrivals), departure_offsets=list(departures))
+            for p, arrivals, departures in timings
+        ],
+        batch_size=5000,
+    )
+
+    updates = []
+    for trip in Trip.objects.filter(trip_id__in=list(trips)):
+        p, timing, start = trips[trip.trip_id]
+        trip.pattern_id = pattern_rows[p].id
+        trip.timing_id = timing_rows[timing].id
+        trip.start_seconds = start
+        updates.append(trip)
+    Trip.objects.bulk_update(updates, ['pattern', 'timing', 'start_seconds'], batch_size=2000)
+
+
+def patterns_to_stop_times(apps, schema_editor):
+    StopTime = apps.get_model('gtfs', 'StopTime')
+    PatternStop = apps.get_model('gtfs', 'PatternStop')
+    PatternTiming = apps.get_model('gtfs', 'PatternTiming')
+    Trip = apps.get_model('gtfs', 'Trip')
+
+    pattern_stops = defaultdict(list)
+    for pattern_id, sequence, stop_id in PatternStop.objects.order_by('pattern_id', 'position').values_list(
+        'pattern_id', 'stop_sequence', 'stop_id'
+    ):
+        pattern_stops[pattern_id].append((sequence, stop_id))
+    timings = {
+        timing_id: (arrivals, departures)
+        for timing_id, arrivals, departures in PatternTiming.objects.values_list(
+            'id', 'arrival_offsets', 'departure_offsets'
+        )
+    }
+
+    def rows():
+        for trip_id, pattern_id, timing_id, start in Trip.objects.filter(pattern__isnull=False).values_list(
+            'trip_id', 'pattern_id', 'timing_id', 'start_seconds'
+        ).iterator(chunk_size=20000):
+            arrivals, departures = timings[timing_id]
+            for (sequence, stop_id), arrival, departure in zip(pattern_stops[pattern_id], arrivals, departures):
+                yield StopTime(
+                    trip_id=trip_id,
+                    stop_id=stop_id,
+                    stop_sequence=sequence,
+                    arrival_seconds=start + arrival,
+                    departure_seconds=start + departure,
+                )
+
+    StopTime.objects.bulk_create(rows(), batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gtfs', '0008_station_stop_bearing_stop_side_stop_towards_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StopPattern',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stop_count', models.IntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PatternTiming',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('arrival_offsets', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), size=None)),
+                ('departure_offsets', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), size=None)),
+                ('pattern', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timings', to='gtfs.stoppattern')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PatternStop',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.IntegerField(help_text='0-based index into the PatternTiming offset arrays')),
+                ('stop_sequence', models.IntegerField()),
+                ('pattern', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pattern_stops', to='gtfs.stoppattern')),
+                ('stop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pattern_stops', to='gtfs.stop')),
+            ],
+            options={
+                'ordering': ['position'],
+                'constraints': [models.UniqueConstraint(fields=('pattern', 'position'), name='unique_pattern_position')],
+            },
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='pattern',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='trips', to='gtfs.stoppattern'),
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='start_seconds',
+            field=models.IntegerField(blank=True, help_text='Departure from the first stop, seconds since 00:00:00 of service day', null=True),
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='timing',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='trips', to='gtfs.patterntiming'),
+        ),
+        migrations.RunPython(stop_times_to_patterns, patterns_to_stop_times),
+        migrations.DeleteModel(
+            name='StopTime',
+        ),
+        migrations.CreateModel(
+            name='StopTime',
+            fields=[
+                ('pk', models.CompositePrimaryKey('trip_id', 'stop_sequence', blank=True, editable=False, primary_key=True, serialize=False)),
+                ('stop_sequence', models.IntegerField()),
+                ('arrival_seconds', models.IntegerField(help_text='Seconds since 00:00:00 of service day (can exceed 86400 for late-night trips)')),
+                ('departure_seconds', models.IntegerField(help_text='Seconds since 00:00:00 of service day')),
+                ('stop', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, related_name='stop_times', to='gtfs.stop')),
+                ('trip', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, related_name='stop_times', to='gtfs.trip')),
+            ],
+            options={
+                'db_table': 'gtfs_stoptime',
+                'ordering': ['stop_sequence'],
+                'managed': False,
+            },
+        ),
+        migrations.RunSQL(STOPTIME_VIEW_SQL, 'DROP VIEW IF EXISTS gtfs_stoptime'),
+    ]
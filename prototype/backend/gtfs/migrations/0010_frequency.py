@@ -0,0 +1,28 @@
+# Generated by Django 5.2.10 on 2026-10-18 17:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gtfs', '0009_stoppattern_patterntiming_patternstop_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Frequency',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_seconds', models.IntegerField(help_text='First departure of the window, seconds since 00:00:00 of service day')),
+                ('end_seconds', models.IntegerField(help_text='End of the window (exclusive), seconds since 00:00:00 of service day')),
+                ('headway_seconds', models.IntegerField()),
+                ('exact_times', models.BooleanField(default=False, help_text='Departures are exactly on the headway grid (GTFS exact_times=1)')),
+                ('trip', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='frequencies', to='gtfs.trip')),
+            ],
+            options={
+                'ordering': ['trip', 'start_seconds'],
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.10 on 2026-10-18 17:50
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gtfs', '0010_frequency'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='stop',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='gtfs_stop_name_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
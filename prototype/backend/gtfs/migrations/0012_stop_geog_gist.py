@@ -0,0 +1,19 @@
+# Generated by Django 5.2.10 on 2026-10-18 18:05
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gtfs', '0011_stop_name_trgm'),
+    ]
+
+    operations = [
+        # KNN index for gtfs/utils/nearest_stops.py: `geom::geography <-> point` orders by
+        # meters and can only use an index on the same geography expression
+        migrations.RunSQL(
+            'CREATE INDEX gtfs_stop_geog_gist ON gtfs_stop USING GIST ((geom::geography))',
+            'DROP INDEX IF EXISTS gtfs_stop_geog_gist',
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.10 on 2026-10-18 18:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gtfs', '0012_stop_geog_gist'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShapeLOD',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.SmallIntegerField(help_text='0 = finest')),
+                ('tolerance_meters', models.FloatField(help_text='Douglas-Peucker tolerance')),
+                ('num_points', models.IntegerField()),
+                ('polyline', models.TextField(help_text='Encoded polyline (Google format, precision 5)')),
+                ('shape', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lods', to='gtfs.shape')),
+            ],
+            options={
+                'ordering': ['shape', 'level'],
+                'constraints': [models.UniqueConstraint(fields=('shape', 'level'), name='unique_shape_lod_level')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.10 on 2026-10-18 18:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gtfs', '0013_shapelod'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrebuiltPayload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('trip', 'Trip detail'), ('route', 'Route summary')], max_length=16)),
+                ('key', models.CharField(help_text='trip_id or route_id', max_length=255)),
+                ('body', models.BinaryField()),
+                ('feed_version', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payloads', to='gtfs.feedversion')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('feed_version', 'kind', 'key'), name='unique_payload_per_version')],
+            },
+        ),
+    ]
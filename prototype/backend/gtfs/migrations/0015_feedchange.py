@@ -0,0 +1,33 @@
+# Generated by Django 5.2.10 on 2026-10-18 19:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gtfs', '0014_prebuiltpayload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='feedversion',
+            name='has_changes',
+            field=models.BooleanField(default=False, help_text='FeedChange rows against the previous version are recorded (and not yet pruned)'),
+        ),
+        migrations.CreateModel(
+            name='FeedChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('stop', 'Stop'), ('route', 'Route'), ('trip', 'Trip')], max_length=16)),
+                ('entity_id', models.CharField(max_length=255)),
+                ('action', models.CharField(choices=[('added', 'Added'), ('updated', 'Updated'), ('removed', 'Removed')], max_length=8)),
+                ('data', models.JSONField(blank=True, help_text='New values in feed_diff.ENTITY_FIELDS order; null if removed', null=True)),
+                ('feed_version', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='changes', to='gtfs.feedversion')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['feed_version', 'kind'], name='gtfs_change_version_kind')],
+            },
+        ),
+    ]
@@ -1,4 +1,101 @@
+import time
+
 from django.contrib.gis.db import models
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+
+class FeedVersion(models.Model):
+    """
+    One row per successful `ingest_gtfs` run.
+    In-memory structures derived from the timetable (trip matcher, routers, ...)
+    are cached per feed version and rebuilt when a new one appears.
+    """
+    created_at = models.DateTimeField(auto_now_add=True)
+    source = models.CharField(max_length=1024, blank=True, help_text="Folder the feed was ingested from")
+    has_changes = models.BooleanField(
+        default=False,
+        help_text="FeedChange rows against the previous version are recorded (and not yet pruned)"
+    )
+
+    class Meta:
+        ordering = ['-id']
+
+    def __str__(self):
+        return f"Feed v{self.id} ({self.created_at:%Y-%m-%d %H:%M})"
+
+    # (time.monotonic() of the lookup, version) for current_cached()
+    _current_memo = (None, None)
+    CURRENT_TTL_SECONDS = 5.0
+
+    @classmethod
+    def current(cls):
+        """Latest ingested feed version, or None before the first ingest."""
+        return cls.objects.order_by('-id').first()
+
+    @classmethod
+    def current_cached(cls):
+        """
+        current(), re-read from the database at most every CURRENT_TTL_SECONDS
+        per process. Lets conditional GETs (gtfs/utils/conditional.py) answer
+        304 without a query; a new ingest is seen within the TTL.
+        """
+        checked_at, version = cls._current_memo
+        now = time.monotonic()
+        if checked_at is None or now - checked_at > cls.CURRENT_TTL_SECONDS:
+            version = cls.current()
+            cls._current_memo = (now, version)  # one tuple assignment: readers never see a torn pair
+        return version
+
+class PrebuiltPayload(models.Model):
+    """
+    API response body rendered once per feed version by `build_payloads`
+    (JSON bytes, see gtfs/utils/payloads.py).
+    """
+    KIND_CHOICES = [
+        ('trip', 'Trip detail'),
+        ('route', 'Route summary'),
+    ]
+    feed_version = models.ForeignKey(FeedVersion, on_delete=models.CASCADE, related_name='payloads')
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    key = models.CharField(max_length=255, help_text="trip_id or route_id")
+    body = models.BinaryField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['feed_version', 'kind', 'key'], name='unique_payload_per_version'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.key} (v{self.feed_version_id}, {len(self.body)} bytes)"
+
+class FeedChange(models.Model):
+    """
+    One stop, route or trip added, updated or removed by a feed version,
+    relative to the previous one (see gtfs/utils/feed_diff.py).
+    """
+    KIND_CHOICES = [
+        ('stop', 'Stop'),
+        ('route', 'Route'),
+        ('trip', 'Trip'),
+    ]
+    ACTION_CHOICES = [
+        ('added', 'Added'),
+        ('updated', 'Updated'),
+        ('removed', 'Removed'),
+    ]
+    feed_version = models.ForeignKey(FeedVersion, on_delete=models.CASCADE, related_name='changes')
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    entity_id = models.CharField(max_length=255)
+    action = models.CharField(max_length=8, choices=ACTION_CHOICES)
+    data = models.JSONField(null=True, blank=True, help_text="New values in feed_diff.ENTITY_FIELDS order; null if removed")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['feed_version', 'kind'], name='gtfs_change_version_kind'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.entity_id} {self.action} (v{self.feed_version_id})"
 
 class Agency(models.Model):
     agency_id = models.CharField(max_length=255, primary_key=True)
@@ -12,14 +109,57 @@ class Agency(models.Model):
     def __str__(self):
         return self.name
 
+class Station(models.Model):
+    """
+    Stops with the same name close to each other (typically one per side of
+    the road), grouped by `build_stop_directions`.
+    """
+    station_id = models.CharField(max_length=255, primary_key=True, help_text="Smallest stop_id of its stops")
+    name = models.CharField(max_length=255)
+    geom = models.PointField(srid=4326, help_text="Centroid of its stops")
+
+    def __str__(self):
+        return f"{self.name} ({self.station_id})"
+
 class Stop(models.Model):
     stop_id = models.CharField(max_length=255, primary_key=True)
     name = models.CharField(max_length=255)
     geom = models.PointField(srid=4326)
     
+    # Computed at ingest by `build_stop_directions`
+    station = models.ForeignKey(Station, on_delete=models.SET_NULL, null=True, blank=True, related_name='stops')
+    bearing = models.FloatField(
+        null=True, blank=True,
+        help_text="Direction buses leave in, degrees clockwise from north. Null if served in mixed directions"
+    )
+    side = models.CharField(max_length=2, blank=True, help_text="Compass label of the bearing (N, NE, ...)")
+    towards = models.CharField(max_length=255, blank=True, help_text="Most common destination of departing trips")
+    
+    class Meta:
+        indexes = [
+            # Trigram index for /stops/search/ (pg_trgm similarity and word similarity)
+            GinIndex(fields=['name'], name='gtfs_stop_name_trgm', opclasses=['gin_trgm_ops']),
+        ]
+    
     def __str__(self):
         return f"{self.name} ({self.stop_id})"
 
+class Transfer(models.Model):
+    """
+    Walking link between two nearby stops, computed by `build_transfers`
+    (both directions are stored).
+    """
+    from_stop = models.ForeignKey(Stop, on_delete=models.CASCADE, related_name='transfers_from')
+    to_stop = models.ForeignKey(Stop, on_delete=models.CASCADE, related_name='transfers_to')
+    distance_meters = models.FloatField(help_text="Straight-line distance")
+    walking_seconds = models.IntegerField(help_text="Estimated walking time, including detour factor")
+
+    class Meta:
+        unique_together = ['from_stop', 'to_stop']
+
+    def __str__(self):
+        return f"{self.from_stop_id} -> {self.to_stop_id} ({self.walking_seconds}s walk)"
+
 class Route(models.Model):
     route_id = models.CharField(max_length=255, primary_key=True)
     short_name = models.CharField(max_length=50)
@@ -36,19 +176,107 @@ class Shape(models.Model):
     def __str__(self):
         return self.shape_id
 
+class ShapeLOD(models.Model):
+    """
+    A shape simplified for one range of map zooms, computed by
+    `build_shape_lods`. See gtfs/utils/shape_lod.py.
+    """
+    shape = models.ForeignKey(Shape, on_delete=models.CASCADE, related_name='lods')
+    level = models.SmallIntegerField(help_text="0 = finest")
+    tolerance_meters = models.FloatField(help_text="Douglas-Peucker tolerance")
+    num_points = models.IntegerField()
+    polyline = models.TextField(help_text="Encoded polyline (Google format, precision 5)")
+
+    class Meta:
+        ordering = ['shape', 'level']
+        constraints = [
+            models.UniqueConstraint(fields=['shape', 'level'], name='unique_shape_lod_level'),
+        ]
+
+    def __str__(self):
+        return f"{self.shape_id} LOD {self.level} ({self.num_points} points)"
+
+class StopPattern(models.Model):
+    """
+    Unique ordered stop sequence shared by trips. See gtfs/utils/patterns.py.
+    """
+    stop_count = models.IntegerField()
+
+    def __str__(self):
+        return f"Pattern {self.id} ({self.stop_count} stops)"
+
+class PatternStop(models.Model):
+    pattern = models.ForeignKey(StopPattern, on_delete=models.CASCADE, related_name='pattern_stops')
+    position = models.IntegerField(help_text="0-based index into the PatternTiming offset arrays")
+    stop = models.ForeignKey(Stop, on_delete=models.CASCADE, related_name='pattern_stops')
+    stop_sequence = models.IntegerField()
+
+    class Meta:
+        ordering = ['position']
+        constraints = [
+            models.UniqueConstraint(fields=['pattern', 'position'], name='unique_pattern_position')
+        ]
+
+    def __str__(self):
+        return f"Pattern {self.pattern_id} #{self.position}: {self.stop_id}"
+
+class PatternTiming(models.Model):
+    """
+    Arrival/departure offsets (seconds from the trip's first departure) at each
+    stop of a pattern, shared by every trip that runs to the same schedule.
+    """
+    pattern = models.ForeignKey(StopPattern, on_delete=models.CASCADE, related_name='timings')
+    arrival_offsets = ArrayField(models.IntegerField())
+    departure_offsets = ArrayField(models.IntegerField())
+
+    def __str__(self):
+        return f"Timing {self.id} of pattern {self.pattern_id}"
+
 class Trip(models.Model):
     trip_id = models.CharField(max_length=255, primary_key=True)
     route = models.ForeignKey(Route, on_delete=models.CASCADE, related_name='trips')
     headed_to = models.CharField(max_length=255, null=True, blank=True)
     shape = models.ForeignKey(Shape, on_delete=models.SET_NULL, null=True, blank=True, related_name='trips')
     service_id = models.CharField(max_length=255)
+    
+    # Schedule: stop time i = start_seconds + timing offsets[i] at pattern stop i
+    pattern = models.ForeignKey(StopPattern, on_delete=models.SET_NULL, null=True, blank=True, related_name='trips')
+    timing = models.ForeignKey(PatternTiming, on_delete=models.SET_NULL, null=True, blank=True, related_name='trips')
+    start_seconds = models.IntegerField(
+        null=True, blank=True,
+        help_text="Departure from the first stop, seconds since 00:00:00 of service day"
+    )
 
     def __str__(self):
         return self.trip_id
 
+class Frequency(models.Model):
+    """
+    Headway window from frequencies.txt. The trip is a template: it departs
+    every headway_seconds from start_seconds until end_seconds (exclusive),
+    with the running times of its own stop times. Departures are expanded on
+    demand (gtfs/utils/frequencies.py), never stored.
+    """
+    trip = models.ForeignKey(Trip, on_delete=models.CASCADE, related_name='frequencies')
+    start_seconds = models.IntegerField(help_text="First departure of the window, seconds since 00:00:00 of service day")
+    end_seconds = models.IntegerField(help_text="End of the window (exclusive), seconds since 00:00:00 of service day")
+    headway_seconds = models.IntegerField()
+    exact_times = models.BooleanField(default=False, help_text="Departures are exactly on the headway grid (GTFS exact_times=1)")
+
+    class Meta:
+        ordering = ['trip', 'start_seconds']
+
+    def __str__(self):
+        return f"{self.trip_id} every {self.headway_seconds}s from {self.start_seconds}s to {self.end_seconds}s"
+
 class StopTime(models.Model):
-    trip = models.ForeignKey(Trip, on_delete=models.CASCADE, related_name='stop_times')
-    stop = models.ForeignKey(Stop, on_delete=models.CASCADE, related_name='stop_times')
+    """
+    One row per (trip, stop), read-only. Backed by the `gtfs_stoptime` view
+    that expands Trip + PatternStop + PatternTiming; ingest writes patterns.
+    """
+    pk = models.CompositePrimaryKey('trip_id', 'stop_sequence')
+    trip = models.ForeignKey(Trip, on_delete=models.DO_NOTHING, related_name='stop_times')
+    stop = models.ForeignKey(Stop, on_delete=models.DO_NOTHING, related_name='stop_times')
     stop_sequence = models.IntegerField()
     
     # Seconds since service day start (supports times > 24:00:00)
@@ -60,10 +288,9 @@ class StopTime(models.Model):
     )
 
     class Meta:
+        managed = False
+        db_table = 'gtfs_stoptime'
         ordering = ['stop_sequence']
-        constraints = [
-            models.UniqueConstraint(fields=['trip', 'stop_sequence'], name='unique_trip_sequence')
-        ]
     
     @property
     def arrival_time_str(self):
@@ -0,0 +1 @@
+# Journey planning over an in-memory timetable
@@ -0,0 +1,267 @@
+"""
+Connection Scan (Isochrones)
+
+Connection Scan Algorithm (Dibbelt, Pajor, Strasser, Wagner) over a flat,
+departure-sorted array of elementary connections: one per consecutive
+StopTime pair of every trip. A scan walks the connections once, in order;
+a connection is usable if its trip was already boarded or its departure
+stop is reached in time. That makes one-to-all earliest arrival - exactly
+what an isochrone needs - a single linear pass over the connections in the
+time window.
+
+Storage: the connections and footpaths are NumPy arrays saved as .npy
+files per feed version (ROUTING_CACHE_DIR/v<id>/) and opened with
+mmap_mode='r'. Every worker process maps the same files, so the pages are
+shared through the OS page cache instead of each worker holding a copy.
+
+Footpaths are stored CSR-style: the links of stop s are
+footpath_targets[footpath_offsets[s]:footpath_offsets[s + 1]].
+"""
+
+import os
+import shutil
+import threading
+
+import numpy as np
+
+MIN_TRANSFER_SECONDS = 60
+PROFILE_MAX_SCANS = 20     # departures tried per profile query
+ARRAY_NAMES = (
+    'departures', 'arrivals', 'from_stops', 'to_stops', 'trips',
+    'footpath_offsets', 'footpath_targets', 'footpath_seconds',
+    'stop_ids', 'stop_coords',
+)
+
+
+def build_arrays(timetable):
+    """
+    Connection and footpath arrays for a Timetable.
+
+    Returns:
+        dict name -> numpy array (see ARRAY_NAMES)
+    """
+    departures, arrivals, from_stops, to_stops, trips = [], [], [], [], []
+    trip_number = 0
+    for p, stops in enumerate(timetable.pattern_stops):
+        stops = np.asarray(stops, dtype=np.int32)
+        # asarray: array('i') columns are wrapped without a copy, frequency instances are expanded
+        deps = np.stack([np.asarray(col, dtype=np.int32) for col in timetable.pattern_departures[p]], axis=1)
+        arrs = np.stack([np.asarray(row, dtype=np.int32) for row in timetable.pattern_arrivals[p]])
+        num_trips, num_stops = arrs.shape
+
+        departures.append(deps[:, :-1].ravel())
+        arrivals.append(arrs[:, 1:].ravel())
+        from_stops.append(np.tile(stops[:-1], num_trips))
+        to_stops.append(np.tile(stops[1:], num_trips))
+        trips.append(np.repeat(np.arange(trip_number, trip_number + num_trips, dtype=np.int32), num_stops - 1))
+        trip_number += num_trips
+
+    departures = np.concatenate(departures)
+    order = np.argsort(departures, kind='stable')
+
+    footpaths = timetable.footpaths
+    counts = np.fromiter((len(links) for links in footpaths), dtype=np.int32, count=len(footpaths))
+    offsets = np.zeros(len(footpaths) + 1, dtype=np.int32)
+    np.cumsum(counts, out=offsets[1:])
+
+    return {
+        'departures': departures[order],
+        'arrivals': np.concatenate(arrivals)[order],
+        'from_stops': np.concatenate(from_stops)[order],
+        'to_stops': np.concatenate(to_stops)[order],
+        'trips': np.concatenate(trips)[order],
+        'footpath_offsets': offsets,
+        'footpath_targets': np.fromiter((t for links in footpaths for t, _ in links), dtype=np.int32),
+        'footpath_seconds': np.fromiter((w for links in footpaths for _, w in links), dtype=np.int32),
+        'stop_ids': np.asarray(timetable.stop_ids, dtype=str),
+        'stop_coords': np.asarray(timetable.stop_coords, dtype=np.float64).reshape(-1, 2),
+    }
+
+
+class ConnectionScan:
+    _cache_lock = threading.Lock()
+    _cached_version = None
+    _cached_scan = None
+
+    def __init__(self, arrays):
+        for name in ARRAY_NAMES:
+            setattr(self, name, arrays[name])
+        self.stop_index = {stop_id: code for code, stop_id in enumerate(self.stop_ids.tolist())}
+
+    @property
+    def num_stops(self):
+        return len(self.stop_ids)
+
+    # -- Storage ---------------------------------------------------------
+
+    @staticmethod
+    def save(arrays, directory):
+        """
+        Write the arrays to `directory` atomically: build in a temporary
+        sibling directory, then rename. If another process won the race the
+        existing directory is kept.
+        """
+        tmp = f'{directory}.tmp-{os.getpid()}'
+        os.makedirs(tmp, exist_ok=True)
+        for name in ARRAY_NAMES:
+            np.save(os.path.join(tmp, f'{name}.npy'), arrays[name])
+        try:
+            os.rename(tmp, directory)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    @classmethod
+    def load(cls, directory):
+        """Memory-map previously saved arrays."""
+        return cls({
+            name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r')
+            for name in ARRAY_NAMES
+        })
+
+    @staticmethod
+    def version_directory(version_id):
+        from django.conf import settings
+        return os.path.join(str(settings.ROUTING_CACHE_DIR), f'v{version_id}')
+
+    @classmethod
+    def build_for_version(cls, version_id, timetable=None):
+        """Build and save the arrays of a feed version unless they already exist."""
+        from .timetable import Timetable
+
+        directory = cls.version_directory(version_id)
+        if not os.path.isdir(directory):
+            os.makedirs(os.path.dirname(directory), exist_ok=True)
+            cls.save(build_arrays(timetable or Timetable.from_db()), directory)
+        return directory
+
+    @classmethod
+    def prune_versions(cls, keep_version_id):
+        """
+        Delete the arrays of feed versions older than keep_version_id.
+        Workers still mapping them keep working: unlinked files stay mapped.
+        """
+        from django.conf import settings
+
+        root = str(settings.ROUTING_CACHE_DIR)
+        if not os.path.isdir(root):
+            return
+        for name in os.listdir(root):
+            if name.startswith('v') and name[1:].isdigit() and int(name[1:]) < keep_version_id:
+                shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+    @classmethod
+    def current(cls):
+        """
+        Connection arrays of the current feed version, memory-mapped.
+        Built on first use if ingest did not build them. None before the first ingest.
+        """
+        from gtfs.models import FeedVersion
+
+        version = FeedVersion.current_cached()
+        if version is None:
+            return None
+
+        if cls._cached_version != version.id:
+            with cls._cache_lock:
+                if cls._cached_version != version.id:
+                    cls._cached_scan = cls.load(cls.build_for_version(version.id))
+                    cls._cached_version = version.id
+        return cls._cached_scan
+
+    # -- Queries ---------------------------------------------------------
+
+    def earliest_arrivals(self, origin, departure_seconds, duration_seconds):
+        """
+        One-to-all earliest arrival within a time budget.
+
+        Args:
+            origin: Origin stop code
+            departure_seconds: Departure time, service-day seconds
+            duration_seconds: Travel time budget
+
+        Returns:
+            dict stop code -> earliest arrival (service seconds), reachable stops only
+        """
+        end = departure_seconds + duration_seconds
+        lo, hi = np.searchsorted(self.departures, [departure_seconds, end], side='left')
+
+        arrival = {origin: departure_seconds}
+        ready = {origin: departure_seconds}   # when a vehicle can be boarded at the stop
+        self._walk(origin, departure_seconds, end, arrival, ready)
+
+        boarded = set()
+        for dep, arr, from_stop, to_stop, trip in zip(
+            self.departures[lo:hi].tolist(),
+            self.arrivals[lo:hi].tolist(),
+            self.from_stops[lo:hi].tolist(),
+            self.to_stops[lo:hi].tolist(),
+            self.trips[lo:hi].tolist(),
+        ):
+            if trip not in boarded:
+                if ready.get(from_stop, end) > dep:
+                    continue
+                boarded.add(trip)
+            if arr <= end and arr < arrival.get(to_stop, end + 1):
+                arrival[to_stop] = arr
+                ready[to_stop] = min(ready.get(to_stop, end + 1), arr + MIN_TRANSFER_SECONDS)
+                self._walk(to_stop, arr, end, arrival, ready)
+        return arrival
+
+    def _walk(self, stop, at, end, arrival, ready):
+        start, stop_end = self.footpath_offsets[stop], self.footpath_offsets[stop + 1]
+        for other, walk in zip(self.footpath_targets[start:stop_end].tolist(),
+                               self.footpath_seconds[start:stop_end].tolist()):
+            t = at + walk
+            if t <= end and t < arrival.get(other, end + 1):
+                arrival[other] = t
+                if t < ready.get(other, end + 1):
+                    ready[other] = t
+
+    def profile(self, origin, window_start, window_seconds, duration_seconds):
+        """
+        Reachability over a departure window.
+
+        The only departure times worth trying are the departures of vehicles
+        from the origin and from stops walkable from it. One scan is run per
+        such time, thinned evenly to at most PROFILE_MAX_SCANS scans (a busy
+        stop has hundreds of departures an hour, most of them a minute apart).
+
+        Returns:
+            dict stop code -> (best travel seconds, departure of the best,
+                               share of the tried departures that reach the stop)
+        """
+        starts = {origin: 0}
+        fp_start, fp_end = self.footpath_offsets[origin], self.footpath_offsets[origin + 1]
+        starts.update(zip(self.footpath_targets[fp_start:fp_end].tolist(),
+                          self.footpath_seconds[fp_start:fp_end].tolist()))
+
+        lo, hi = np.searchsorted(self.departures, [window_start, window_start + window_seconds + 1800])
+        from_stops = self.from_stops[lo:hi]
+        mask = np.isin(from_stops, np.fromiter(starts, dtype=np.int32))
+        candidates = {window_start}
+        for dep, from_stop in zip(self.departures[lo:hi][mask].tolist(), from_stops[mask].tolist()):
+            leave = dep - starts[from_stop]
+            if window_start <= leave <= window_start + window_seconds:
+                candidates.add(leave)
+
+        candidates = sorted(candidates)
+        if len(candidates) > PROFILE_MAX_SCANS:
+            step = (len(candidates) - 1) / (PROFILE_MAX_SCANS - 1)
+            candidates = [candidates[round(i * step)] for i in range(PROFILE_MAX_SCANS)]
+
+        results = {}
+        for departure in candidates:
+            for stop, arrival in self.earliest_arrivals(origin, departure, duration_seconds).items():
+                travel = arrival - departure
+                best = results.get(stop)
+                if best is None:
+                    results[stop] = [travel, departure, 1]
+                else:
+                    if travel < best[0]:
+                        best[0], best[1] = travel, departure
+                    best[2] += 1
+
+        return {
+            stop: (travel, departure, count / len(candidates))
+            for stop, (travel, departure, count) in results.items()
+        }
@@ -0,0 +1,274 @@
+"""
+RAPTOR Journey Planner
+
+Round-based public transit routing (Delling, Pajor, Werneck: "Round-Based
+Public Transit Routing"). Round k finds the earliest arrival at every stop
+using at most k vehicles:
+
+1. Collect the patterns serving stops improved in the previous round, each
+   from its earliest improved position.
+2. Scan each pattern once along its stops: hop on the earliest catchable trip,
+   record improved arrivals, and switch to an earlier trip where the previous
+   round lets us catch one.
+3. Relax footpaths from the stops improved by vehicles in this round.
+
+The result is the Pareto set of (arrival time, number of vehicles): one
+journey per round that strictly improves the arrival at the destination.
+
+Realtime delays are applied per trip at query time. A delayed trip breaks
+the FIFO order the binary search relies on, so patterns that have delayed
+trips fall back to a short scan around the bisect position.
+"""
+
+import bisect
+from collections import namedtuple
+from functools import partial
+
+from gtfs.utils.frequencies import InstanceColumn
+
+INF = 1 << 30
+MIN_TRANSFER_SECONDS = 60  # time to change vehicles at the same stop
+
+Leg = namedtuple('Leg', [
+    'mode',           # 'transit' or 'walk'
+    'from_stop',      # stop_id
+    'to_stop',        # stop_id
+    'departure',      # service seconds
+    'arrival',        # service seconds
+    'trip_id',        # None for walking
+    'route_id',       # None for walking
+    'num_stops',      # stops travelled (0 for walking)
+])
+
+Journey = namedtuple('Journey', ['departure', 'arrival', 'transfers', 'legs'])
+
+
+class Raptor:
+    def __init__(self, timetable):
+        self.tt = timetable
+
+    def _delays_by_pattern(self, delays):
+        """trip_id -> delay dict regrouped as pattern -> (trip index -> delay, min, max)."""
+        by_pattern = {}
+        for trip_id, delay in delays.items():
+            location = self.tt.trip_locations.get(trip_id)
+            if location is None or not delay:
+                continue
+            p, t = location
+            entry = by_pattern.setdefault(p, [{}, 0, 0])
+            entry[0][t] = delay
+            entry[1] = min(entry[1], delay)
+            entry[2] = max(entry[2], delay)
+        return by_pattern
+
+    def _earliest_trip(self, p, pos, ready, pattern_delays):
+        """
+        Index of the earliest trip of pattern p departing position pos at or
+        after `ready`, with its delay; (None, 0) if there is none.
+        """
+        departures = self.tt.pattern_departures[p][pos]
+        # Frequency-based patterns compute the position instead of searching
+        search = departures.bisect_left if isinstance(departures, InstanceColumn) else partial(bisect.bisect_left, departures)
+        if pattern_delays is None:
+            t = search(ready)
+            return (t, 0) if t < len(departures) else (None, 0)
+
+        delays, min_delay, max_delay = pattern_delays
+        best_t, best_dep, best_delay = None, INF, 0
+        t = search(ready - max_delay)
+        n = len(departures)
+        while t < n and departures[t] + min_delay < best_dep:
+            delay = delays.get(t, 0)
+            dep = departures[t] + delay
+            if ready <= dep < best_dep:
+                best_t, best_dep, best_delay = t, dep, delay
+            t += 1
+        return best_t, best_delay
+
+    def plan(self, origin, destination, departure_seconds, max_transfers=4, delays=None):
+        """
+        Earliest-arrival journeys from one stop to another.
+
+        Args:
+            origin, destination: stop_ids
+            departure_seconds: Earliest departure, service-day seconds
+            max_transfers: Maximum vehicle changes (rounds = max_transfers + 1)
+            delays: Optional dict trip_id -> delay seconds (realtime overlay)
+
+        Returns:
+            List of Journey, fewest vehicles first, each arriving strictly
+            earlier than the previous one. Empty if the destination is unreachable.
+        """
+        tt = self.tt
+        source = tt.stop_index[origin]
+        target = tt.stop_index[destination]
+        if source == target:
+            return []
+
+        pattern_stops = tt.pattern_stops
+        pattern_arrivals = tt.pattern_arrivals
+        pattern_departures = tt.pattern_departures
+        stop_patterns = tt.stop_patterns
+        footpaths = tt.footpaths
+        delayed = self._delays_by_pattern(delays) if delays else {}
+
+        best = [INF] * tt.num_stops
+        labels = [[INF] * tt.num_stops]
+        parents = [{}]
+
+        # Round 0: the origin, and stops walkable from it
+        labels[0][source] = best[source] = departure_seconds
+        marked = {source}
+        for other, walk in footpaths[source]:
+            arrival = departure_seconds + walk
+            if arrival < best[other]:
+                labels[0][other] = best[other] = arrival
+                parents[0][other] = ('walk', source, walk)
+                marked.add(other)
+
+        for k in range(1, max_transfers + 2):
+            previous = labels[k - 1]
+            current = list(previous)
+            round_parents = {}
+            slack = MIN_TRANSFER_SECONDS if k > 1 else 0
+
+            # 1. Patterns to scan, from their earliest marked position
+            queue = {}
+            for stop in marked:
+                for p, pos in stop_patterns[stop]:
+                    if pos < queue.get(p, INF):
+                        queue[p] = pos
+
+            # 2. Scan patterns
+            improved = {}  # stop -> arrival by vehicle in this round
+            for p, start in queue.items():
+                stops = pattern_stops[p]
+                departures = pattern_departures[p]
+                pattern_delays = delayed.get(p)
+                trip = None
+                trip_delay = 0
+                arrivals = None
+                board_pos = 0
+
+                for pos in range(start, len(stops)):
+                    stop = stops[pos]
+
+                    if trip is not None:
+                        arrival = arrivals[pos] + trip_delay
+                        if arrival < best[stop] and arrival < best[target]:
+                            current[stop] = best[stop] = arrival
+                            round_parents[stop] = ('trip', p, trip, trip_delay, board_pos, pos)
+                            improved[stop] = arrival
+
+                    ready = previous[stop]
+                    if ready == INF:
+                        continue
+                    ready += slack
+                    if trip is None or ready <= departures[pos][trip] + trip_delay:
+                        t, delay = self._earliest_trip(p, pos, ready, pattern_delays)
+                        if t is not None and t != trip:
+                            trip, trip_delay, board_pos = t, delay, pos
+                            arrivals = pattern_arrivals[p][t]
+
+            # 3. Footpaths from stops reached by vehicle in this round. From the
+            # vehicle arrival, not current[]: a walk may already have lowered
+            # that, and walk -> walk within a round is not a journey
+            walked = set()
+            for stop, base in improved.items():
+                for other, walk in footpaths[stop]:
+                    arrival = base + walk
+                    if arrival < best[other] and arrival < best[target]:
+                        current[other] = best[other] = arrival
+                        round_parents[other] = ('walk', stop, walk)
+                        walked.add(other)
+
+            labels.append(current)
+            parents.append(round_parents)
+            marked = improved.keys() | walked
+            if not marked:
+                break
+
+        return self._journeys(labels, parents, source, target, departure_seconds)
+
+    def _journeys(self, labels, parents, source, target, departure_seconds):
+        journeys = []
+        last_arrival = INF
+        for k in range(len(labels)):
+            arrival = labels[k][target]
+            if arrival >= last_arrival:
+                continue
+            last_arrival = arrival
+            legs = self._reconstruct(parents, k, source, target, departure_seconds)
+            if legs:
+                journeys.append(Journey(
+                    departure=legs[0].departure,
+                    arrival=arrival,
+                    transfers=max(0, sum(1 for leg in legs if leg.mode == 'transit') - 1),
+                    legs=legs,
+                ))
+        return journeys
+
+    def _reconstruct(self, parents, k, source, target, departure_seconds):
+        tt = self.tt
+        legs = []
+        stop = target
+        while stop != source:
+            # Latest round at or before k that set this stop's label
+            while k >= 0 and stop not in parents[k]:
+                k -= 1
+            if k < 0:
+                return None
+            parent = parents[k][stop]
+
+            if parent[0] == 'walk':
+                _, from_stop, walk = parent
+                legs.append(('walk', from_stop, stop, walk))
+                stop = from_stop
+            else:
+                _, p, trip, delay, board_pos, alight_pos = parent
+                legs.append(('trip', p, trip, delay, board_pos, alight_pos))
+                stop = tt.pattern_stops[p][board_pos]
+                k -= 1
+        legs.reverse()
+
+        # Times: walking legs take their time from the neighbouring transit legs
+        result = []
+        clock = None
+        for i, leg in enumerate(legs):
+            if leg[0] == 'trip':
+                _, p, trip, delay, board_pos, alight_pos = leg
+                departure = tt.pattern_departures[p][board_pos][trip] + delay
+                arrival = tt.pattern_arrivals[p][trip][alight_pos] + delay
+                result.append(Leg(
+                    mode='transit',
+                    from_stop=tt.stop_ids[tt.pattern_stops[p][board_pos]],
+                    to_stop=tt.stop_ids[tt.pattern_stops[p][alight_pos]],
+                    departure=departure,
+                    arrival=arrival,
+                    trip_id=tt.pattern_trip_ids[p][trip],
+                    route_id=tt.pattern_route_ids[p],
+                    num_stops=alight_pos - board_pos,
+                ))
+                clock = arrival
+            else:
+                _, from_stop, to_stop, walk = leg
+                if clock is None:
+                    # Walking before the first vehicle: leave just in time for it
+                    following = next((l for l in legs[i + 1:] if l[0] == 'trip'), None)
+                    if following is not None:
+                        _, p, trip, delay, board_pos, _ = following
+                        clock = tt.pattern_departures[p][board_pos][trip] + delay - walk
+                    else:
+                        clock = departure_seconds
+                result.append(Leg(
+                    mode='walk',
+                    from_stop=tt.stop_ids[from_stop],
+                    to_stop=tt.stop_ids[to_stop],
+                    departure=clock,
+                    arrival=clock + walk,
+                    trip_id=None,
+                    route_id=None,
+                    num_stops=0,
+                ))
+                clock += walk
+        return result
@@ -0,0 +1,207 @@
+"""
+Array-Backed Timetable
+
+The in-memory timetable shared by the journey planners. Built once per feed
+version from the stop pattern tables.
+
+Layout (stops are integer-coded 0..num_stops-1):
+- Patterns: trips of a route with the same stop sequence, split further so
+  that no trip overtakes another (FIFO), which lets "earliest trip departing
+  after t" be a binary search.
+- pattern_stops[p]: tuple of stop codes
+- pattern_departures[p][pos]: array of departures at position pos, one per
+  trip, increasing (bisect here)
+- pattern_arrivals[p][trip]: array of arrivals along the pattern for one
+  trip (scan here once boarded)
+- stop_patterns[s]: tuple of (pattern, position) serving stop s
+- footpaths[s]: tuple of (other stop, walking seconds)
+
+Frequency-based trips get a pattern of their own whose per-trip entries are
+lazy sequences over the instances (gtfs/utils/frequencies.py): indexing and
+bisect work as on the arrays, but no departure is materialized until asked for.
+"""
+
+import threading
+from array import array
+from collections import defaultdict
+
+from gtfs.utils.frequencies import InstanceColumn, InstanceRows, InstanceStarts, InstanceTripIds, load_frequencies
+from gtfs.utils.transfers import MAX_WALK_METERS, WALKING_DETOUR, WALKING_SPEED, find_transfers, walking_seconds
+
+
+def build_footpaths(stops, max_distance=MAX_WALK_METERS, speed=WALKING_SPEED, detour=WALKING_DETOUR):
+    """
+    Walking links between stops within max_distance of each other.
+    Used when no Transfer table is available (benchmarks, fresh databases).
+
+    Args:
+        stops: list of (lat, lon), index = stop code
+
+    Returns:
+        list (per stop) of tuples of (other stop code, walking seconds)
+    """
+    links = [[] for _ in stops]
+    for code, other, distance in find_transfers(dict(enumerate(stops)), max_distance):
+        links[code].append((other, walking_seconds(distance, speed, detour)))
+    return [tuple(sorted(stop_links, key=lambda link: link[1])) for stop_links in links]
+
+
+class Timetable:
+    _cache_lock = threading.Lock()
+    _cached_version = None
+    _cached_timetable = None
+
+    def __init__(self, stops, trips, footpaths=None, frequencies=None):
+        """
+        Args:
+            stops: dict stop_id -> (lat, lon)
+            trips: iterable of (trip_id, route_id, stop_ids, arrivals, departures),
+                   stop_times ordered by stop_sequence
+            footpaths: Optional dict stop_id -> list of (other stop_id, walking seconds).
+                       Default: straight-line walking between stops within MAX_WALK_METERS.
+            frequencies: Optional dict trip_id -> sorted list of (start, end, headway seconds)
+                         for frequency-based (template) trips
+        """
+        frequencies = frequencies or {}
+        self.stop_ids = list(stops)
+        self.stop_index = {stop_id: code for code, stop_id in enumerate(self.stop_ids)}
+        self.stop_coords = [stops[stop_id] for stop_id in self.stop_ids]
+
+        # Group trips by (route, stop sequence)
+        groups = defaultdict(list)
+        frequency_trips = []
+        for trip_id, route_id, stop_ids, arrivals, departures in trips:
+            if len(stop_ids) < 2:
+                continue
+            codes = tuple(self.stop_index[sid] for sid in stop_ids)
+            if trip_id in frequencies:
+                frequency_trips.append((route_id, codes, trip_id, arrivals, departures, frequencies[trip_id]))
+            else:
+                groups[(route_id, codes)].append((departures[0], trip_id, arrivals, departures))
+
+        self.pattern_stops = []
+        self.pattern_route_ids = []
+        self.pattern_trip_ids = []
+        self.pattern_departures = []
+        self.pattern_arrivals = []
+        self.trip_locations = {}  # trip_id -> (pattern, trip index)
+
+        for (route_id, codes), group in groups.items():
+            group.sort(key=lambda row: row[0])
+            for fifo_trips in self._split_fifo(group):
+                self._add_pattern(route_id, codes, fifo_trips)
+        for row in frequency_trips:
+            self._add_frequency_pattern(*row)
+
+        stop_patterns = [[] for _ in self.stop_ids]
+        for p, codes in enumerate(self.pattern_stops):
+            for pos, code in enumerate(codes[:-1]):  # nobody boards at the last stop
+                stop_patterns[code].append((p, pos))
+        self.stop_patterns = [tuple(entries) for entries in stop_patterns]
+
+        if footpaths is None:
+            self.footpaths = build_footpaths(self.stop_coords)
+        else:
+            self.footpaths = [
+                tuple(
+                    (self.stop_index[other], int(seconds))
+                    for other, seconds in footpaths.get(stop_id, ())
+                    if other in self.stop_index
+                )
+                for stop_id in self.stop_ids
+            ]
+
+    @staticmethod
+    def _split_fifo(group):
+        """
+        Split trips (sorted by first departure) into runs where no trip
+        overtakes the previous one at any stop.
+        """
+        runs = []
+        for row in group:
+            _, _, arrivals, departures = row
+            for run in runs:
+                _, _, last_arrivals, last_departures = run[-1]
+                if all(a >= la for a, la in zip(arrivals, last_arrivals)) and \
+                        all(d >= ld for d, ld in zip(departures, last_departures)):
+                    run.append(row)
+                    break
+            else:
+                runs.append([row])
+        return runs
+
+    def _add_pattern(self, route_id, codes, rows):
+        p = len(self.pattern_stops)
+        self.pattern_stops.append(codes)
+        self.pattern_route_ids.append(route_id)
+        self.pattern_trip_ids.append([row[1] for row in rows])
+        self.pattern_departures.append([
+            array('i', (row[3][pos] for row in rows)) for pos in range(len(codes))
+        ])
+        self.pattern_arrivals.append([array('i', row[2]) for row in rows])
+        for t, row in enumerate(rows):
+            self.trip_locations[row[1]] = (p, t)
+
+    def _add_frequency_pattern(self, route_id, codes, trip_id, arrivals, departures, windows):
+        """
+        Pattern of the instances of a frequency-based trip. Instances share
+        running times, so they never overtake each other (FIFO) as long as
+        the windows do not overlap.
+        """
+        starts = InstanceStarts(windows)
+        if not len(starts):
+            return
+        start = departures[0]
+        self.pattern_stops.append(codes)
+        self.pattern_route_ids.append(route_id)
+        self.pattern_trip_ids.append(InstanceTripIds(starts, trip_id))
+        self.pattern_departures.append([InstanceColumn(starts, departure - start) for departure in departures])
+        self.pattern_arrivals.append(InstanceRows(starts, [arrival - start for arrival in arrivals]))
+
+    @property
+    def num_stops(self):
+        return len(self.stop_ids)
+
+    @classmethod
+    def from_db(cls):
+        """Build the timetable from the ingested GTFS tables."""
+        from gtfs.models import Stop, Transfer
+        from gtfs.utils.patterns import load_schedules
+
+        stops = {
+            stop_id: (geom.y, geom.x)
+            for stop_id, geom in Stop.objects.values_list('stop_id', 'geom')
+        }
+        trips = (
+            (trip.trip_id, trip.route_id, trip.stop_ids, trip.arrivals, trip.departures)
+            for trip in load_schedules()
+        )
+
+        # Precomputed by build_transfers; computed on the fly if the table is empty
+        footpaths = defaultdict(list)
+        for from_stop, to_stop, seconds in Transfer.objects.order_by('walking_seconds').values_list(
+            'from_stop_id', 'to_stop_id', 'walking_seconds'
+        ).iterator(chunk_size=20000):
+            footpaths[from_stop].append((to_stop, seconds))
+
+        return cls(stops, trips, footpaths=footpaths or None, frequencies=load_frequencies())
+
+    @classmethod
+    def current(cls):
+        """
+        Timetable for the current feed version, built on first use and rebuilt
+        within FeedVersion.CURRENT_TTL_SECONDS of every ingest. Returns None if
+        no feed has been ingested.
+        """
+        from gtfs.models import FeedVersion
+
+        version = FeedVersion.current_cached()
+        if version is None:
+            return None
+
+        if cls._cached_version != version.id:
+            with cls._cache_lock:
+                if cls._cached_version != version.id:
+                    cls._cached_timetable = cls.from_db()
+                    cls._cached_version = version.id
+        return cls._cached_timetable
@@ -6,7 +6,7 @@ class StopSerializer(GeoFeatureModelSerializer):
     class Meta:
         model = Stop
         geo_field = 'geom'
-        fields = ['stop_id', 'name']
+        fields = ['stop_id', 'name', 'station', 'bearing', 'side', 'towards']
 
 class RouteSerializer(serializers.ModelSerializer):
     class Meta:
@@ -1,12 +1,18 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import StopViewSet, RouteViewSet, TripViewSet
+from .views import StopViewSet, RouteViewSet, TripViewSet, PlanViewSet, ShapeViewSet, ChangeViewSet, vector_tile, bundle_manifest, timetable_bundle
 
 router = DefaultRouter()
 router.register(r'stops', StopViewSet)
 router.register(r'routes', RouteViewSet)
 router.register(r'trips', TripViewSet)
+router.register(r'plan', PlanViewSet, basename='plan')
+router.register(r'shapes', ShapeViewSet, basename='shape')
+router.register(r'changes', ChangeViewSet, basename='change')
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('tiles/<int:z>/<int:x>/<int:y>.mvt', vector_tile, name='vector-tile'),
+    path('bundles/', bundle_manifest, name='bundle-manifest'),
+    path('bundles/v<int:version>/<path:path>', timetable_bundle, name='timetable-bundle'),
 ]
@@ -0,0 +1,87 @@
+"""
+Feed-Versioned Conditional GET
+
+Stops, routes, trips and shapes only change when `ingest_gtfs` creates a
+new FeedVersion, so the version is a complete validator for them:
+
+- ETag: "feed-<version id>-<hash of Accept / Accept-Encoding>" (one per
+  representation of the same URL)
+- Last-Modified: the version's created_at
+
+A request whose If-None-Match / If-Modified-Since still matches gets a 304
+straight away - no queryset, no serializer, and with
+FeedVersion.current_cached() usually no query at all. Successful responses
+get the validators plus FEED_CACHE_CONTROL.
+"""
+
+import zlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+FEED_CACHE_CONTROL = 'public, max-age=3600'
+
+
+def feed_validators(request):
+    """
+    Returns:
+        (etag, last_modified as a Unix timestamp) for the current feed, or None before the first ingest
+    """
+    from gtfs.models import FeedVersion
+
+    version = FeedVersion.current_cached()
+    if version is None:
+        return None
+    variant = zlib.crc32(
+        f"{request.headers.get('Accept', '')}|{request.headers.get('Accept-Encoding', '')}".encode()
+    )
+    return f'"feed-{version.id}-{variant:08x}"', int(version.created_at.timestamp())
+
+
+def feed_conditional_response(request, respond):
+    """
+    Answer a GET/HEAD for feed-static data.
+
+    Args:
+        request: The request
+        respond: Callable producing the full response when the client's copy is stale
+
+    Returns:
+        304 Not Modified, or respond()'s response with validators and cache headers if it is a 200
+    """
+    validators = feed_validators(request) if request.method in ('GET', 'HEAD') else None
+    if validators is None:
+        return respond()
+
+    etag, last_modified = validators
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        not_modified.headers['ETag'] = etag
+        not_modified.headers['Cache-Control'] = FEED_CACHE_CONTROL
+        return not_modified
+
+    response = respond()
+    if response.status_code == 200:
+        response.headers['ETag'] = etag
+        response.headers['Last-Modified'] = http_date(last_modified)
+        response.headers['Cache-Control'] = FEED_CACHE_CONTROL
+    return response
+
+
+class FeedCachedMixin:
+    """
+    ViewSet mixin: conditional GET (see module docstring) for the actions in
+    `feed_cached_actions`. Actions that depend on the time of day or on
+    realtime data must not be listed.
+    """
+    feed_cached_actions = ('list', 'retrieve')
+
+    def dispatch(self, request, *args, **kwargs):
+        action = getattr(self, 'action_map', {}).get(request.method.lower())
+        if action not in self.feed_cached_actions:
+            return super().dispatch(request, *args, **kwargs)
+
+        def respond():
+            return super(FeedCachedMixin, self).dispatch(request, *args, **kwargs)
+
+        return feed_conditional_response(request, respond)
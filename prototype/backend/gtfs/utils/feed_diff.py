@@ -0,0 +1,200 @@
+"""
+Feed Change Sets
+
+ingest_gtfs replaces the whole static feed, yet between two versions of a
+real feed most stops, routes and trips do not change. Ingest snapshots
+them before clearing the tables and again afterwards; the difference is
+stored as FeedChange rows of the new version, so clients holding version N
+can fetch only what changed since (`/api/gtfs/changes/?since=N`).
+
+An entity is a flat list of values in ENTITY_FIELDS order - what the
+changes endpoint sends, column-wise, so responses compress well. Only the
+last FEED_CHANGE_RETENTION versions keep their change sets; a client
+further behind has to download everything again.
+"""
+
+from .patterns import load_schedules
+
+ENTITY_FIELDS = {
+    'stop': ['stop_id', 'name', 'lat', 'lon', 'station', 'bearing', 'side', 'towards'],
+    'route': ['route_id', 'short_name', 'long_name', 'agency'],
+    'trip': ['trip_id', 'route', 'service_id', 'headed_to', 'shape_id', 'start_seconds',
+             'stop_ids', 'arrival_offsets', 'departure_offsets', 'frequencies'],
+}
+COORDINATE_DECIMALS = 6   # ~0.1 m
+
+
+def snapshot():
+    """
+    Current stops, routes and trips.
+
+    Returns:
+        dict kind -> dict entity_id -> list of values (ENTITY_FIELDS order)
+    """
+    from gtfs.models import Frequency, Route, Stop, Trip
+
+    stops = {
+        stop_id: [stop_id, name, round(geom.y, COORDINATE_DECIMALS), round(geom.x, COORDINATE_DECIMALS),
+                  station_id, bearing, side, towards]
+        for stop_id, name, geom, station_id, bearing, side, towards in Stop.objects.values_list(
+            'stop_id', 'name', 'geom', 'station_id', 'bearing', 'side', 'towards'
+        )
+    }
+    routes = {
+        route_id: [route_id, short_name, long_name, agency_id]
+        for route_id, short_name, long_name, agency_id in Route.objects.values_list(
+            'route_id', 'short_name', 'long_name', 'agency_id'
+        )
+    }
+
+    windows = {}
+    for trip_id, start, end, headway in Frequency.objects.order_by('trip_id', 'start_seconds').values_list(
+        'trip_id', 'start_seconds', 'end_seconds', 'headway_seconds'
+    ):
+        windows.setdefault(trip_id, []).append([start, end, headway])
+
+    trips = {}
+    info = {
+        trip_id: (service_id, headed_to)
+        for trip_id, service_id, headed_to in Trip.objects.values_list('trip_id', 'service_id', 'headed_to')
+    }
+    for schedule in load_schedules():
+        start = schedule.departures[0]
+        service_id, headed_to = info[schedule.trip_id]
+        trips[schedule.trip_id] = [
+            schedule.trip_id, schedule.route_id, service_id, headed_to, schedule.shape_id, start,
+            list(schedule.stop_ids),
+            [arrival - start for arrival in schedule.arrivals],
+            [departure - start for departure in schedule.departures],
+            windows.get(schedule.trip_id, []),
+        ]
+
+    return {'stop': stops, 'route': routes, 'trip': trips}
+
+
+def diff(old, new):
+    """
+    Args:
+        old, new: snapshot() results
+
+    Returns:
+        list of (kind, entity_id, action, values or None), action one of 'added', 'updated', 'removed'
+    """
+    changes = []
+    for kind in ENTITY_FIELDS:
+        before = old.get(kind, {})
+        after = new.get(kind, {})
+        for entity_id, values in after.items():
+            previous = before.get(entity_id)
+            if previous is None:
+                changes.append((kind, entity_id, 'added', values))
+            elif previous != values:
+                changes.append((kind, entity_id, 'updated', values))
+        for entity_id in before.keys() - after.keys():
+            changes.append((kind, entity_id, 'removed', None))
+    return changes
+
+
+def collapse(changes):
+    """
+    Net effect of consecutive change sets.
+
+    Args:
+        changes: iterable of (kind, entity_id, action, values), oldest first
+
+    Returns:
+        dict kind -> {'fields': [...], 'added': [values, ...], 'updated': [values, ...], 'removed': [entity_id, ...]}
+    """
+    # (kind, entity_id) -> [existed before the first change, latest values or None if removed]
+    net = {}
+    for kind, entity_id, action, values in changes:
+        state = net.get((kind, entity_id))
+        if state is None:
+            state = net[(kind, entity_id)] = [action != 'added', None]
+        state[1] = values if action != 'removed' else None
+
+    result = {
+        kind: {'fields': fields, 'added': [], 'updated': [], 'removed': []}
+        for kind, fields in ENTITY_FIELDS.items()
+    }
+    for (kind, entity_id), (existed, values) in sorted(net.items()):
+        if values is not None:
+            result[kind]['updated' if existed else 'added'].append(values)
+        elif existed:
+            result[kind]['removed'].append(entity_id)
+    return result
+
+
+def record_changes(feed_version, old, batch_size=5000):
+    """
+    Store the difference between `old` and the current tables as FeedChange
+    rows of `feed_version`.
+
+    Args:
+        feed_version: The FeedVersion just created by ingest
+        old: snapshot() taken before the previous feed was cleared
+        batch_size: bulk_create batch size
+
+    Returns:
+        Number of changes recorded
+    """
+    from gtfs.models import FeedChange
+
+    changes = diff(old, snapshot())
+    FeedChange.objects.bulk_create(
+        (
+            FeedChange(feed_version=feed_version, kind=kind, entity_id=entity_id, action=action, data=values)
+            for kind, entity_id, action, values in changes
+        ),
+        batch_size=batch_size
+    )
+    feed_version.has_changes = True
+    feed_version.save(update_fields=['has_changes'])
+    return len(changes)
+
+
+def prune_changes(keep_id, retention):
+    """
+    Delete the change sets of all but the newest `retention` feed versions.
+
+    Args:
+        keep_id: Current feed version id
+        retention: Number of versions (including the current one) to keep
+    """
+    from gtfs.models import FeedChange, FeedVersion
+
+    kept = list(FeedVersion.objects.filter(id__lte=keep_id).order_by('-id').values_list('id', flat=True)[:retention])
+    if not kept:
+        return
+    FeedChange.objects.filter(feed_version_id__lt=kept[-1]).delete()
+    FeedVersion.objects.filter(id__lt=kept[-1], has_changes=True).update(has_changes=False)
+
+
+def oldest_since(current):
+    """
+    Oldest version a client can be brought up to `current` from: every
+    version after it must have its change set. 0 means "no data at all".
+    """
+    from gtfs.models import FeedVersion
+
+    gap = FeedVersion.objects.filter(id__lte=current.id, has_changes=False).order_by('-id').values_list(
+        'id', flat=True
+    ).first()
+    return gap or 0
+
+
+def changes_since(since, current):
+    """
+    Args:
+        since: Feed version id the client has
+        current: Current FeedVersion
+
+    Returns:
+        collapse() of the change sets of versions since+1 .. current
+    """
+    from gtfs.models import FeedChange
+
+    rows = FeedChange.objects.filter(feed_version_id__gt=since, feed_version_id__lte=current.id).order_by(
+        'feed_version_id', 'id'
+    ).values_list('kind', 'entity_id', 'action', 'data')
+    return collapse(rows.iterator(chunk_size=5000))
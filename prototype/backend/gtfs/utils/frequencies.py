@@ -0,0 +1,176 @@
+"""
+Frequency-Based Trips
+
+A trip listed in frequencies.txt is a template: its stop times give the
+running times, and it departs every headway_seconds within each
+[start_seconds, end_seconds) window. Only the template and its windows are
+stored; concrete departures ("instances") are computed on demand for the
+time range being asked about, so storage and ingest cost do not depend on
+the headway.
+
+An instance is identified by the template trip_id and its start time, e.g.
+"T_R01_F@07:30:00" (see instance_trip_id).
+"""
+
+import bisect
+from array import array
+
+from .time_helpers import seconds_to_gtfs_time
+
+
+def instance_trip_id(trip_id, start_seconds):
+    return f"{trip_id}@{seconds_to_gtfs_time(start_seconds)}"
+
+
+def instance_starts(windows, range_start, range_end, offset=0):
+    """
+    Start times of the instances that are `offset` seconds into their trip
+    somewhere in [range_start, range_end].
+
+    Args:
+        windows: list of (start_seconds, end_seconds, headway_seconds), sorted
+        range_start, range_end: Service-day seconds
+        offset: Seconds from the instance start (e.g. arrival offset at a stop)
+
+    Yields:
+        Instance start times, increasing
+    """
+    for start, end, headway in windows:
+        first = range_start - offset
+        if first <= start:
+            t = start
+        else:
+            t = start + -(-(first - start) // headway) * headway  # ceil to the headway grid
+        while t < end and t + offset <= range_end:
+            yield t
+            t += headway
+
+
+def last_instance_start(windows, at):
+    """Start of the latest instance starting at or before `at`; None if there is none."""
+    latest = None
+    for start, end, headway in windows:
+        if start > at:
+            break
+        if end <= start:
+            continue  # empty window
+        t = start + min((at - start) // headway, (end - 1 - start) // headway) * headway
+        latest = t
+    return latest
+
+
+def nearest_instance_start(windows, at):
+    """Start of the instance starting nearest to `at` (the earlier on a tie); None if there is none."""
+    before = last_instance_start(windows, at)
+    after = next(instance_starts(windows, at, float('inf')), None)
+    if before is None or (after is not None and after - at < at - before):
+        return after
+    return before
+
+
+def load_frequencies():
+    """
+    Returns:
+        dict trip_id -> sorted list of (start_seconds, end_seconds, headway_seconds)
+    """
+    from gtfs.models import Frequency
+
+    windows = {}
+    for trip_id, start, end, headway in Frequency.objects.order_by('trip_id', 'start_seconds').values_list(
+        'trip_id', 'start_seconds', 'end_seconds', 'headway_seconds'
+    ):
+        windows.setdefault(trip_id, []).append((start, end, headway))
+    return windows
+
+
+class InstanceStarts:
+    """
+    Read-only sequence of every instance start of a template, computed from
+    the windows on access. Supports len(), indexing and bisect.
+    """
+
+    def __init__(self, windows):
+        self.windows = [(start, end, headway) for start, end, headway in windows if end > start]
+        self.offsets = [0]  # instance number of each window's first instance
+        for start, end, headway in self.windows:
+            self.offsets.append(self.offsets[-1] + -(-(end - start) // headway))
+        self.count = self.offsets[-1]
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, t):
+        if t < 0:
+            t += self.count
+        if not 0 <= t < self.count:
+            raise IndexError(t)
+        w = bisect.bisect_right(self.offsets, t) - 1 if len(self.windows) > 1 else 0
+        start, _, headway = self.windows[w]
+        return start + (t - self.offsets[w]) * headway
+
+    def bisect_left(self, x):
+        """Index of the first instance starting at or after x (arithmetic, no scan)."""
+        for w, (start, end, headway) in enumerate(self.windows):
+            if x <= start:
+                return self.offsets[w]
+            k = -(-(x - start) // headway)
+            if start + k * headway < end:
+                return self.offsets[w] + k
+        return self.count
+
+    def __iter__(self):
+        for start, end, headway in self.windows:
+            yield from range(start, end, headway)
+
+
+class InstanceColumn:
+    """Times of every instance at one position of the pattern: start + offset."""
+
+    def __init__(self, starts, offset):
+        self.starts = starts
+        self.offset = offset
+
+    def __len__(self):
+        return self.starts.count
+
+    def __getitem__(self, t):
+        return self.starts[t] + self.offset
+
+    def bisect_left(self, x):
+        return self.starts.bisect_left(x - self.offset)
+
+    def __iter__(self):
+        offset = self.offset
+        return (start + offset for start in self.starts)
+
+
+class InstanceRows:
+    """Per instance: array of times along the pattern, built on access."""
+
+    def __init__(self, starts, offsets):
+        self.starts = starts
+        self.offsets = offsets
+
+    def __len__(self):
+        return self.starts.count
+
+    def __getitem__(self, t):
+        start = self.starts[t]
+        return array('i', [start + offset for offset in self.offsets])
+
+    def __iter__(self):
+        return (self[t] for t in range(len(self)))
+
+
+class InstanceTripIds:
+    """Per instance: its trip id (see instance_trip_id)."""
+
+    def __init__(self, starts, trip_id):
+        self.starts = starts
+        self.trip_id = trip_id
+
+    def __len__(self):
+        return self.starts.count
+
+    def __getitem__(self, t):
+        return instance_trip_id(self.trip_id, self.starts[t])
@@ -0,0 +1,162 @@
+"""
+Nearest Stops
+
+The k stops closest to a point, nearest first, with distances in meters.
+
+- nearest_db: PostGIS KNN - `ORDER BY geom::geography <-> point LIMIT k`
+  walks the GiST index on geom::geography (migration 0012) and stops after
+  k rows; no radius scan, no COUNT.
+- NearestStopIndex: in-process grid over the stop coordinates, searched
+  ring by ring outwards. Used when the database is not PostGIS, e.g. in
+  tests on SpatiaLite.
+
+nearest_stops() picks one.
+"""
+
+import heapq
+import math
+import threading
+from collections import namedtuple
+
+from .spatial_index import GridIndex, LocalProjection
+
+NearStop = namedtuple('NearStop', ['stop_id', 'name', 'station_id', 'side', 'towards', 'lat', 'lon', 'distance'])
+
+KNN_SQL = """
+SELECT stop_id, name, station_id, side, towards, ST_Y(geom), ST_X(geom),
+       geom::geography <-> ST_SetSRID(ST_MakePoint(%s, %s), 4326)::geography AS distance
+FROM gtfs_stop
+{where}
+ORDER BY distance
+LIMIT %s
+"""
+KNN_RADIUS_FILTER = "WHERE ST_DWithin(geom::geography, ST_SetSRID(ST_MakePoint(%s, %s), 4326)::geography, %s)"
+
+
+def nearest_db(lat, lon, k, max_distance=None):
+    """
+    Args:
+        lat, lon: Query point
+        k: Maximum number of stops
+        max_distance: Optional cutoff in meters
+
+    Returns:
+        List of NearStop, nearest first
+    """
+    from django.db import connection
+
+    params = [lon, lat]
+    where = ''
+    if max_distance is not None:
+        where = KNN_RADIUS_FILTER
+        params += [lon, lat, max_distance]
+    params.append(k)
+
+    with connection.cursor() as cursor:
+        cursor.execute(KNN_SQL.format(where=where), params)
+        return [NearStop(*row) for row in cursor.fetchall()]
+
+
+class NearestStopIndex:
+    """
+    Grid index over every stop of one feed version.
+    """
+    CELL_SIZE = 250.0  # meters; a few stops per cell in a dense city
+
+    _cache_lock = threading.Lock()
+    _cached_version = None
+    _cached_index = None
+
+    def __init__(self, stops):
+        """
+        Args:
+            stops: iterable of (stop_id, name, station_id, side, towards, lat, lon)
+        """
+        self.stops = [NearStop(*stop, None) for stop in stops]
+        self.projection = LocalProjection.around((stop.lat, stop.lon) for stop in self.stops)
+        self.grid = GridIndex(self.CELL_SIZE)
+        self.points = []
+        for code, stop in enumerate(self.stops):
+            x, y = self.projection.project(stop.lat, stop.lon)
+            self.points.append((x, y))
+            self.grid.insert_point(code, x, y)
+
+        # Rings beyond this cover no cell of the grid
+        cells = self.grid.cells
+        self._max_cell = max((max(abs(cx), abs(cy)) for cx, cy in cells), default=0)
+
+    def __len__(self):
+        return len(self.stops)
+
+    def nearest(self, lat, lon, k, max_distance=None):
+        """Same contract as nearest_db."""
+        if not self.stops or k <= 0:
+            return []
+
+        x, y = self.projection.project(lat, lon)
+        cx, cy = self.grid._cell(x, y)
+        last_ring = self._max_cell + max(abs(cx), abs(cy))
+        if max_distance is not None:
+            last_ring = min(last_ring, int(max_distance // self.CELL_SIZE) + 1)
+
+        best = []  # max-heap of (-distance, code), at most k
+        for ring in range(last_ring + 1):
+            for code in self.grid.query_ring(x, y, ring):
+                px, py = self.points[code]
+                distance = math.hypot(px - x, py - y)
+                if max_distance is not None and distance > max_distance:
+                    continue
+                if len(best) < k:
+                    heapq.heappush(best, (-distance, code))
+                elif distance < -best[0][0]:
+                    heapq.heapreplace(best, (-distance, code))
+            # Anything in later rings is more than ring * CELL_SIZE away
+            if len(best) == k and -best[0][0] <= ring * self.CELL_SIZE:
+                break
+
+        return [
+            self.stops[code]._replace(distance=-neg_distance)
+            for neg_distance, code in sorted(best, key=lambda item: (-item[0], item[1]))
+        ]
+
+    @classmethod
+    def from_db(cls):
+        from gtfs.models import Stop
+
+        return cls(
+            (stop_id, name, station_id, side, towards, geom.y, geom.x)
+            for stop_id, name, station_id, side, towards, geom in Stop.objects.order_by('stop_id').values_list(
+                'stop_id', 'name', 'station_id', 'side', 'towards', 'geom'
+            )
+        )
+
+    @classmethod
+    def current(cls):
+        """
+        Index for the current feed version, built on first use and rebuilt
+        after every ingest. Returns None if no feed has been ingested.
+        """
+        from gtfs.models import FeedVersion
+
+        version = FeedVersion.current()
+        if version is None:
+            return None
+
+        if cls._cached_version != version.id:
+            with cls._cache_lock:
+                if cls._cached_version != version.id:
+                    cls._cached_index = cls.from_db()
+                    cls._cached_version = version.id
+        return cls._cached_index
+
+
+def nearest_stops(lat, lon, k, max_distance=None):
+    """KNN query on PostGIS, the in-process grid on any other spatial backend."""
+    from django.db import connection
+
+    if getattr(connection.ops, 'postgis', False):
+        return nearest_db(lat, lon, k, max_distance)
+    index = NearestStopIndex.current()
+    if index is None:
+        return []
+    return index.nearest(lat, lon, k, max_distance)
@@ -0,0 +1,34 @@
+"""
+Keyset Pagination
+
+PageNumberPagination runs a COUNT(*) and an OFFSET that grows with the
+page number, so deep pages of a big table get linearly slower. These
+paginators use DRF's CursorPagination instead: the opaque `cursor` in the
+next / previous links holds the last row's ordering key, and the next page
+is `WHERE key > <cursor> ORDER BY key LIMIT n` - one index range scan,
+whatever the depth, and no count.
+
+The ordering must be an indexed, (nearly) unique and never-updated
+column; ties on the first ordering field are stepped over with a small
+offset by DRF.
+"""
+
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+class StopPagination(KeysetPagination):
+    ordering = 'stop_id'
+
+
+class RoutePagination(KeysetPagination):
+    ordering = 'route_id'
+
+
+class TripPagination(KeysetPagination):
+    ordering = 'trip_id'
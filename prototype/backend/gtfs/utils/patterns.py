@@ -0,0 +1,107 @@
+"""
+Stop Patterns
+
+Trips of a route mostly visit the same stops with the same running times,
+just at different start times. The timetable is stored deduplicated:
+
+- StopPattern / PatternStop: a unique ordered sequence of (stop_sequence, stop_id)
+- PatternTiming: arrival/departure offsets from the trip's start, shared by
+  every trip of the pattern that runs to the same schedule
+- Trip: (pattern, timing, start_seconds)
+
+stop time i of a trip = start_seconds + timing offsets[i]. The `gtfs_stoptime`
+database view expands this back into one row per (trip, stop) for the
+StopTime model; full-timetable scans use load_schedules() instead, which
+expands in memory from the (small) pattern tables and one row per trip.
+"""
+
+from collections import namedtuple
+
+TripSchedule = namedtuple('TripSchedule', [
+    'trip_id', 'route_id', 'shape_id',
+    'stop_sequences', 'stop_ids', 'arrivals', 'departures',
+])
+
+
+def extract_patterns(trip_stop_times):
+    """
+    Deduplicate trips into patterns and timings.
+
+    Args:
+        trip_stop_times: dict trip_id -> list of (stop_sequence, stop_id, arrival_seconds, departure_seconds)
+
+    Returns:
+        Tuple of:
+        - patterns: list of tuples of (stop_sequence, stop_id), index = pattern number
+        - timings: list of (pattern number, arrival offsets, departure offsets), index = timing number
+        - trips: dict trip_id -> (pattern number, timing number, start_seconds)
+    """
+    pattern_numbers = {}
+    timing_numbers = {}
+    timings = []
+    trips = {}
+
+    for trip_id, rows in trip_stop_times.items():
+        rows = sorted(rows)
+        stops = tuple((sequence, stop_id) for sequence, stop_id, _, _ in rows)
+        pattern = pattern_numbers.setdefault(stops, len(pattern_numbers))
+
+        start = rows[0][3]
+        arrival_offsets = tuple(arrival - start for _, _, arrival, _ in rows)
+        departure_offsets = tuple(departure - start for _, _, _, departure in rows)
+        key = (pattern, arrival_offsets, departure_offsets)
+        timing = timing_numbers.get(key)
+        if timing is None:
+            timing = timing_numbers[key] = len(timings)
+            timings.append(key)
+
+        trips[trip_id] = (pattern, timing, start)
+
+    return list(pattern_numbers), timings, trips
+
+
+def load_schedules(trip_ids=None):
+    """
+    Stop times of every trip, expanded in memory from the pattern tables.
+
+    Args:
+        trip_ids: Optional iterable of trip_ids to restrict to
+
+    Yields:
+        TripSchedule, ordered by trip_id
+    """
+    from gtfs.models import PatternStop, PatternTiming, Trip
+
+    pattern_stops = {}
+    for pattern_id, sequence, stop_id in PatternStop.objects.order_by('pattern_id', 'position').values_list(
+        'pattern_id', 'stop_sequence', 'stop_id'
+    ):
+        sequences, stop_ids = pattern_stops.setdefault(pattern_id, ([], []))
+        sequences.append(sequence)
+        stop_ids.append(stop_id)
+
+    timings = {
+        timing_id: (arrivals, departures)
+        for timing_id, arrivals, departures in PatternTiming.objects.values_list(
+            'id', 'arrival_offsets', 'departure_offsets'
+        )
+    }
+
+    trips = Trip.objects.filter(pattern__isnull=False).order_by('trip_id')
+    if trip_ids is not None:
+        trips = trips.filter(trip_id__in=list(trip_ids))
+
+    for trip_id, route_id, shape_id, pattern_id, timing_id, start in trips.values_list(
+        'trip_id', 'route_id', 'shape_id', 'pattern_id', 'timing_id', 'start_seconds'
+    ).iterator(chunk_size=20000):
+        sequences, stop_ids = pattern_stops[pattern_id]
+        arrival_offsets, departure_offsets = timings[timing_id]
+        yield TripSchedule(
+            trip_id=trip_id,
+            route_id=route_id,
+            shape_id=shape_id,
+            stop_sequences=sequences,
+            stop_ids=stop_ids,
+            arrivals=[start + offset for offset in arrival_offsets],
+            departures=[start + offset for offset in departure_offsets],
+        )
@@ -0,0 +1,182 @@
+"""
+Prebuilt Payloads
+
+Trip detail and route summary responses depend only on the feed, so
+`build_payloads` renders them once per feed version into PrebuiltPayload
+rows - JSON bytes exactly as the API returns them - and the views answer
+with a single primary-key lookup, whatever the trip length.
+
+The trip payload is field-for-field what TripDetailSerializer produces;
+it is built from load_schedules() and in-memory stop / route tables
+instead of per-trip querysets so a whole feed renders in one pass.
+"""
+
+from collections import Counter, defaultdict
+
+from rest_framework.renderers import JSONRenderer
+
+from .patterns import load_schedules
+from .time_helpers import seconds_to_gtfs_time
+
+KIND_TRIP = 'trip'
+KIND_ROUTE = 'route'
+
+_renderer = JSONRenderer()
+
+
+def encode(data):
+    """JSON bytes as the API's JSONRenderer would send them."""
+    return _renderer.render(data)
+
+
+def _load_stops():
+    from gtfs.models import Stop
+
+    return {
+        stop_id: (name, geom.y, geom.x)
+        for stop_id, name, geom in Stop.objects.values_list('stop_id', 'name', 'geom')
+    }
+
+
+def trip_payloads(trip_ids=None):
+    """
+    Args:
+        trip_ids: Optional iterable of trip_ids to restrict to
+
+    Yields:
+        (trip_id, TripDetailSerializer-shaped dict)
+    """
+    from gtfs.models import Trip
+
+    stops = _load_stops()
+    trips = Trip.objects.all()
+    if trip_ids is not None:
+        trips = trips.filter(trip_id__in=list(trip_ids))
+    info = {
+        trip_id: (route_id, route_name, headed_to, shape_id)
+        for trip_id, route_id, route_name, headed_to, shape_id in trips.values_list(
+            'trip_id', 'route_id', 'route__short_name', 'headed_to', 'shape_id'
+        )
+    }
+
+    for schedule in load_schedules(trip_ids):
+        route_id, route_name, headed_to, shape_id = info[schedule.trip_id]
+        stop_times = []
+        for sequence, stop_id, arrival, departure in zip(
+            schedule.stop_sequences, schedule.stop_ids, schedule.arrivals, schedule.departures
+        ):
+            name, lat, lon = stops[stop_id]
+            stop_times.append({
+                'stop': stop_id,
+                'stop_name': name,
+                'stop_lat': lat,
+                'stop_lon': lon,
+                'stop_sequence': sequence,
+                'arrival_seconds': arrival,
+                'departure_seconds': departure,
+                'arrival_time': seconds_to_gtfs_time(arrival),
+                'departure_time': seconds_to_gtfs_time(departure),
+            })
+        yield schedule.trip_id, {
+            'trip_id': schedule.trip_id,
+            'route': route_id,
+            'route_name': route_name,
+            'headed_to': headed_to,
+            'shape_id': shape_id,
+            'stop_times': stop_times,
+        }
+
+
+def route_payloads(route_ids=None):
+    """
+    Route summary: the route, its service span and every distinct stop
+    sequence its trips run (most frequent first), with stop names and
+    coordinates.
+
+    Args:
+        route_ids: Optional iterable of route_ids to restrict to
+
+    Yields:
+        (route_id, dict)
+    """
+    from gtfs.models import Frequency, Route, Trip
+    from .frequencies import InstanceStarts
+
+    stops = _load_stops()
+    routes = Route.objects.all()
+    trips = Trip.objects.filter(pattern__isnull=False)
+    if route_ids is not None:
+        routes = routes.filter(route_id__in=list(route_ids))
+        trips = trips.filter(route_id__in=list(route_ids))
+    trip_routes = dict(trips.values_list('trip_id', 'route_id'))
+    headsigns = dict(trips.values_list('trip_id', 'headed_to'))
+
+    windows = defaultdict(list)
+    for trip_id, start, end, headway in Frequency.objects.filter(trip_id__in=list(trip_routes)).values_list(
+        'trip_id', 'start_seconds', 'end_seconds', 'headway_seconds'
+    ):
+        windows[trip_id].append((start, end, headway))
+
+    # route_id -> stop tuple -> Counter of headsigns weighted by trips run
+    patterns = defaultdict(lambda: defaultdict(Counter))
+    spans = {}
+    for schedule in load_schedules(trip_routes if route_ids is not None else None):
+        route_id = trip_routes[schedule.trip_id]
+        trip_windows = windows.get(schedule.trip_id)
+        if trip_windows:
+            # Frequency template: every instance is a run; offsets start at 0 at the first stop
+            starts = InstanceStarts(sorted(trip_windows))
+            runs = len(starts)
+            if not runs:
+                continue
+            first, last = starts[0], starts[-1]
+        else:
+            runs = 1
+            first = last = schedule.departures[0]
+        patterns[route_id][tuple(schedule.stop_ids)][headsigns[schedule.trip_id]] += runs
+        span = spans.get(route_id)
+        spans[route_id] = (min(span[0], first), max(span[1], last)) if span else (first, last)
+
+    for route_id, short_name, long_name, agency_id in routes.order_by('route_id').values_list(
+        'route_id', 'short_name', 'long_name', 'agency_id'
+    ):
+        route_patterns = sorted(
+            patterns.get(route_id, {}).items(),
+            key=lambda item: (-sum(item[1].values()), item[0]),
+        )
+        first, last = spans.get(route_id, (None, None))
+        yield route_id, {
+            'route_id': route_id,
+            'short_name': short_name,
+            'long_name': long_name,
+            'agency': agency_id,
+            'trip_count': sum(sum(headsign_runs.values()) for _, headsign_runs in route_patterns),
+            'first_departure': seconds_to_gtfs_time(first) if first is not None else None,
+            'last_departure': seconds_to_gtfs_time(last) if last is not None else None,
+            'patterns': [
+                {
+                    'headed_to': headsign_runs.most_common(1)[0][0],
+                    'trip_count': sum(headsign_runs.values()),
+                    'stops': [
+                        {'stop_id': stop_id, 'name': stops[stop_id][0], 'lat': stops[stop_id][1], 'lon': stops[stop_id][2]}
+                        for stop_id in stop_ids
+                    ],
+                }
+                for stop_ids, headsign_runs in route_patterns
+            ],
+        }
+
+
+def prebuilt_payload(kind, key):
+    """
+    Stored JSON bytes for the current feed version, or None if not built.
+    """
+    from gtfs.models import FeedVersion, PrebuiltPayload
+
+    version = FeedVersion.current_cached()
+    if version is None:
+        return None
+    body = PrebuiltPayload.objects.filter(feed_version=version, kind=kind, key=key).values_list(
+        'body', flat=True
+    ).first()
+    return bytes(body) if body is not None else None
@@ -0,0 +1,146 @@
+"""
+Shape Levels of Detail
+
+A traced shape can have thousands of points; a map at city zoom needs a
+few dozen. Ingest (`build_shape_lods`) simplifies every shape once per
+tolerance in LOD_TOLERANCES with Douglas-Peucker and stores each result as
+an encoded polyline (Google's format, 5 decimals - about 1 m), so the
+shape endpoint serves a ready-made string instead of serializing the raw
+LineString.
+
+The level for a zoom is the coarsest whose tolerance is still below one
+screen pixel there, so simplification is invisible.
+"""
+
+import numpy as np
+
+from .spatial_index import LocalProjection, point_segment_projection
+
+LOD_TOLERANCES = (1.0, 5.0, 20.0, 80.0, 300.0)   # meters, level 0 = finest
+POLYLINE_PRECISION = 5
+METERS_PER_PIXEL_Z0 = 156543.03392                # web mercator at the equator, 256 px tiles
+SMALL_SPAN = 64                                   # Douglas-Peucker spans up to this many points are scanned in plain Python
+
+
+def douglas_peucker(points, tolerance):
+    """
+    Indices of the points kept by Douglas-Peucker simplification.
+
+    Args:
+        points: (n, 2) array of planar coordinates in meters
+        tolerance: Maximum distance of a dropped point from the simplified line
+
+    Returns:
+        Sorted list of kept indices (always includes the first and last)
+    """
+    n = len(points)
+    if n <= 2:
+        return list(range(n))
+
+    xs = points[:, 0].tolist()
+    ys = points[:, 1].tolist()
+    tolerance_sq = tolerance * tolerance
+    keep = [0, n - 1]
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        if last - first > SMALL_SPAN:
+            # Distance to the segment, not the infinite line: shapes double back
+            a = points[first]
+            ab = points[last] - a
+            ap = points[first + 1:last] - a
+            length_sq = float(ab @ ab)
+            t = np.clip(ap @ ab / length_sq, 0.0, 1.0) if length_sq else 0.0
+            distances_sq = (ap[:, 0] - t * ab[0]) ** 2 + (ap[:, 1] - t * ab[1]) ** 2
+            i = int(np.argmax(distances_sq))
+            worst, split = float(distances_sq[i]), first + 1 + i
+        else:
+            # numpy's per-call overhead dominates on short spans
+            worst, split = -1.0, first
+            ax, ay, bx, by = xs[first], ys[first], xs[last], ys[last]
+            for i in range(first + 1, last):
+                distance_sq, _ = point_segment_projection(xs[i], ys[i], ax, ay, bx, by)
+                if distance_sq > worst:
+                    worst, split = distance_sq, i
+        if worst > tolerance_sq:
+            keep.append(split)
+            stack.append((first, split))
+            stack.append((split, last))
+    return sorted(keep)
+
+
+def encode_polyline(coords, precision=POLYLINE_PRECISION):
+    """Encode a list of (lat, lon) with Google's polyline algorithm."""
+    factor = 10 ** precision
+    chunks = []
+    prev_lat = prev_lon = 0
+    for lat, lon in coords:
+        lat_e = int(round(lat * factor))
+        lon_e = int(round(lon * factor))
+        for delta in (lat_e - prev_lat, lon_e - prev_lon):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            chunks.append(chr(value + 63))
+        prev_lat, prev_lon = lat_e, lon_e
+    return ''.join(chunks)
+
+
+def decode_polyline(encoded, precision=POLYLINE_PRECISION):
+    """Inverse of encode_polyline: list of (lat, lon)."""
+    factor = 10 ** precision
+    coords = []
+    index = lat = lon = 0
+    length = len(encoded)
+    while index < length:
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                byte = ord(encoded[index]) - 63
+                index += 1
+                result |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lon += deltas[1]
+        coords.append((lat / factor, lon / factor))
+    return coords
+
+
+def build_lods(coords):
+    """
+    Every level of detail of one shape.
+
+    Args:
+        coords: list of (lat, lon)
+
+    Returns:
+        list of (level, tolerance, num_points, encoded polyline), finest first
+    """
+    projection = LocalProjection.around(coords)
+    points = np.array([projection.project(lat, lon) for lat, lon in coords], dtype=np.float64).reshape(-1, 2)
+    lods = []
+    for level, tolerance in enumerate(LOD_TOLERANCES):
+        kept = [coords[i] for i in douglas_peucker(points, tolerance)]
+        lods.append((level, tolerance, len(kept), encode_polyline(kept)))
+    return lods
+
+
+def level_for_zoom(zoom):
+    """
+    Coarsest level whose tolerance is below one pixel at this zoom. Pixel
+    size is taken at the equator; at latitude L a pixel is cos(L) times that,
+    so the error stays under 1.5 px up to 48 degrees.
+    """
+    pixel = METERS_PER_PIXEL_Z0 / 2 ** zoom
+    level = 0
+    for i, tolerance in enumerate(LOD_TOLERANCES):
+        if tolerance <= pixel:
+            level = i
+    return level
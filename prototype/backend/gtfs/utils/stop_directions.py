@@ -0,0 +1,263 @@
+"""
+Stop Directions and Stations
+
+Feeds often have two stops with the same name on opposite sides of a road,
+one per direction of travel. To tell them apart:
+
+- Bearing: the direction buses travel when they leave the stop. Every stop
+  visit contributes a unit vector - along the trip's shape where the trip
+  has one (the shape segment next to the stop that best agrees with the
+  direction of the next stop), else straight towards the next stop. The
+  vectors are averaged per stop; a stop served in opposite directions
+  (terminals, loops) gets no bearing.
+- Towards: the most common destination (Trip.headed_to) of trips leaving
+  the stop.
+- Stations: stops with the same name within STATION_RADIUS_METERS of each
+  other are grouped (union-find over the pairs the grid index finds).
+
+All per-visit work is done on NumPy arrays; the only Python loops are over
+shape segments (grid insertion) and unique (shape, stop, next stop) keys.
+"""
+
+import numpy as np
+
+from .spatial_index import GridIndex, LocalProjection
+from .transfers import find_transfers
+
+SHAPE_SNAP_METERS = 40.0        # shape segments further than this from the stop are ignored
+STATION_RADIUS_METERS = 200.0
+MIN_CONSISTENCY = 0.5           # |mean unit vector| below this -> mixed directions, no bearing
+COMPASS = ('N', 'NE', 'E', 'SE', 'S', 'SW', 'W', 'NW')
+
+
+def compass_label(bearing):
+    """8-point compass label of a bearing in degrees; '' for None."""
+    if bearing is None:
+        return ''
+    return COMPASS[int((bearing + 22.5) // 45) % 8]
+
+
+def _visit_vectors(stop_xy, visit_trips, visit_stops):
+    """
+    Direction of travel at every stop visit: towards the next stop of the
+    trip, or from the previous one at the last stop.
+
+    Returns:
+        Tuple of (mask of visits kept, next stop codes (-1 at the last stop), vectors)
+    """
+    n = len(visit_stops)
+    same = visit_trips[1:] == visit_trips[:-1]
+    has_next = np.zeros(n, dtype=bool)
+    has_next[:-1] = same
+    has_prev = np.zeros(n, dtype=bool)
+    has_prev[1:] = same
+
+    next_stops = np.full(n, -1, dtype=np.int64)
+    next_stops[:-1][same] = visit_stops[1:][same]
+
+    vectors = np.zeros((n, 2))
+    vectors[has_next] = stop_xy[next_stops[has_next]] - stop_xy[visit_stops[has_next]]
+    last = has_prev & ~has_next
+    previous = np.roll(visit_stops, 1)
+    vectors[last] = stop_xy[visit_stops[last]] - stop_xy[previous[last]]
+    return has_next | has_prev, next_stops, vectors
+
+
+def _unit(vectors):
+    norms = np.hypot(vectors[:, 0], vectors[:, 1])
+    unit = np.zeros_like(vectors)
+    nonzero = norms > 0
+    unit[nonzero] = vectors[nonzero] / norms[nonzero, None]
+    return unit
+
+
+def _snap_to_shapes(stop_xy, keys, key_vectors, shape_lines):
+    """
+    Replace the stop-to-stop direction of each (shape, stop, next stop) key
+    with the direction of the nearby shape segment that agrees with it best.
+
+    Args:
+        keys: (k, 3) int array of (shape code, stop code, next stop code)
+        key_vectors: (k, 2) stop-to-stop directions
+        shape_lines: list of (points, 2) arrays, projected, index = shape code
+
+    Returns:
+        (k, 2) unit directions
+    """
+    result = _unit(key_vectors)
+    lines = [(code, line) for code, line in enumerate(shape_lines) if len(line) >= 2]
+    if not lines or not len(keys):
+        return result
+
+    starts = np.concatenate([line[:-1] for _, line in lines])
+    ends = np.concatenate([line[1:] for _, line in lines])
+    segment_shapes = np.concatenate([np.full(len(line) - 1, code) for code, line in lines])
+
+    grid = GridIndex(SHAPE_SNAP_METERS)
+    low = np.minimum(starts, ends)
+    high = np.maximum(starts, ends)
+    for s in range(len(starts)):
+        grid.insert_bbox(s, low[s, 0], low[s, 1], high[s, 0], high[s, 1])
+
+    # Candidate (key, segment) pairs from the grid, then exact checks in bulk
+    query_codes, segment_codes = [], []
+    for q, (x, y) in enumerate(stop_xy[keys[:, 1]].tolist()):
+        candidates = set(grid.query_radius(x, y, SHAPE_SNAP_METERS))
+        query_codes.extend([q] * len(candidates))
+        segment_codes.extend(candidates)
+    if not query_codes:
+        return result
+    q = np.asarray(query_codes)
+    s = np.asarray(segment_codes)
+
+    on_shape = segment_shapes[s] == keys[q, 0]
+    q, s = q[on_shape], s[on_shape]
+
+    a, b, p = starts[s], ends[s], stop_xy[keys[q, 1]]
+    ab = b - a
+    length_sq = (ab ** 2).sum(axis=1)
+    t = np.clip(((p - a) * ab).sum(axis=1) / np.where(length_sq > 0, length_sq, 1.0), 0.0, 1.0)
+    distance_sq = ((a + t[:, None] * ab - p) ** 2).sum(axis=1)
+    near = (distance_sq <= SHAPE_SNAP_METERS ** 2) & (length_sq > 0)
+    q, ab = q[near], _unit(ab[near])
+
+    agreement = (ab * result[q]).sum(axis=1)
+    order = np.lexsort((-agreement, q))
+    q, ab, agreement = q[order], ab[order], agreement[order]
+    first = np.unique(q, return_index=True)[1]
+    best = first[agreement[first] > 0]   # a shape running the other way is not this trip's path
+    result[q[best]] = ab[best]
+    return result
+
+
+def compute_directions(stops, visits, trip_shapes=None, shapes=None, trip_headsigns=None):
+    """
+    Bearing and most common destination of every stop.
+
+    Args:
+        stops: dict stop_id -> (lat, lon)
+        visits: iterable of (trip_id, stop_id), ordered by trip then stop_sequence
+        trip_shapes: Optional dict trip_id -> shape_id
+        shapes: Optional dict shape_id -> list of (lat, lon)
+        trip_headsigns: Optional dict trip_id -> destination name
+
+    Returns:
+        dict stop_id -> (bearing degrees clockwise from north or None, towards or '')
+    """
+    trip_shapes = trip_shapes or {}
+    shapes = shapes or {}
+    trip_headsigns = trip_headsigns or {}
+
+    stop_ids = list(stops)
+    stop_index = {stop_id: code for code, stop_id in enumerate(stop_ids)}
+    projection = LocalProjection.around(stops.values())
+    stop_xy = np.array([projection.project(lat, lon) for lat, lon in stops.values()]).reshape(-1, 2)
+
+    trip_index = {}
+    trip_codes, stop_codes = [], []
+    for trip_id, stop_id in visits:
+        code = stop_index.get(stop_id)
+        if code is None:
+            continue
+        trip_codes.append(trip_index.setdefault(trip_id, len(trip_index)))
+        stop_codes.append(code)
+    visit_trips = np.asarray(trip_codes, dtype=np.int64)
+    visit_stops = np.asarray(stop_codes, dtype=np.int64)
+    trip_ids = list(trip_index)
+
+    empty = {stop_id: (None, '') for stop_id in stop_ids}
+    if len(visit_stops) < 2:
+        return empty
+
+    kept, next_stops, vectors = _visit_vectors(stop_xy, visit_trips, visit_stops)
+    visit_trips, visit_stops, next_stops, vectors = \
+        visit_trips[kept], visit_stops[kept], next_stops[kept], vectors[kept]
+    directions = _unit(vectors)
+
+    # Shape directions, computed once per (shape, stop, next stop)
+    shape_ids = list(shapes)
+    shape_index = {shape_id: code for code, shape_id in enumerate(shape_ids)}
+    trip_shape_codes = np.array(
+        [shape_index.get(trip_shapes.get(trip_id), -1) for trip_id in trip_ids], dtype=np.int64
+    )
+    visit_shapes = trip_shape_codes[visit_trips]
+    shaped = visit_shapes >= 0
+    if shaped.any():
+        keys, first, inverse = np.unique(
+            np.stack([visit_shapes[shaped], visit_stops[shaped], next_stops[shaped]], axis=1),
+            axis=0, return_index=True, return_inverse=True,
+        )
+        shape_lines = [
+            np.array([projection.project(lat, lon) for lat, lon in shapes[shape_id]]).reshape(-1, 2)
+            for shape_id in shape_ids
+        ]
+        snapped = _snap_to_shapes(stop_xy, keys, vectors[shaped][first], shape_lines)
+        directions[shaped] = snapped[inverse.reshape(-1)]
+
+    # Mean direction per stop
+    sums = np.zeros((len(stop_ids), 2))
+    np.add.at(sums, visit_stops, directions)
+    counts = np.bincount(visit_stops, minlength=len(stop_ids))
+    consistency = np.hypot(sums[:, 0], sums[:, 1]) / np.maximum(counts, 1)
+    bearings = np.degrees(np.arctan2(sums[:, 0], sums[:, 1])) % 360.0
+
+    # Most common destination of departing trips
+    towards = [''] * len(stop_ids)
+    headsigns = sorted({name for name in trip_headsigns.values() if name})
+    if headsigns:
+        headsign_index = {name: code for code, name in enumerate(headsigns)}
+        trip_headsign_codes = np.array(
+            [headsign_index.get(trip_headsigns.get(trip_id), -1) for trip_id in trip_ids], dtype=np.int64
+        )
+        visit_headsigns = trip_headsign_codes[visit_trips]
+        departing = (next_stops >= 0) & (visit_headsigns >= 0)
+        pairs, pair_counts = np.unique(
+            np.stack([visit_stops[departing], visit_headsigns[departing]], axis=1),
+            axis=0, return_counts=True,
+        )
+        if len(pairs):
+            order = np.lexsort((-pair_counts, pairs[:, 0]))
+            pairs = pairs[order]
+            first = np.unique(pairs[:, 0], return_index=True)[1]
+            for stop, headsign in pairs[first].tolist():
+                towards[stop] = headsigns[headsign]
+
+    return {
+        stop_id: (
+            round(float(bearings[code]), 1) if counts[code] and consistency[code] >= MIN_CONSISTENCY else None,
+            towards[code],
+        )
+        for code, stop_id in enumerate(stop_ids)
+    }
+
+
+def group_stations(stops, names, radius=STATION_RADIUS_METERS):
+    """
+    Group stops with the same name within `radius` of each other.
+
+    Args:
+        stops: dict stop_id -> (lat, lon)
+        names: dict stop_id -> name
+        radius: Meters
+
+    Returns:
+        dict stop_id -> station key (the smallest stop_id of its group)
+    """
+    parent = {stop_id: stop_id for stop_id in stops}
+
+    def find(stop_id):
+        while parent[stop_id] != stop_id:
+            parent[stop_id] = parent[parent[stop_id]]
+            stop_id = parent[stop_id]
+        return stop_id
+
+    def normalize(name):
+        return ' '.join((name or '').casefold().split())
+
+    for a, b, _ in find_transfers(stops, radius):
+        if a < b and normalize(names.get(a)) == normalize(names.get(b)):
+            root_a, root_b = find(a), find(b)
+            if root_a != root_b:
+                parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    return {stop_id: find(stop_id) for stop_id in stops}
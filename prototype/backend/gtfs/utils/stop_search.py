@@ -0,0 +1,321 @@
+"""
+Stop Search
+
+Name / stop_id search for autocomplete, which fires on every keystroke.
+
+Results are ranked by a text score - pg_trgm-style trigram similarity of the
+query and the stop name, plus a bonus when the name (or one of its words)
+starts with the query - optionally scaled down with distance from the
+user's position:
+
+    score = text_score * DISTANCE_HALF_SCORE_METERS / (DISTANCE_HALF_SCORE_METERS + distance)
+
+Two engines share that ranking:
+- StopSearchIndex: in-process, built once per feed version. Prefix matches
+  come from a sorted array of name words (bisect), fuzzy matches from a
+  trigram -> names inverted index scored with numpy.
+- search_db: the same query against the `gin_trgm_ops` index on Stop.name
+  (migration 0011), for when the in-process index is disabled.
+"""
+
+import bisect
+import re
+import threading
+import unicodedata
+from collections import defaultdict, namedtuple
+
+import numpy as np
+
+from .spatial_index import LocalProjection
+
+SIMILARITY_THRESHOLD = 0.3          # pg_trgm's default similarity threshold
+PREFIX_BONUS = 0.5                  # the name starts with the query
+WORD_PREFIX_BONUS = 0.3             # a later word of the name starts with the query
+DISTANCE_HALF_SCORE_METERS = 2000.0
+DB_CANDIDATES = 200                 # rows fetched by search_db before re-ranking
+
+SearchHit = namedtuple('SearchHit', ['stop_id', 'name', 'station_id', 'lat', 'lon', 'score', 'distance'])
+
+_NON_WORD = re.compile(r'[^0-9a-z]+')
+
+
+def normalize(text):
+    """Casefold, strip accents and collapse everything but letters and digits to single spaces."""
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode('ascii')
+    return _NON_WORD.sub(' ', text.casefold()).strip()
+
+
+def trigrams(normalized):
+    """Trigram set of a normalized string, as pg_trgm builds it (each word padded with 2 spaces before, 1 after)."""
+    result = set()
+    for word in normalized.split():
+        padded = f'  {word} '
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+def similarity(a, b):
+    """pg_trgm similarity of two normalized strings: shared trigrams / all trigrams."""
+    ta, tb = trigrams(a), trigrams(b)
+    if not ta or not tb:
+        return 0.0
+    shared = len(ta & tb)
+    return shared / (len(ta) + len(tb) - shared)
+
+
+def prefix_bonus(query, name):
+    """Bonus for a normalized name starting with the normalized query (or having a word that does)."""
+    if name.startswith(query):
+        return PREFIX_BONUS
+    if f' {query}' in f' {name}':
+        return WORD_PREFIX_BONUS
+    return 0.0
+
+
+def rank_score(text_score, distance=None):
+    """Final score of a match; distance in meters, None if no position was given."""
+    if distance is None:
+        return text_score
+    return text_score * DISTANCE_HALF_SCORE_METERS / (DISTANCE_HALF_SCORE_METERS + distance)
+
+
+class StopSearchIndex:
+    """
+    In-process stop search over one feed version's stops.
+
+    Stops are numbered in stop_id order; distinct normalized names are
+    numbered separately, so stops sharing a name share the scoring work.
+    """
+    _cache_lock = threading.Lock()
+    _cached_version = None
+    _cached_index = None
+
+    def __init__(self, stops):
+        """
+        Args:
+            stops: iterable of (stop_id, name, lat, lon, station_id or None)
+        """
+        stops = sorted(stops)
+        self.stop_ids = [stop_id for stop_id, _, _, _, _ in stops]
+        self.names = [name for _, name, _, _, _ in stops]
+        self.station_ids = [station_id for _, _, _, _, station_id in stops]
+        self.lat = np.array([lat for _, _, lat, _, _ in stops], dtype=np.float64)
+        self.lon = np.array([lon for _, _, _, lon, _ in stops], dtype=np.float64)
+        self.projection = LocalProjection.around(zip(self.lat, self.lon))
+        self.x = (self.lon - self.projection.ref_lon) * self.projection.kx
+        self.y = (self.lat - self.projection.ref_lat) * self.projection.ky
+
+        # Collapse key: stops of the same station share one
+        stations = {}
+        self.groups = np.array([
+            stations.setdefault(station_id, len(stations)) if station_id else len(stops) + code
+            for code, station_id in enumerate(self.station_ids)
+        ], dtype=np.int64)
+
+        name_numbers = {}
+        self.stop_name = np.array([
+            name_numbers.setdefault(normalize(name), len(name_numbers)) for name in self.names
+        ], dtype=np.int32)
+        self.num_names = len(name_numbers)
+
+        # Sorted word suffixes of every name: "mg road" -> "mg road" (whole name), "road"
+        keys = []
+        for name, number in name_numbers.items():
+            words = name.split()
+            for i in range(len(words)):
+                keys.append((' '.join(words[i:]), number, PREFIX_BONUS if i == 0 else WORD_PREFIX_BONUS))
+        keys.sort()
+        self._name_keys = [key for key, _, _ in keys]
+        self._name_key_numbers = np.array([number for _, number, _ in keys], dtype=np.int32)
+        self._name_key_bonus = np.array([bonus for _, _, bonus in keys], dtype=np.float64)
+
+        id_keys = sorted((stop_id.casefold(), code) for code, stop_id in enumerate(self.stop_ids))
+        self._id_keys = [key for key, _ in id_keys]
+        self._id_key_codes = np.array([code for _, code in id_keys], dtype=np.int64)
+
+        postings = defaultdict(list)
+        trigram_counts = np.zeros(self.num_names, dtype=np.float64)
+        for name, number in name_numbers.items():
+            grams = trigrams(name)
+            trigram_counts[number] = len(grams)
+            for gram in grams:
+                postings[gram].append(number)
+        self._postings = {gram: np.array(numbers, dtype=np.int32) for gram, numbers in postings.items()}
+        self._trigram_counts = trigram_counts
+
+    def __len__(self):
+        return len(self.stop_ids)
+
+    @staticmethod
+    def _prefix_range(keys, prefix):
+        return bisect.bisect_left(keys, prefix), bisect.bisect_left(keys, prefix + '\uffff')
+
+    def _name_scores(self, query):
+        """Text score of every distinct name (0 where below the threshold)."""
+        grams = trigrams(query)
+        postings = [self._postings[gram] for gram in grams if gram in self._postings]
+        if postings:
+            shared = np.bincount(np.concatenate(postings), minlength=self.num_names).astype(np.float64)
+            scores = shared / (len(grams) + self._trigram_counts - shared)
+            scores[scores < SIMILARITY_THRESHOLD] = 0.0
+        else:
+            scores = np.zeros(self.num_names, dtype=np.float64)
+
+        lo, hi = self._prefix_range(self._name_keys, query)
+        if lo < hi:
+            numbers = self._name_key_numbers[lo:hi]
+            bonus = np.zeros(self.num_names, dtype=np.float64)
+            np.maximum.at(bonus, numbers, self._name_key_bonus[lo:hi])
+            # A prefix match counts even when the similarity is below the threshold
+            raw = shared[numbers] / (len(grams) + self._trigram_counts[numbers] - shared[numbers]) if postings else 0.0
+            scores[numbers] = np.maximum(scores[numbers], raw) + bonus[numbers]
+        return scores
+
+    def search(self, query, lat=None, lon=None, limit=10, collapse=True):
+        """
+        Args:
+            query: Free text (stop name or stop_id prefix)
+            lat, lon: Optional position to rank nearby stops higher
+            limit: Maximum number of hits
+            collapse: Return only the best stop of each station
+
+        Returns:
+            List of SearchHit, best first
+        """
+        query = normalize(query)
+        if not query or not self.stop_ids:
+            return []
+
+        stop_scores = self._name_scores(query)[self.stop_name]
+        lo, hi = self._prefix_range(self._id_keys, query.replace(' ', ''))
+        if lo < hi:
+            codes = self._id_key_codes[lo:hi]
+            stop_scores[codes] = np.maximum(stop_scores[codes], 1.0 + PREFIX_BONUS)
+
+        candidates = np.flatnonzero(stop_scores > 0.0)
+        if not len(candidates):
+            return []
+
+        distances = None
+        scores = stop_scores[candidates]
+        if lat is not None and lon is not None:
+            px, py = self.projection.project(lat, lon)
+            distances = np.hypot(self.x[candidates] - px, self.y[candidates] - py)
+            scores = scores * DISTANCE_HALF_SCORE_METERS / (DISTANCE_HALF_SCORE_METERS + distances)
+
+        if collapse:
+            order = np.argsort(-scores, kind='stable')
+            picked = []
+            seen = set()
+            for i in order:
+                group = self.groups[candidates[i]]
+                if group not in seen:
+                    seen.add(group)
+                    picked.append(i)
+                    if len(picked) == limit:
+                        break
+        else:
+            if len(scores) > limit:
+                top = np.argpartition(-scores, limit - 1)[:limit]
+            else:
+                top = np.arange(len(scores))
+            picked = top[np.lexsort((candidates[top], -scores[top]))]
+
+        hits = []
+        for i in picked:
+            code = candidates[i]
+            hits.append(SearchHit(
+                stop_id=self.stop_ids[code],
+                name=self.names[code],
+                station_id=self.station_ids[code],
+                lat=float(self.lat[code]),
+                lon=float(self.lon[code]),
+                score=round(float(scores[i]), 4),
+                distance=None if distances is None else round(float(distances[i]), 1),
+            ))
+        return hits
+
+    @classmethod
+    def from_db(cls):
+        from gtfs.models import Stop
+
+        return cls(
+            (stop_id, name, geom.y, geom.x, station_id)
+            for stop_id, name, geom, station_id in Stop.objects.values_list('stop_id', 'name', 'geom', 'station_id')
+        )
+
+    @classmethod
+    def current(cls):
+        """
+        Index for the current feed version, built on first use and rebuilt
+        after every ingest. Returns None if no feed has been ingested.
+        """
+        from gtfs.models import FeedVersion
+
+        version = FeedVersion.current()
+        if version is None:
+            return None
+
+        if cls._cached_version != version.id:
+            with cls._cache_lock:
+                if cls._cached_version != version.id:
+                    cls._cached_index = cls.from_db()
+                    cls._cached_version = version.id
+        return cls._cached_index
+
+
+def search_db(query, lat=None, lon=None, limit=10, collapse=True):
+    """
+    Same search as StopSearchIndex.search, run in PostgreSQL.
+
+    Candidates come from the pg_trgm GIN index on Stop.name (word similarity,
+    so "kora" matches "Koramangala 5th Block") or an exact stop_id, ordered by
+    similarity; the best DB_CANDIDATES are re-ranked here with the shared
+    prefix bonus and distance.
+    """
+    from django.contrib.gis.db.models.functions import Distance
+    from django.contrib.gis.geos import Point
+    from django.contrib.postgres.search import TrigramWordSimilarity
+    from django.db.models import Q
+    from gtfs.models import Stop
+
+    normalized = normalize(query)
+    if not normalized:
+        return []
+
+    stops = Stop.objects.annotate(similarity=TrigramWordSimilarity(query, 'name')).filter(
+        Q(name__trigram_word_similar=query) | Q(stop_id=query)
+    )
+    if lat is not None and lon is not None:
+        stops = stops.annotate(distance=Distance('geom', Point(lon, lat, srid=4326)))
+    rows = stops.order_by('-similarity', 'stop_id')[:DB_CANDIDATES]
+
+    ranked = []
+    for stop in rows:
+        if stop.stop_id.casefold() == query.strip().casefold():
+            text_score = 1.0 + PREFIX_BONUS
+        else:
+            text_score = stop.similarity + prefix_bonus(normalized, normalize(stop.name))
+        distance = stop.distance.m if lat is not None and lon is not None else None
+        ranked.append((-rank_score(text_score, distance), stop.stop_id, stop, distance))
+    ranked.sort(key=lambda item: item[:2])
+
+    hits = []
+    seen = set()
+    for neg_score, _, stop, distance in ranked:
+        group = stop.station_id or f'stop:{stop.stop_id}'
+        if collapse and group in seen:
+            continue
+        seen.add(group)
+        hits.append(SearchHit(
+            stop_id=stop.stop_id,
+            name=stop.name,
+            station_id=stop.station_id,
+            lat=stop.geom.y,
+            lon=stop.geom.x,
+            score=round(-neg_score, 4),
+            distance=None if distance is None else round(distance, 1),
+        ))
+        if len(hits) == limit:
+            break
+    return hits
@@ -0,0 +1,364 @@
+"""
+Offline Timetable Bundles
+
+Compact binary timetables of one route, or of one map region, for clients
+that look departures up locally instead of calling `upcoming`.
+`build_bundles` writes them per feed version as static files
+(BUNDLE_DIR/v<id>/routes/<route_id>.sctb, .../regions/<z>-<x>-<y>.sctb)
+plus a manifest.json; a new ingest starts a new directory and prunes the old
+ones, so a bundle URL never changes content.
+
+Format (all integers little-endian):
+
+    header  4s magic b'SCTB', u8 format version, u8 flags (1 = body zlib-compressed),
+            u16 reserved, u32 feed version id
+    body    unsigned LEB128 varints (v) and zigzag varints (z):
+      strings   v count, then per string: v UTF-8 length, bytes
+      stops     v count, then per stop: v id, v name (string indexes),
+                z lat, z lon (1e-6 degrees, delta to the previous stop)
+      routes    v count, then per route: v id, v short name, v long name (string indexes)
+      patterns  v count, then per pattern: v stop count, z stop index deltas
+      timings   v count, then per timing: v pattern, then per stop:
+                z arrival - previous departure (taken as 0 before the first stop),
+                z departure - arrival
+      trips     v count, sorted by (timing, start), then per trip: v id, v route,
+                v headsign, v service (string indexes), v timing,
+                z start - previous trip's start (service-day seconds),
+                v window count, per window: v start, v end - start, v headway
+
+Offsets are relative to the trip's first departure, as in PatternTiming.
+A trip with frequency windows is a template (gtfs/utils/frequencies.py).
+"""
+
+import math
+import os
+import shutil
+import struct
+import zlib
+from collections import defaultdict
+from urllib.parse import quote
+
+from .patterns import load_schedules
+
+MAGIC = b'SCTB'
+FORMAT_VERSION = 1
+FLAG_COMPRESSED = 1
+HEADER = struct.Struct('<4sBBHI')
+COORDINATE_SCALE = 1_000_000
+REGION_ZOOM = 12          # web-mercator tiles of ~10 km at the equator
+
+
+class _Writer:
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def uint(self, value):
+        while value >= 0x80:
+            self.buffer.append((value & 0x7f) | 0x80)
+            value >>= 7
+        self.buffer.append(value)
+
+    def sint(self, value):
+        self.uint(value << 1 if value >= 0 else (-value << 1) - 1)
+
+
+class _Reader:
+    def __init__(self, data):
+        self.data = data
+        self.position = 0
+
+    def uint(self):
+        result = shift = 0
+        while True:
+            byte = self.data[self.position]
+            self.position += 1
+            result |= (byte & 0x7f) << shift
+            shift += 7
+            if byte < 0x80:
+                return result
+
+    def sint(self):
+        value = self.uint()
+        return (value >> 1) ^ -(value & 1)
+
+    def string(self):
+        length = self.uint()
+        start = self.position
+        self.position += length
+        return bytes(self.data[start:self.position]).decode('utf-8')
+
+
+def encode_bundle(feed_version_id, stops, routes, trips, compress=True):
+    """
+    Args:
+        feed_version_id: Feed version the data belongs to
+        stops: dict stop_id -> (name, lat, lon); must contain every stop of `trips`
+        routes: dict route_id -> (short_name, long_name); must contain every route of `trips`
+        trips: iterable of (trip_id, route_id, headsign, service_id, stop_ids,
+               arrival_offsets, departure_offsets, start_seconds, windows)
+        compress: zlib-compress the body
+
+    Returns:
+        Bundle bytes
+    """
+    strings = {}
+
+    def string(value):
+        index = strings.get(value or '')
+        if index is None:
+            index = strings[value or ''] = len(strings)
+        return index
+
+    trips = list(trips)
+    stop_ids = sorted({stop_id for trip in trips for stop_id in trip[4]})
+    stop_index = {stop_id: i for i, stop_id in enumerate(stop_ids)}
+    route_ids = sorted({trip[1] for trip in trips})
+    route_index = {route_id: i for i, route_id in enumerate(route_ids)}
+
+    patterns = {}
+    timings = {}
+    encoded_trips = []
+    for trip_id, route_id, headsign, service_id, trip_stops, arrivals, departures, start, windows in trips:
+        pattern = patterns.setdefault(tuple(stop_index[stop_id] for stop_id in trip_stops), len(patterns))
+        timing = timings.setdefault((pattern, tuple(arrivals), tuple(departures)), len(timings))
+        encoded_trips.append((timing, start, string(trip_id), route_index[route_id], string(headsign),
+                              string(service_id), windows))
+    encoded_trips.sort(key=lambda trip: (trip[0], trip[1]))
+
+    body = _Writer()
+    sections = _Writer()
+
+    sections.uint(len(stop_ids))
+    previous_lat = previous_lon = 0
+    for stop_id in stop_ids:
+        name, lat, lon = stops[stop_id]
+        lat_e, lon_e = round(lat * COORDINATE_SCALE), round(lon * COORDINATE_SCALE)
+        sections.uint(string(stop_id))
+        sections.uint(string(name))
+        sections.sint(lat_e - previous_lat)
+        sections.sint(lon_e - previous_lon)
+        previous_lat, previous_lon = lat_e, lon_e
+
+    sections.uint(len(route_ids))
+    for route_id in route_ids:
+        short_name, long_name = routes[route_id]
+        sections.uint(string(route_id))
+        sections.uint(string(short_name))
+        sections.uint(string(long_name))
+
+    sections.uint(len(patterns))
+    for pattern_stops in patterns:
+        sections.uint(len(pattern_stops))
+        previous = 0
+        for index in pattern_stops:
+            sections.sint(index - previous)
+            previous = index
+
+    sections.uint(len(timings))
+    for pattern, arrivals, departures in timings:
+        sections.uint(pattern)
+        previous_departure = 0
+        for arrival, departure in zip(arrivals, departures):
+            sections.sint(arrival - previous_departure)
+            sections.sint(departure - arrival)
+            previous_departure = departure
+
+    sections.uint(len(encoded_trips))
+    previous_start = 0
+    for timing, start, trip_id, route, headsign, service_id, windows in encoded_trips:
+        sections.uint(trip_id)
+        sections.uint(route)
+        sections.uint(headsign)
+        sections.uint(service_id)
+        sections.uint(timing)
+        sections.sint(start - previous_start)
+        previous_start = start
+        sections.uint(len(windows))
+        for window_start, window_end, headway in windows:
+            sections.uint(window_start)
+            sections.uint(window_end - window_start)
+            sections.uint(headway)
+
+    # The string table goes first but is only complete now
+    body.uint(len(strings))
+    for value in strings:
+        encoded = value.encode('utf-8')
+        body.uint(len(encoded))
+        body.buffer += encoded
+    body.buffer += sections.buffer
+
+    payload = zlib.compress(bytes(body.buffer), 9) if compress else bytes(body.buffer)
+    return HEADER.pack(MAGIC, FORMAT_VERSION, FLAG_COMPRESSED if compress else 0, 0, feed_version_id) + payload
+
+
+def decode_bundle(data):
+    """
+    Reference decoder (what a client does), inverse of encode_bundle.
+
+    Returns:
+        dict with 'feed_version', 'stops' {stop_id: (name, lat, lon)},
+        'routes' {route_id: (short_name, long_name)} and 'trips', a list of
+        encode_bundle trip tuples in bundle order
+    """
+    magic, format_version, flags, _, feed_version_id = HEADER.unpack_from(data)
+    if magic != MAGIC or format_version != FORMAT_VERSION:
+        raise ValueError(f"Not a format {FORMAT_VERSION} timetable bundle")
+    body = data[HEADER.size:]
+    reader = _Reader(zlib.decompress(body) if flags & FLAG_COMPRESSED else body)
+
+    strings = [reader.string() for _ in range(reader.uint())]
+
+    stops = {}
+    stop_ids = []
+    lat_e = lon_e = 0
+    for _ in range(reader.uint()):
+        stop_id, name = strings[reader.uint()], strings[reader.uint()]
+        lat_e += reader.sint()
+        lon_e += reader.sint()
+        stops[stop_id] = (name, lat_e / COORDINATE_SCALE, lon_e / COORDINATE_SCALE)
+        stop_ids.append(stop_id)
+
+    routes = {}
+    route_ids = []
+    for _ in range(reader.uint()):
+        route_id = strings[reader.uint()]
+        routes[route_id] = (strings[reader.uint()], strings[reader.uint()])
+        route_ids.append(route_id)
+
+    patterns = []
+    for _ in range(reader.uint()):
+        index = 0
+        pattern_stops = []
+        for _ in range(reader.uint()):
+            index += reader.sint()
+            pattern_stops.append(stop_ids[index])
+        patterns.append(pattern_stops)
+
+    timings = []
+    for _ in range(reader.uint()):
+        pattern = reader.uint()
+        arrivals, departures = [], []
+        departure = 0
+        for _ in patterns[pattern]:
+            arrival = departure + reader.sint()
+            departure = arrival + reader.sint()
+            arrivals.append(arrival)
+            departures.append(departure)
+        timings.append((pattern, arrivals, departures))
+
+    trips = []
+    start = 0
+    for _ in range(reader.uint()):
+        trip_id, route, headsign, service_id = (strings[reader.uint()], route_ids[reader.uint()],
+                                                strings[reader.uint()], strings[reader.uint()])
+        pattern, arrivals, departures = timings[reader.uint()]
+        start += reader.sint()
+        windows = []
+        for _ in range(reader.uint()):
+            window_start = reader.uint()
+            windows.append((window_start, window_start + reader.uint(), reader.uint()))
+        trips.append((trip_id, route, headsign, service_id, patterns[pattern], arrivals, departures, start, windows))
+
+    return {'feed_version': feed_version_id, 'stops': stops, 'routes': routes, 'trips': trips}
+
+
+def region_of(lat, lon, zoom=REGION_ZOOM):
+    """(z, x, y) of the web-mercator tile containing a point."""
+    n = 2 ** zoom
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return zoom, min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def load_feed():
+    """
+    Everything a bundle can contain, in encode_bundle's shapes.
+
+    Returns:
+        (stops, routes, trips) - trips as a list of encode_bundle trip tuples
+    """
+    from gtfs.models import Frequency, Route, Stop, Trip
+
+    stops = {
+        stop_id: (name, geom.y, geom.x)
+        for stop_id, name, geom in Stop.objects.values_list('stop_id', 'name', 'geom')
+    }
+    routes = {
+        route_id: (short_name, long_name)
+        for route_id, short_name, long_name in Route.objects.values_list('route_id', 'short_name', 'long_name')
+    }
+    info = {
+        trip_id: (headed_to, service_id)
+        for trip_id, headed_to, service_id in Trip.objects.values_list('trip_id', 'headed_to', 'service_id')
+    }
+    windows = defaultdict(list)
+    for trip_id, start, end, headway in Frequency.objects.order_by('trip_id', 'start_seconds').values_list(
+        'trip_id', 'start_seconds', 'end_seconds', 'headway_seconds'
+    ):
+        windows[trip_id].append((start, end, headway))
+
+    trips = []
+    for schedule in load_schedules():
+        start = schedule.departures[0]
+        headed_to, service_id = info[schedule.trip_id]
+        trips.append((
+            schedule.trip_id, schedule.route_id, headed_to, service_id, schedule.stop_ids,
+            [arrival - start for arrival in schedule.arrivals],
+            [departure - start for departure in schedule.departures],
+            start, windows.get(schedule.trip_id, []),
+        ))
+    return stops, routes, trips
+
+
+def group_trips(stops, trips, zoom=REGION_ZOOM):
+    """
+    Split trips into bundles.
+
+    Returns:
+        Tuple of:
+        - dict route_id -> trips of the route
+        - dict (z, x, y) -> trips calling at a stop in that region (whole trips,
+          so a lookup never ends mid-journey)
+    """
+    by_route = defaultdict(list)
+    by_region = defaultdict(list)
+    stop_regions = {stop_id: region_of(lat, lon, zoom) for stop_id, (_, lat, lon) in stops.items()}
+    for trip in trips:
+        by_route[trip[1]].append(trip)
+        for region in {stop_regions[stop_id] for stop_id in trip[4]}:
+            by_region[region].append(trip)
+    return by_route, by_region
+
+
+def route_filename(route_id):
+    return f'routes/{quote(route_id, safe="")}.sctb'
+
+
+def region_filename(z, x, y):
+    return f'regions/{z}-{x}-{y}.sctb'
+
+
+def version_directory(version_id):
+    from django.conf import settings
+    return os.path.join(str(settings.BUNDLE_DIR), f'v{version_id}')
+
+
+def write_file(path, data):
+    """Write atomically: concurrent readers see the old file or the whole new one."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.tmp-{os.getpid()}'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def prune_versions(keep_version_id):
+    """Delete the bundles of feed versions older than keep_version_id."""
+    from django.conf import settings
+
+    root = str(settings.BUNDLE_DIR)
+    if not os.path.isdir(root):
+        return
+    for name in os.listdir(root):
+        if name.startswith('v') and name[1:].isdigit() and int(name[1:]) < keep_version_id:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
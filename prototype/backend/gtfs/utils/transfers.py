@@ -0,0 +1,55 @@
+"""
+Walking Transfers
+
+Stop pairs within walking distance of each other, found with the in-memory
+grid index: every stop only looks at the 3x3 block of cells around it
+(cell size = max distance), so the cost grows with the number of stops times
+the local density rather than with all pairs.
+"""
+
+import math
+
+from .spatial_index import GridIndex, LocalProjection
+
+WALKING_SPEED = 1.2       # m/s
+WALKING_DETOUR = 1.25     # street distance / straight-line distance
+MAX_WALK_METERS = 500.0
+
+
+def walking_seconds(distance_meters, speed=WALKING_SPEED, detour=WALKING_DETOUR):
+    return int(distance_meters * detour / speed)
+
+
+def find_transfers(stops, max_distance=MAX_WALK_METERS):
+    """
+    All ordered stop pairs within max_distance (straight line).
+
+    Args:
+        stops: dict stop_id -> (lat, lon)
+        max_distance: Meters
+
+    Returns:
+        List of (from_stop_id, to_stop_id, distance_meters), both directions of each pair
+    """
+    stop_ids = list(stops)
+    projection = LocalProjection.around(stops.values())
+    grid = GridIndex(max_distance)
+    points = []
+    for code, stop_id in enumerate(stop_ids):
+        x, y = projection.project(*stops[stop_id])
+        points.append((x, y))
+        grid.insert_point(code, x, y)
+
+    max_sq = max_distance * max_distance
+    pairs = []
+    for code, (x, y) in enumerate(points):
+        for other in grid.query_radius(x, y, max_distance):
+            if other <= code:
+                continue  # each unordered pair once
+            ox, oy = points[other]
+            d2 = (ox - x) ** 2 + (oy - y) ** 2
+            if d2 <= max_sq:
+                distance = math.sqrt(d2)
+                pairs.append((stop_ids[code], stop_ids[other], distance))
+                pairs.append((stop_ids[other], stop_ids[code], distance))
+    return pairs
@@ -0,0 +1,116 @@
+"""
+Vector Tiles
+
+Mapbox Vector Tiles (MVT) of stops and route shapes for map rendering,
+rendered by PostGIS (ST_AsMVT) for web-mercator tile z/x/y:
+
+- layer "stops": every stop from STOPS_MIN_ZOOM up (too dense to be useful
+  below); attributes stop_id, name, station, side
+- layer "shapes": every shape, simplified to about one pixel at the tile's
+  zoom before clipping; attributes shape_id, routes (short names)
+
+Tiles are gzipped and cached on disk per feed version
+(TILE_CACHE_DIR/v<id>/<z>/<x>/<y>.mvt.gz). A new ingest starts a new
+directory and prunes the old ones, so cached tiles never go stale.
+"""
+
+import gzip
+import os
+import shutil
+
+EXTENT = 4096                 # tile coordinate resolution
+BUFFER = 64                   # extent units kept beyond the tile edge, so lines and icons are not cut at seams
+MAX_ZOOM = 20
+STOPS_MIN_ZOOM = 13
+SIMPLIFY_PIXELS = 1.0         # shape simplification tolerance, in screen pixels (256 per tile)
+WEB_MERCATOR_WIDTH = 40075016.68557849
+
+TILE_SQL = """
+WITH bounds AS (
+    SELECT ST_TileEnvelope(%(z)s, %(x)s, %(y)s) AS tile,
+           ST_Transform(ST_Expand(ST_TileEnvelope(%(z)s, %(x)s, %(y)s), %(margin)s), 4326) AS query
+),
+stops AS (
+    SELECT s.stop_id, s.name, s.station_id AS station, s.side,
+           ST_AsMVTGeom(ST_Transform(s.geom, 3857), bounds.tile, %(extent)s, %(buffer)s, true) AS geom
+    FROM gtfs_stop s, bounds
+    WHERE %(z)s >= %(stops_min_zoom)s AND s.geom && bounds.query
+),
+shapes AS (
+    SELECT sh.shape_id,
+           (SELECT string_agg(DISTINCT r.short_name, ',')
+              FROM gtfs_trip t JOIN gtfs_route r ON r.route_id = t.route_id
+             WHERE t.shape_id = sh.shape_id) AS routes,
+           ST_AsMVTGeom(ST_Simplify(ST_Transform(sh.geometry, 3857), %(tolerance)s),
+                        bounds.tile, %(extent)s, %(buffer)s, true) AS geom
+    FROM gtfs_shape sh, bounds
+    WHERE sh.geometry && bounds.query
+)
+SELECT COALESCE((SELECT ST_AsMVT(stops, 'stops', %(extent)s, 'geom') FROM stops WHERE geom IS NOT NULL), ''::bytea)
+    || COALESCE((SELECT ST_AsMVT(shapes, 'shapes', %(extent)s, 'geom') FROM shapes WHERE geom IS NOT NULL), ''::bytea)
+"""
+
+
+def valid_tile(z, x, y):
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def render_tile(z, x, y):
+    """
+    Render one tile from the database.
+
+    Returns:
+        Uncompressed MVT bytes (empty if nothing is in the tile)
+    """
+    from django.db import connection
+
+    tile_meters = WEB_MERCATOR_WIDTH / 2 ** z
+    params = {
+        'z': z, 'x': x, 'y': y,
+        'extent': EXTENT,
+        'buffer': BUFFER,
+        'margin': tile_meters * BUFFER / EXTENT,
+        'tolerance': tile_meters / 256 * SIMPLIFY_PIXELS,
+        'stops_min_zoom': STOPS_MIN_ZOOM,
+    }
+    with connection.cursor() as cursor:
+        cursor.execute(TILE_SQL, params)
+        return bytes(cursor.fetchone()[0])
+
+
+def version_directory(version_id):
+    from django.conf import settings
+    return os.path.join(str(settings.TILE_CACHE_DIR), f'v{version_id}')
+
+
+def cached_tile(version_id, z, x, y):
+    """
+    Gzipped tile of a feed version, rendered and written to the disk cache
+    on first request.
+    """
+    path = os.path.join(version_directory(version_id), str(z), str(x), f'{y}.mvt.gz')
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+
+    data = gzip.compress(render_tile(z, x, y), mtime=0)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.tmp-{os.getpid()}'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)  # atomic: concurrent readers see the old file or the whole new one
+    return data
+
+
+def prune_versions(keep_version_id):
+    """Delete the cached tiles of feed versions older than keep_version_id."""
+    from django.conf import settings
+
+    root = str(settings.TILE_CACHE_DIR)
+    if not os.path.isdir(root):
+        return
+    for name in os.listdir(root):
+        if name.startswith('v') and name[1:].isdigit() and int(name[1:]) < keep_version_id:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
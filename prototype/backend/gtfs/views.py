@@ -1,20 +1,39 @@
 from rest_framework import viewsets, filters
 from rest_framework_gis.filters import DistanceToPointFilter
-from .serializers import StopSerializer, RouteSerializer, TripSerializer, TripDetailSerializer, UpcomingTripSerializer
-from .models import Stop, Route, Trip, StopTime
+from .serializers import StopSerializer, RouteSerializer, TripSerializer, TripDetailSerializer
+from .models import Stop, Route, Trip, StopTime, PatternStop, Frequency, ShapeLOD, FeedVersion
+from .routing.csa import ConnectionScan
+from .routing.raptor import Raptor
+from .routing.timetable import Timetable
+from .utils.frequencies import instance_starts, instance_trip_id
+from .utils.shape_lod import LOD_TOLERANCES, level_for_zoom
+from .utils.conditional import FeedCachedMixin, feed_conditional_response
+from .utils.feed_diff import changes_since, oldest_since
+from .utils.pagination import RoutePagination, StopPagination, TripPagination
 from realtime.models import ActiveTrip
+from realtime.propagation import predicted_arrival_at
 from rest_framework.decorators import action
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
-from django.utils import timezone
-import datetime
+from django.db.models import Prefetch
+from django.utils.decorators import method_decorator
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_GET
 
-class StopViewSet(viewsets.ReadOnlyModelViewSet):
+class StopViewSet(FeedCachedMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Stop.objects.all()
     serializer_class = StopSerializer
+    pagination_class = StopPagination
+    feed_cached_actions = ('list', 'retrieve', 'search')
     filter_backends = [DistanceToPointFilter, filters.SearchFilter]
     distance_filter_field = 'geom'
     distance_filter_convert_meters = True
     search_fields = ['name', 'stop_id']
+    SEARCH_MAX_LIMIT = 50
+    SEARCH_MAX_QUERY_LENGTH = 100
+    NEAREST_MAX_K = 50
+    NEAREST_MAX_DEPARTURES = 5
+    NEAREST_DEPARTURE_WINDOW = 7200  # seconds ahead searched for departures
 
     @action(detail=True, methods=['get'])
     def upcoming(self, request, pk=None):
@@ -36,16 +55,29 @@ class StopViewSet(viewsets.ReadOnlyModelViewSet):
         window_start = current_seconds - 900
         window_end = current_seconds + 7200
         
-        # Find upcoming trips at this stop
+        # Find upcoming trips at this stop (frequency templates are expanded below)
+        templates = self._frequency_templates([stop.stop_id]).get(stop.stop_id, {})
         queryset = StopTime.objects.filter(
             stop=stop,
             arrival_seconds__isnull=False,  # Ensure new field is populated
             arrival_seconds__gte=window_start,
             arrival_seconds__lte=window_end
+        ).exclude(
+            trip_id__in=list(templates)
         ).select_related('trip', 'trip__route', 'trip__route__agency').order_by('arrival_seconds')
         
+        # (trip, stop_sequence, arrival, departure, instance start or None)
+        visits = [
+            (st.trip, st.stop_sequence, st.arrival_seconds, st.departure_seconds, None)
+            for st in queryset
+        ]
+        for trip, windows, stop_sequence, arrival_offset, departure_offset in templates.values():
+            for start in instance_starts(windows, window_start, window_end, arrival_offset):
+                visits.append((trip, stop_sequence, start + arrival_offset, start + departure_offset, start))
+        visits.sort(key=lambda visit: visit[2])
+        
         # Prefetch ActiveTrips for these trips
-        trip_ids = [st.trip_id for st in queryset]
+        trip_ids = {visit[0].trip_id for visit in visits}
         active_trips = {
             at.trip_id: at 
             for at in ActiveTrip.objects.filter(trip_id__in=trip_ids)
@@ -53,9 +85,12 @@ class StopViewSet(viewsets.ReadOnlyModelViewSet):
         
         # Serialize with actual timestamps
         results = []
-        for st in queryset:
-            # Check for active trip
-            active_trip = active_trips.get(st.trip_id)
+        for trip, stop_sequence, arrival_seconds, departure_seconds, instance_start in visits:
+            # Check for active trip; a frequency template's follows one of its
+            # instances (ActiveTrip.instance_start), the others run to schedule
+            active_trip = active_trips.get(trip.trip_id)
+            if active_trip and active_trip.instance_start != instance_start:
+                active_trip = None
             
             # Base delay is 0
             delay = 0
@@ -63,28 +98,35 @@ class StopViewSet(viewsets.ReadOnlyModelViewSet):
             confidence = 0.0
             
             if active_trip:
-                delay = active_trip.delay_seconds
                 is_realtime = True
                 confidence = active_trip.confidence_score
+                
+                # Per-stop prediction if there is one, else the trip's current delay
+                predicted = predicted_arrival_at(active_trip, stop_sequence)
+                if predicted is not None:
+                    delay = predicted - arrival_seconds
+                else:
+                    delay = active_trip.delay_seconds
             
             # Calculate adjusted arrival/departure
             # We add the delay to the scheduled seconds
-            adjusted_arrival = st.arrival_seconds + delay
-            adjusted_departure = st.departure_seconds + delay
+            adjusted_arrival = arrival_seconds + delay
+            adjusted_departure = departure_seconds + delay
             
             arrival_dt = seconds_to_actual_datetime(service_date, adjusted_arrival, agency.timezone)
             departure_dt = seconds_to_actual_datetime(service_date, adjusted_departure, agency.timezone)
             
             results.append({
                 'trip': {
-                    'trip_id': st.trip.trip_id,
-                    'route_id': st.trip.route.route_id,
-                    'route_name': st.trip.route.short_name,
-                    'headed_to': st.trip.headed_to,
+                    'trip_id': trip.trip_id if instance_start is None else instance_trip_id(trip.trip_id, instance_start),
+                    'route_id': trip.route.route_id,
+                    'route_name': trip.route.short_name,
+                    'headed_to': trip.headed_to,
+                    'frequency_based': instance_start is not None,
                 },
                 'arrival_timestamp': arrival_dt.isoformat(),  # ISO8601 with timezone
                 'departure_timestamp': departure_dt.isoformat(),  # ISO8601 with timezone
-                'stop_sequence': st.stop_sequence,
+                'stop_sequence': stop_sequence,
                 'seconds_until_arrival': adjusted_arrival - current_seconds,
                 
                 # Realtime info
@@ -93,23 +135,723 @@ class StopViewSet(viewsets.ReadOnlyModelViewSet):
                 'confidence_score': confidence
             })
         
-        # Apply pagination if needed
-        page = self.paginate_queryset(results)
+        # Apply pagination if needed (a list, not a queryset: no cursor to page on)
+        paginator = PageNumberPagination()
+        page = paginator.paginate_queryset(results, request, view=self)
         if page is not None:
-            return self.get_paginated_response(page)
+            return paginator.get_paginated_response(page)
         
         return Response(results)
     
-class RouteViewSet(viewsets.ReadOnlyModelViewSet):
+    def _frequency_templates(self, stop_ids):
+        """
+        Frequency-based trips serving some stops.
+
+        Returns:
+            dict stop_id -> dict trip_id -> (trip, windows, stop_sequence, arrival offset, departure offset)
+            where the offsets are seconds from the instance start
+        """
+        positions = {}
+        for stop_id, pattern_id, position, stop_sequence in PatternStop.objects.filter(
+            stop_id__in=stop_ids,
+        ).order_by('position').values_list('stop_id', 'pattern_id', 'position', 'stop_sequence'):
+            # first visit on loop patterns
+            positions.setdefault(pattern_id, {}).setdefault(stop_id, (position, stop_sequence))
+        if not positions:
+            return {}
+        
+        templates = {}
+        for frequency in Frequency.objects.filter(
+            trip__pattern_id__in=list(positions),
+        ).select_related('trip', 'trip__route', 'trip__timing').order_by('trip_id', 'start_seconds'):
+            trip = frequency.trip
+            window = (frequency.start_seconds, frequency.end_seconds, frequency.headway_seconds)
+            for stop_id, (position, stop_sequence) in positions[trip.pattern_id].items():
+                stop_templates = templates.setdefault(stop_id, {})
+                if trip.trip_id not in stop_templates:
+                    stop_templates[trip.trip_id] = (
+                        trip, [], stop_sequence,
+                        trip.timing.arrival_offsets[position],
+                        trip.timing.departure_offsets[position],
+                    )
+                stop_templates[trip.trip_id][1].append(window)
+        return templates
+    
+    @action(detail=True, methods=['get'])
+    def isochrone(self, request, pk=None):
+        """
+        Stops reachable from this stop within a travel time budget.
+        
+        Query params:
+        - time: departure time today, HH:MM or HH:MM:SS (default: now)
+        - duration: travel time budget in minutes (default: 30, max: 120)
+        - window: departure window in minutes (default: 0 = leave exactly at `time`, max: 120).
+                  With a window, each stop reports its best travel time over all
+                  departures in the window and the share of departures that reach it.
+        """
+        from gtfs.utils.time_helpers import get_current_service_time, gtfs_time_to_seconds
+        from gtfs.models import Agency
+        
+        try:
+            duration = int(request.query_params.get('duration', 30))
+            window = int(request.query_params.get('window', 0))
+        except ValueError:
+            return Response({"error": "duration and window must be integers (minutes)"}, status=400)
+        if not 1 <= duration <= 120:
+            return Response({"error": "duration must be between 1 and 120 minutes"}, status=400)
+        if not 0 <= window <= 120:
+            return Response({"error": "window must be between 0 and 120 minutes"}, status=400)
+        
+        agency = Agency.objects.first()
+        scan = ConnectionScan.current()
+        if not agency or scan is None:
+            return Response({"error": "No agency configured. Run GTFS ingestion first."}, status=500)
+        
+        _, departure_seconds = get_current_service_time(agency.timezone)
+        time_param = request.query_params.get('time')
+        if time_param:
+            try:
+                if time_param.count(':') == 1:
+                    time_param += ':00'
+                departure_seconds = gtfs_time_to_seconds(time_param)
+            except (ValueError, IndexError):
+                return Response({"error": "time must be HH:MM or HH:MM:SS"}, status=400)
+        
+        origin = scan.stop_index.get(pk)
+        if origin is None:
+            return Response({"error": f"Unknown stop: {pk}"}, status=404)
+        
+        stops = []
+        if window:
+            profile = scan.profile(origin, departure_seconds, window * 60, duration * 60)
+            for code, (travel, departure, share) in profile.items():
+                lat, lon = scan.stop_coords[code]
+                stops.append({
+                    'stop_id': str(scan.stop_ids[code]),
+                    'lat': float(lat),
+                    'lon': float(lon),
+                    'travel_seconds': travel,
+                    'best_departure_seconds': departure,
+                    'reachable_share': round(share, 3),
+                })
+        else:
+            for code, arrival in scan.earliest_arrivals(origin, departure_seconds, duration * 60).items():
+                lat, lon = scan.stop_coords[code]
+                stops.append({
+                    'stop_id': str(scan.stop_ids[code]),
+                    'lat': float(lat),
+                    'lon': float(lon),
+                    'travel_seconds': arrival - departure_seconds,
+                })
+        stops.sort(key=lambda item: item['travel_seconds'])
+        
+        return Response({
+            'stop_id': pk,
+            'departure_seconds': departure_seconds,
+            'duration_seconds': duration * 60,
+            'window_seconds': window * 60,
+            'stops': stops,
+        })
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Stop autocomplete: GET /api/gtfs/stops/search/?q=kora&lat=12.93&lon=77.62
+
+        Query params:
+        - q: stop name (any part, typos tolerated) or stop_id prefix (required)
+        - lat, lon: rank stops near this point higher (optional, both or neither)
+        - limit: 1-50 (default: 10)
+        - collapse: one result per station, true/false (default: true)
+        """
+        from django.conf import settings
+        from gtfs.utils.stop_search import StopSearchIndex, normalize, search_db
+
+        query = request.query_params.get('q', '')
+        if not normalize(query):
+            return Response({"error": "q must contain at least one letter or digit"}, status=400)
+        if len(query) > self.SEARCH_MAX_QUERY_LENGTH:
+            return Response({"error": f"q must be at most {self.SEARCH_MAX_QUERY_LENGTH} characters"}, status=400)
+
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            return Response({"error": "limit must be an integer"}, status=400)
+        if not 1 <= limit <= self.SEARCH_MAX_LIMIT:
+            return Response({"error": f"limit must be between 1 and {self.SEARCH_MAX_LIMIT}"}, status=400)
+
+        lat = request.query_params.get('lat')
+        lon = request.query_params.get('lon')
+        if (lat is None) != (lon is None):
+            return Response({"error": "lat and lon must be given together"}, status=400)
+        if lat is not None:
+            try:
+                lat, lon = float(lat), float(lon)
+            except ValueError:
+                return Response({"error": "lat and lon must be numbers"}, status=400)
+
+        collapse = request.query_params.get('collapse', 'true').lower() not in ('false', '0', 'no')
+
+        index = StopSearchIndex.current() if settings.STOP_SEARCH_IN_PROCESS else None
+        if index is not None:
+            hits = index.search(query, lat, lon, limit=limit, collapse=collapse)
+        else:
+            hits = search_db(query, lat, lon, limit=limit, collapse=collapse)
+
+        return Response({
+            'query': query,
+            'results': [hit._asdict() for hit in hits],
+        })
+
+    @action(detail=False, methods=['get'])
+    def nearest(self, request):
+        """
+        The k closest stops: GET /api/gtfs/stops/nearest/?lat=12.93&lon=77.62&k=5&departures=3
+
+        Unlike ?dist=&point= on the list endpoint, results are ordered by
+        distance and there is no COUNT or pagination - just k rows from the
+        KNN index.
+
+        Query params:
+        - lat, lon: the point (required)
+        - k: 1-50 (default: 10)
+        - radius: ignore stops further than this many meters (optional)
+        - departures: also return the next 0-5 departures of each stop (default: 0)
+        """
+        from gtfs.utils.nearest_stops import nearest_stops
+
+        try:
+            lat = float(request.query_params['lat'])
+            lon = float(request.query_params['lon'])
+        except KeyError:
+            return Response({"error": "lat and lon are required"}, status=400)
+        except ValueError:
+            return Response({"error": "lat and lon must be numbers"}, status=400)
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            return Response({"error": "lat/lon out of range"}, status=400)
+
+        try:
+            k = int(request.query_params.get('k', 10))
+            departures = int(request.query_params.get('departures', 0))
+            radius = request.query_params.get('radius')
+            radius = float(radius) if radius is not None else None
+        except ValueError:
+            return Response({"error": "k and departures must be integers, radius a number"}, status=400)
+        if not 1 <= k <= self.NEAREST_MAX_K:
+            return Response({"error": f"k must be between 1 and {self.NEAREST_MAX_K}"}, status=400)
+        if not 0 <= departures <= self.NEAREST_MAX_DEPARTURES:
+            return Response({"error": f"departures must be between 0 and {self.NEAREST_MAX_DEPARTURES}"}, status=400)
+        if radius is not None and radius <= 0:
+            return Response({"error": "radius must be positive"}, status=400)
+
+        stops = nearest_stops(lat, lon, k, radius)
+        results = [
+            {
+                'stop_id': stop.stop_id,
+                'name': stop.name,
+                'station': stop.station_id,
+                'side': stop.side,
+                'towards': stop.towards,
+                'lat': stop.lat,
+                'lon': stop.lon,
+                'distance_meters': round(stop.distance, 1),
+            }
+            for stop in stops
+        ]
+
+        if departures and stops:
+            from gtfs.models import Agency
+
+            agency = Agency.objects.first()
+            if not agency:
+                return Response({"error": "No agency configured. Run GTFS ingestion first."}, status=500)
+            next_departures = self._next_departures([stop.stop_id for stop in stops], departures, agency)
+            for result in results:
+                result['departures'] = next_departures.get(result['stop_id'], [])
+
+        return Response({'lat': lat, 'lon': lon, 'stops': results})
+
+    def _next_departures(self, stop_ids, count, agency):
+        """
+        Next `count` scheduled departures from each stop within
+        NEAREST_DEPARTURE_WINDOW, with realtime delays applied.
+
+        Explicit trips come from one query that keeps the first `count` rows
+        per stop (ROW_NUMBER() over the stop); frequency instances are
+        computed from their templates.
+
+        Returns:
+            dict stop_id -> list of departure dicts, soonest first
+        """
+        from django.db.models import F, Window
+        from django.db.models.functions import RowNumber
+        from gtfs.utils.time_helpers import get_current_service_time, seconds_to_actual_datetime
+
+        service_date, current_seconds = get_current_service_time(agency.timezone)
+        window_end = current_seconds + self.NEAREST_DEPARTURE_WINDOW
+
+        templates = self._frequency_templates(stop_ids)
+        template_ids = {trip_id for stop_templates in templates.values() for trip_id in stop_templates}
+        stop_times = StopTime.objects.filter(
+            stop_id__in=stop_ids,
+            departure_seconds__gte=current_seconds,
+            departure_seconds__lte=window_end,
+        ).exclude(
+            trip_id__in=list(template_ids)
+        ).annotate(
+            rank=Window(RowNumber(), partition_by=F('stop_id'), order_by=[F('departure_seconds').asc(), F('trip_id').asc()])
+        ).filter(rank__lte=count).select_related('trip', 'trip__route')
+
+        # stop_id -> [(departure, trip, stop_sequence, arrival, instance start or None)]
+        visits = {}
+        for st in stop_times:
+            visits.setdefault(st.stop_id, []).append(
+                (st.departure_seconds, st.trip, st.stop_sequence, st.arrival_seconds, None)
+            )
+        for stop_id, stop_templates in templates.items():
+            for trip, windows, stop_sequence, arrival_offset, departure_offset in stop_templates.values():
+                for n, start in enumerate(instance_starts(windows, current_seconds, window_end, departure_offset)):
+                    if n == count:
+                        break
+                    visits.setdefault(stop_id, []).append(
+                        (start + departure_offset, trip, stop_sequence, start + arrival_offset, start)
+                    )
+
+        trip_ids = {visit[1].trip_id for stop_visits in visits.values() for visit in stop_visits}
+        active_trips = {at.trip_id: at for at in ActiveTrip.objects.filter(trip_id__in=trip_ids)}
+
+        departures = {}
+        for stop_id, stop_visits in visits.items():
+            stop_visits.sort(key=lambda visit: (visit[0], visit[1].trip_id))
+            for departure_seconds, trip, stop_sequence, arrival_seconds, instance_start in stop_visits[:count]:
+                delay = 0
+                active_trip = active_trips.get(trip.trip_id)
+                if active_trip and active_trip.instance_start != instance_start:
+                    active_trip = None  # tracking another instance of the template
+                if active_trip:
+                    predicted = predicted_arrival_at(active_trip, stop_sequence)
+                    delay = predicted - arrival_seconds if predicted is not None else active_trip.delay_seconds
+                adjusted = departure_seconds + delay
+                departures.setdefault(stop_id, []).append({
+                    'trip_id': trip.trip_id if instance_start is None else instance_trip_id(trip.trip_id, instance_start),
+                    'route_id': trip.route.route_id,
+                    'route_name': trip.route.short_name,
+                    'headed_to': trip.headed_to,
+                    'frequency_based': instance_start is not None,
+                    'departure_timestamp': seconds_to_actual_datetime(service_date, adjusted, agency.timezone).isoformat(),
+                    'seconds_until_departure': adjusted - current_seconds,
+                    'is_realtime': active_trip is not None,
+                    'delay_seconds': delay,
+                })
+        return departures
+
+class RouteViewSet(FeedCachedMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Route.objects.all()
     serializer_class = RouteSerializer
+    pagination_class = RoutePagination
+    feed_cached_actions = ('list', 'retrieve', 'shapes', 'summary')
+
+    @action(detail=True, methods=['get'])
+    def summary(self, request, pk=None):
+        """
+        Route overview: GET /api/gtfs/routes/<id>/summary/
+
+        Service span, trip count and every stop sequence the route runs
+        (most frequent first) with stop names and coordinates. Prebuilt at
+        ingest (build_payloads); rendered on the fly until then.
+        """
+        from django.http import HttpResponse
+        from gtfs.utils.payloads import KIND_ROUTE, encode, prebuilt_payload, route_payloads
+
+        body = prebuilt_payload(KIND_ROUTE, pk)
+        if body is None:
+            payload = next(route_payloads([pk]), None)
+            if payload is None:
+                return Response({"error": f"Unknown route: {pk}"}, status=404)
+            body = encode(payload[1])
+        return HttpResponse(body, content_type='application/json')
+
+    @action(detail=True, methods=['get'])
+    def shapes(self, request, pk=None):
+        """
+        Geometry of every shape the route's trips follow, simplified for a map zoom:
+        GET /api/gtfs/routes/<id>/shapes/?zoom=13
+
+        Query params:
+        - zoom: map zoom level 0-22 (default: 14); picks the precomputed level of detail
+        """
+        route = self.get_object()
+        try:
+            zoom = int(request.query_params.get('zoom', ShapeViewSet.DEFAULT_ZOOM))
+        except ValueError:
+            return Response({"error": "zoom must be an integer"}, status=400)
+        if not 0 <= zoom <= ShapeViewSet.MAX_ZOOM:
+            return Response({"error": f"zoom must be between 0 and {ShapeViewSet.MAX_ZOOM}"}, status=400)
 
-class TripViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = Trip.objects.all()
+        level = level_for_zoom(zoom)
+        shape_ids = Trip.objects.filter(route=route, shape__isnull=False).values('shape_id').distinct()
+        lods = ShapeLOD.objects.filter(shape_id__in=shape_ids, level=level).order_by('shape_id')
+        return Response({
+            'route_id': route.route_id,
+            'zoom': zoom,
+            'level': level,
+            'tolerance_meters': LOD_TOLERANCES[level],
+            'shapes': [
+                {'shape_id': lod.shape_id, 'num_points': lod.num_points, 'polyline': lod.polyline}
+                for lod in lods
+            ],
+        })
+
+class TripViewSet(FeedCachedMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = Trip.objects.select_related('route')
     serializer_class = TripSerializer
+    pagination_class = TripPagination
+    feed_cached_actions = ('list', 'retrieve', 'stop_times')
     filterset_fields = ['route__route_id', 'headed_to']
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'retrieve':
+            # TripDetailSerializer reads stop.name and stop.geom of every stop time
+            queryset = queryset.prefetch_related(
+                Prefetch('stop_times', queryset=StopTime.objects.select_related('stop'))
+            )
+        return queryset
+
     def get_serializer_class(self):
         if self.action == 'retrieve':
             return TripDetailSerializer
         return TripSerializer
+
+    @action(detail=False, methods=['get'], url_path='stop-times')
+    def stop_times(self, request):
+        """
+        Stop times as a streamed download: GET /api/gtfs/trips/stop-times/?route=<route_id>&output=csv
+
+        One row per (trip, stop), ordered by trip and stop_sequence, read
+        through a server-side cursor (gtfs/utils/export.py). Frequency-based
+        trips appear once, as their template.
+
+        Query params:
+        - output: ndjson or csv (default: ndjson)
+        - route, trip: restrict to a route / a trip
+        - from, to: departure window, HH:MM or HH:MM:SS (service-day time, may exceed 24:00)
+        """
+        from gtfs.utils.export import OUTPUTS, streaming_export
+        from gtfs.utils.time_helpers import gtfs_time_to_seconds
+
+        output = request.query_params.get('output', 'ndjson')
+        if output not in OUTPUTS:
+            return Response({"error": f"output must be one of {', '.join(OUTPUTS)}"}, status=400)
+
+        stop_times = StopTime.objects.order_by('trip_id', 'stop_sequence')
+        route_id = request.query_params.get('route')
+        if route_id:
+            stop_times = stop_times.filter(trip__route_id=route_id)
+        trip_id = request.query_params.get('trip')
+        if trip_id:
+            stop_times = stop_times.filter(trip_id=trip_id)
+        for param, lookup in (('from', 'departure_seconds__gte'), ('to', 'departure_seconds__lt')):
+            value = request.query_params.get(param)
+            if not value:
+                continue
+            try:
+                if value.count(':') == 1:
+                    value += ':00'
+                stop_times = stop_times.filter(**{lookup: gtfs_time_to_seconds(value)})
+            except (ValueError, IndexError):
+                return Response({"error": f"{param} must be HH:MM or HH:MM:SS"}, status=400)
+
+        fields = ['trip_id', 'stop_id', 'stop_sequence', 'arrival_seconds', 'departure_seconds']
+        return streaming_export(stop_times, fields, output, f"stop_times-{route_id or trip_id or 'all'}")
+
+    def retrieve(self, request, *args, **kwargs):
+        # Prebuilt at ingest (build_payloads): one key lookup instead of serializing every stop time
+        from django.http import HttpResponse
+        from gtfs.utils.payloads import KIND_TRIP, prebuilt_payload
+
+        body = prebuilt_payload(KIND_TRIP, kwargs['pk'])
+        if body is not None:
+            return HttpResponse(body, content_type='application/json')
+        return super().retrieve(request, *args, **kwargs)
+
+
+class ShapeViewSet(FeedCachedMixin, viewsets.ViewSet):
+    """
+    Shape geometry for the map: GET /api/gtfs/shapes/<shape_id>/?zoom=13
+
+    Serves the precomputed level of detail (build_shape_lods) for the zoom
+    as an encoded polyline - no geometry is loaded or serialized per request.
+
+    Query params:
+    - zoom: map zoom level 0-22 (default: 14)
+    """
+    DEFAULT_ZOOM = 14
+    MAX_ZOOM = 22
+
+    def retrieve(self, request, pk=None):
+        try:
+            zoom = int(request.query_params.get('zoom', self.DEFAULT_ZOOM))
+        except ValueError:
+            return Response({"error": "zoom must be an integer"}, status=400)
+        if not 0 <= zoom <= self.MAX_ZOOM:
+            return Response({"error": f"zoom must be between 0 and {self.MAX_ZOOM}"}, status=400)
+
+        level = level_for_zoom(zoom)
+        lod = ShapeLOD.objects.filter(shape_id=pk, level=level).first()
+        if lod is None:
+            return Response({"error": f"Unknown shape: {pk}"}, status=404)
+
+        return Response({
+            'shape_id': pk,
+            'zoom': zoom,
+            'level': level,
+            'tolerance_meters': lod.tolerance_meters,
+            'num_points': lod.num_points,
+            'polyline': lod.polyline,
+        })
+
+
+@method_decorator(gzip_page, name='dispatch')
+class ChangeViewSet(FeedCachedMixin, viewsets.ViewSet):
+    """
+    Static data changed since a feed version: GET /api/gtfs/changes/?since=<version>
+
+    Lets a client that keeps an offline copy of stops, routes and trips stay
+    current without downloading them again. Per kind the response lists the
+    entity fields once, then the added and updated entities as value arrays
+    and the removed ids (gtfs/utils/feed_diff.py); apply them and remember
+    `version`. Gzipped when the client accepts it.
+
+    Query params:
+    - since: feed version id the client has (0 = none)
+
+    410 Gone when the change sets back to `since` have been pruned - the
+    client has to download everything again.
+    """
+
+    def list(self, request):
+        try:
+            since = int(request.query_params['since'])
+        except KeyError:
+            return Response({"error": "since parameter required"}, status=400)
+        except ValueError:
+            return Response({"error": "since must be an integer"}, status=400)
+
+        current = FeedVersion.current_cached()
+        if current is None:
+            return Response({"error": "No feed ingested yet"}, status=404)
+        if not 0 <= since <= current.id:
+            return Response({"error": f"since must be between 0 and the current version {current.id}"}, status=400)
+
+        oldest = oldest_since(current)
+        if since < oldest:
+            return Response(
+                {"error": f"Changes before version {oldest} are no longer available; download the full data",
+                 "oldest_since": oldest, "version": current.id},
+                status=410
+            )
+
+        return Response({
+            'since': since,
+            'version': current.id,
+            'changes': changes_since(since, current),
+        })
+
+
+class PlanViewSet(viewsets.ViewSet):
+    """
+    Journey planning: GET /api/gtfs/plan/?from=<stop_id>&to=<stop_id>
+    
+    Query params:
+    - from, to: origin and destination stop_ids (required)
+    - time: departure time today, HH:MM or HH:MM:SS (default: now)
+    - max_transfers: 0-8 (default: 4)
+    - realtime: apply current ActiveTrip delays, true/false (default: true)
+    """
+    MAX_TRANSFERS_LIMIT = 8
+    
+    def list(self, request):
+        from gtfs.utils.time_helpers import get_current_service_time, gtfs_time_to_seconds, seconds_to_actual_datetime
+        from gtfs.models import Agency
+        
+        origin = request.query_params.get('from')
+        destination = request.query_params.get('to')
+        if not origin or not destination:
+            return Response({"error": "from and to stop_ids are required"}, status=400)
+        
+        try:
+            max_transfers = int(request.query_params.get('max_transfers', 4))
+        except ValueError:
+            return Response({"error": "max_transfers must be an integer"}, status=400)
+        if not 0 <= max_transfers <= self.MAX_TRANSFERS_LIMIT:
+            return Response({"error": f"max_transfers must be between 0 and {self.MAX_TRANSFERS_LIMIT}"}, status=400)
+        
+        use_realtime = request.query_params.get('realtime', 'true').lower() not in ('false', '0', 'no')
+        
+        agency = Agency.objects.first()
+        timetable = Timetable.current()
+        if not agency or timetable is None:
+            return Response({"error": "No agency configured. Run GTFS ingestion first."}, status=500)
+        
+        service_date, departure_seconds = get_current_service_time(agency.timezone)
+        time_param = request.query_params.get('time')
+        if time_param:
+            try:
+                if time_param.count(':') == 1:
+                    time_param += ':00'
+                departure_seconds = gtfs_time_to_seconds(time_param)
+            except (ValueError, IndexError):
+                return Response({"error": "time must be HH:MM or HH:MM:SS"}, status=400)
+        
+        for stop_id in (origin, destination):
+            if stop_id not in timetable.stop_index:
+                return Response({"error": f"Unknown stop: {stop_id}"}, status=404)
+        
+        delays = None
+        if use_realtime:
+            delays = dict(ActiveTrip.objects.values_list('trip_id', 'delay_seconds'))
+        
+        journeys = Raptor(timetable).plan(
+            origin, destination, departure_seconds, max_transfers=max_transfers, delays=delays
+        )
+        
+        # Names for everything the journeys mention
+        stop_ids = {leg.from_stop for j in journeys for leg in j.legs} | {leg.to_stop for j in journeys for leg in j.legs}
+        stop_names = dict(Stop.objects.filter(stop_id__in=stop_ids).values_list('stop_id', 'name'))
+        route_ids = {leg.route_id for j in journeys for leg in j.legs if leg.route_id}
+        route_names = dict(Route.objects.filter(route_id__in=route_ids).values_list('route_id', 'short_name'))
+        trip_ids = {leg.trip_id for j in journeys for leg in j.legs if leg.trip_id}
+        headsigns = dict(Trip.objects.filter(trip_id__in=trip_ids).values_list('trip_id', 'headed_to'))
+        
+        def timestamp(seconds):
+            return seconds_to_actual_datetime(service_date, seconds, agency.timezone).isoformat()
+        
+        results = []
+        for journey in journeys:
+            legs = []
+            for leg in journey.legs:
+                item = {
+                    'mode': leg.mode,
+                    'from_stop': leg.from_stop,
+                    'from_stop_name': stop_names.get(leg.from_stop),
+                    'to_stop': leg.to_stop,
+                    'to_stop_name': stop_names.get(leg.to_stop),
+                    'departure_timestamp': timestamp(leg.departure),
+                    'arrival_timestamp': timestamp(leg.arrival),
+                    'duration_seconds': leg.arrival - leg.departure,
+                }
+                if leg.mode == 'transit':
+                    item.update({
+                        'trip_id': leg.trip_id,
+                        'route_id': leg.route_id,
+                        'route_name': route_names.get(leg.route_id),
+                        'headed_to': headsigns.get(leg.trip_id),
+                        'num_stops': leg.num_stops,
+                        'is_realtime': bool(delays) and leg.trip_id in delays,
+                    })
+                legs.append(item)
+            
+            results.append({
+                'departure_timestamp': timestamp(journey.departure),
+                'arrival_timestamp': timestamp(journey.arrival),
+                'duration_seconds': journey.arrival - journey.departure,
+                'transfers': journey.transfers,
+                'legs': legs,
+            })
+        
+        return Response({
+            'from': origin,
+            'to': destination,
+            'departure_timestamp': timestamp(departure_seconds),
+            'realtime': use_realtime,
+            'journeys': results,
+        })
+
+
+@require_GET
+def vector_tile(request, z, x, y):
+    """
+    Map tile of stops and route shapes: GET /api/gtfs/tiles/<z>/<x>/<y>.mvt
+
+    Mapbox Vector Tile (layers "stops" and "shapes", see
+    gtfs/utils/vector_tiles.py), cached on disk per feed version and
+    conditional on it like the other static endpoints. A plain Django view:
+    the body is binary protobuf, not something DRF renders.
+    """
+    import gzip
+    from django.http import HttpResponse, JsonResponse
+    from gtfs.models import FeedVersion
+    from gtfs.utils.vector_tiles import cached_tile, valid_tile
+
+    if not valid_tile(z, x, y):
+        return JsonResponse({"error": f"No tile {z}/{x}/{y}"}, status=404)
+
+    def respond():
+        version = FeedVersion.current_cached()
+        if version is None:
+            return JsonResponse({"error": "No feed ingested. Run GTFS ingestion first."}, status=500)
+
+        data = cached_tile(version.id, z, x, y)
+        if 'gzip' in request.headers.get('Accept-Encoding', ''):
+            response = HttpResponse(data, content_type='application/vnd.mapbox-vector-tile')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(gzip.decompress(data), content_type='application/vnd.mapbox-vector-tile')
+        response['Vary'] = 'Accept-Encoding'
+        return response
+
+    return feed_conditional_response(request, respond)
+
+
+BUNDLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+@require_GET
+def bundle_manifest(request):
+    """
+    Offline timetable bundles of the current feed: GET /api/gtfs/bundles/
+
+    The manifest written by build_bundles - every route's and region's
+    bundle with its size - plus `base`, the URL the bundle files are
+    relative to. Conditional on the feed version like the other static
+    endpoints.
+    """
+    import json
+    import os
+    from django.http import JsonResponse
+    from gtfs.models import FeedVersion
+    from gtfs.utils.timetable_bundle import version_directory
+
+    def respond():
+        version = FeedVersion.current_cached()
+        if version is None:
+            return JsonResponse({"error": "No feed ingested. Run GTFS ingestion first."}, status=500)
+        path = os.path.join(version_directory(version.id), 'manifest.json')
+        if not os.path.exists(path):
+            return JsonResponse({"error": "Bundles not built yet. Run build_bundles."}, status=404)
+        with open(path, 'rb') as f:
+            manifest = json.loads(f.read())
+        manifest['base'] = request.build_absolute_uri(f'v{version.id}/')
+        return JsonResponse(manifest)
+
+    return feed_conditional_response(request, respond)
+
+
+@require_GET
+def timetable_bundle(request, version, path):
+    """
+    One bundle file: GET /api/gtfs/bundles/v<version>/<path>
+
+    Binary format in gtfs/utils/timetable_bundle.py. The URL includes the
+    feed version, so the file never changes and may be cached forever; a
+    pruned version is a 404 and the client fetches the manifest again.
+    """
+    from django.views.static import serve
+    from gtfs.utils.timetable_bundle import version_directory
+
+    response = serve(request, path, document_root=version_directory(version))
+    response['Cache-Control'] = BUNDLE_CACHE_CONTROL
+    if path.endswith('.sctb'):
+        response['Content-Type'] = 'application/octet-stream'
+    return response
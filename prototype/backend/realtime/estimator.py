@@ -0,0 +1,254 @@
+"""
+Delay Estimation
+
+A small Kalman filter per active trip over the state [delay, delay rate]:
+- delay: seconds behind schedule (positive = late)
+- delay rate: how fast the delay is growing (seconds per second); a bus stuck
+  in traffic has a positive rate, one catching up a negative rate
+
+Between observations the state is propagated with a constant-rate model whose
+uncertainty grows with elapsed time (white-noise acceleration). Each
+observation is a noisy measurement of the delay; how noisy depends on its
+type (a reported arrival is much sharper than a heartbeat) and on how far it
+was from the trip's shape.
+
+Robustness:
+- Observations whose innovation is implausible (Mahalanobis gate) are
+  rejected instead of dragging the estimate around. If GATE_RESET_AFTER
+  consecutive observations disagree, the filter resets to them - the bus
+  really did change.
+- WAITING / NO_SHOW at a stop only say the bus has not arrived yet, i.e. a
+  lower bound on the delay. They are applied only when the estimate is below
+  that bound.
+
+The variance of the delay replaces the old "observations in the last 15 min / 5"
+confidence: confidence = 1 / (1 + (std / CONFIDENCE_STD)^2).
+
+State lives in process memory (one dict, O(1) per observation). A process
+that has not seen a trip yet, or whose filter is older than the ActiveTrip
+row (another process has observed the trip since), seeds it from the row,
+which stores the last estimate, its uncertainty and the time it is for.
+"""
+
+import math
+import threading
+from collections import namedtuple
+
+# Measurement noise (std, seconds) per observation type, and whether the
+# measurement is exact or only a lower bound. Types not listed carry no delay information.
+MeasurementModel = namedtuple('MeasurementModel', ['std', 'lower_bound'])
+
+MEASUREMENT_MODELS = {
+    'ARRIVED': MeasurementModel(std=30.0, lower_bound=False),
+    'PASSED': MeasurementModel(std=45.0, lower_bound=False),
+    'ON_BUS': MeasurementModel(std=60.0, lower_bound=False),
+    'HEARTBEAT': MeasurementModel(std=90.0, lower_bound=False),
+    'MATCHED': MeasurementModel(std=120.0, lower_bound=False),  # delay implied by implicit trip matching
+    'WAITING': MeasurementModel(std=60.0, lower_bound=True),
+    'NO_SHOW': MeasurementModel(std=60.0, lower_bound=True),
+}
+
+DelayEstimate = namedtuple('DelayEstimate', [
+    'delay_seconds',      # Estimated current delay
+    'rate',               # Estimated delay rate (s/s)
+    'std_seconds',        # Standard deviation of the delay estimate
+    'confidence',         # 0.0 to 1.0, derived from std_seconds
+    'accepted',           # Whether the last observation was used
+    'updated_at',         # Epoch seconds the estimate is for
+])
+
+
+class DelayFilter:
+    """
+    Kalman filter for one trip. Plain floats, no numpy: a 2x2 covariance
+    is cheaper to spell out than to allocate.
+    """
+
+    INITIAL_STD = 300.0          # seconds; prior on a trip nobody has reported yet
+    INITIAL_RATE_STD = 0.05      # s/s; +-3 min drift per hour
+    ACCELERATION_STD = 0.002     # s/s^2 of delay-rate random walk
+    MAX_RATE = 0.5               # rates beyond this are not physical for a bus
+    DEVIATION_SPEED = 5.0        # m/s; converts distance from the shape into seconds of noise
+    GATE = 16.0                  # squared Mahalanobis distance (4 sigma)
+    GATE_RESET_AFTER = 3
+
+    __slots__ = ('delay', 'rate', 'p00', 'p01', 'p11', 'updated_at', 'rejected')
+
+    def __init__(self, delay=0.0, updated_at=0.0, std=None, rate=0.0):
+        std = self.INITIAL_STD if std is None else std
+        self.delay = float(delay)
+        self.rate = float(rate)
+        self.p00 = std * std
+        self.p01 = 0.0
+        self.p11 = self.INITIAL_RATE_STD * self.INITIAL_RATE_STD
+        self.updated_at = float(updated_at)
+        self.rejected = 0
+
+    def predict(self, t):
+        """Propagate the state to time t (epoch seconds). Never goes back in time."""
+        dt = t - self.updated_at
+        if dt <= 0:
+            return
+        q = self.ACCELERATION_STD * self.ACCELERATION_STD
+        dt2 = dt * dt
+
+        self.delay += self.rate * dt
+        # P = F P F^T + Q, F = [[1, dt], [0, 1]], Q = q [[dt^3/3, dt^2/2], [dt^2/2, dt]]
+        self.p00 += 2.0 * dt * self.p01 + dt2 * self.p11 + q * dt2 * dt / 3.0
+        self.p01 += dt * self.p11 + q * dt2 / 2.0
+        self.p11 += q * dt
+        self.updated_at = t
+
+    def state_at(self, t):
+        """(delay, std) extrapolated to time t, without changing the filter."""
+        dt = max(0.0, t - self.updated_at)
+        q = self.ACCELERATION_STD * self.ACCELERATION_STD
+        p00 = self.p00 + 2.0 * dt * self.p01 + dt * dt * self.p11 + q * dt ** 3 / 3.0
+        return self.delay + self.rate * dt, math.sqrt(p00)
+
+    def update(self, t, measured_delay, obs_type, distance_meters=None):
+        """
+        Fold one observation into the estimate.
+
+        Args:
+            t: Observation time (epoch seconds)
+            measured_delay: Delay computed from the observation (seconds)
+            obs_type: Observation type (key of MEASUREMENT_MODELS)
+            distance_meters: Distance from the trip's shape, if known
+
+        Returns:
+            True if the observation changed the estimate
+        """
+        model = MEASUREMENT_MODELS.get(obs_type)
+        if model is None:
+            return False
+
+        self.predict(t)
+
+        if model.lower_bound and self.delay >= measured_delay:
+            return False  # Consistent with what we already believe
+
+        r = model.std * model.std
+        if distance_meters:
+            r += (distance_meters / self.DEVIATION_SPEED) ** 2
+
+        innovation = measured_delay - self.delay
+        s = self.p00 + r
+
+        if innovation * innovation / s > self.GATE:
+            self.rejected += 1
+            if self.rejected < self.GATE_RESET_AFTER:
+                return False
+            # The bus really did change: restart from this observation
+            self.delay = float(measured_delay)
+            self.rate = 0.0
+            self.p00 = r
+            self.p01 = 0.0
+            self.p11 = self.INITIAL_RATE_STD * self.INITIAL_RATE_STD
+            self.rejected = 0
+            return True
+
+        self.rejected = 0
+        k0 = self.p00 / s
+        k1 = self.p01 / s
+        self.delay += k0 * innovation
+        self.rate = max(-self.MAX_RATE, min(self.MAX_RATE, self.rate + k1 * innovation))
+        # P = (I - K H) P
+        p00, p01 = self.p00, self.p01
+        self.p00 = (1.0 - k0) * p00
+        self.p01 = (1.0 - k0) * p01
+        self.p11 -= k1 * p01
+        return True
+
+
+class DelayEstimator:
+    """
+    Registry of per-trip filters for this process.
+    """
+
+    CONFIDENCE_STD = 120.0       # std at which confidence is 0.5
+    EXPIRE_SECONDS = 4 * 3600    # forget trips not observed for this long
+    SWEEP_EVERY = 1000           # updates between expiry sweeps
+
+    def __init__(self):
+        self._filters = {}
+        self._lock = threading.Lock()
+        self._updates = 0
+
+    @classmethod
+    def confidence(cls, std):
+        return 1.0 / (1.0 + (std / cls.CONFIDENCE_STD) ** 2)
+
+    def observe(self, trip_id, t, measured_delay, obs_type, distance_meters=None, seed=None):
+        """
+        Update a trip's estimate with one observation.
+
+        Args:
+            trip_id: GTFS trip_id
+            t: Observation time (epoch seconds)
+            measured_delay: Delay implied by the observation, or None if the
+                            observation carries no delay (the estimate is
+                            still propagated to t)
+            obs_type: Observation type (key of MEASUREMENT_MODELS)
+            distance_meters: Distance from the trip's shape, if known
+            seed: Optional (delay, std, rate, time) from the ActiveTrip row, used
+                  when this process has no filter for the trip yet or its
+                  filter is older than `time`
+
+        Returns:
+            DelayEstimate
+        """
+        with self._lock:
+            f = self._filters.get(trip_id)
+            if seed is not None and seed[1] is not None and (f is None or seed[3] > f.updated_at):
+                # Another process may have folded in newer observations: take its state
+                delay, std, rate, seeded_at = seed
+                f = self._filters[trip_id] = DelayFilter(delay, seeded_at, std=std, rate=rate or 0.0)
+            elif f is None:
+                # Prior: on schedule, +-INITIAL_STD. The first observation is
+                # gated against it like any other, so a wild first report
+                # does not become the starting point.
+                f = self._filters[trip_id] = DelayFilter(0.0, t)
+
+            if measured_delay is None:
+                f.predict(t)
+                accepted = False
+            else:
+                accepted = f.update(t, measured_delay, obs_type, distance_meters)
+
+            self._updates += 1
+            if self._updates % self.SWEEP_EVERY == 0:
+                self._expire(t)
+
+            std = math.sqrt(f.p00)
+            return DelayEstimate(
+                delay_seconds=int(round(f.delay)),
+                rate=f.rate,
+                std_seconds=std,
+                confidence=self.confidence(std),
+                accepted=accepted,
+                updated_at=f.updated_at,
+            )
+
+    def estimate(self, trip_id, t):
+        """Current (delay, std) of a trip extrapolated to t, or None if unknown."""
+        f = self._filters.get(trip_id)
+        if f is None:
+            return None
+        return f.state_at(t)
+
+    def forget(self, trip_id):
+        with self._lock:
+            self._filters.pop(trip_id, None)
+
+    def _expire(self, now):
+        cutoff = now - self.EXPIRE_SECONDS
+        for trip_id in [tid for tid, f in self._filters.items() if f.updated_at < cutoff]:
+            del self._filters[trip_id]
+
+    def __len__(self):
+        return len(self._filters)
+
+
+# Process-wide registry used by the observation endpoint
+delay_estimator = DelayEstimator()
@@ -8,15 +8,16 @@ This command:
 Designed to run as a cron job every 5 minutes.
 """
 
-from django.core.management.base import BaseCommand
+from config.metrics import InstrumentedCommand
 from django.utils import timezone as django_timezone
-from gtfs.models import Trip, StopTime, Agency
-from gtfs.utils.time_helpers import get_current_service_time, seconds_to_actual_datetime
+from gtfs.models import Trip, Agency
+from gtfs.utils.frequencies import instance_starts, last_instance_start, load_frequencies
+from gtfs.utils.time_helpers import get_current_service_time, seconds_to_actual_datetime, seconds_to_gtfs_time
 from realtime.models import ActiveTrip
 import datetime
 
 
-class Command(BaseCommand):
+class Command(InstrumentedCommand):
     help = 'Activate upcoming trips and clean up expired ActiveTrips'
 
     def add_arguments(self, parser):
@@ -84,41 +85,46 @@ class Command(BaseCommand):
 
         self.stdout.write(f'\n--- Activating trips starting between {start_window}s and {end_window}s ---')
 
-        # Find all trips with first stop in the activation window
-        # We look at the first stop_time for each trip (stop_sequence=1 or min sequence)
-        trips_to_activate = []
+        # Find all trips whose first departure (Trip.start_seconds) is in the activation window
+        trips_to_activate = []  # (trip, departure seconds, instance start or None)
         
-        for trip in Trip.objects.select_related('route').prefetch_related('stop_times'):
-            # Get first stop time
-            first_stop_time = trip.stop_times.order_by('stop_sequence').first()
-            
-            if not first_stop_time:
-                continue  # No stops for this trip
-            
-            departure_seconds = first_stop_time.departure_seconds
-            
-            # Check if departure is within activation window
-            if start_window <= departure_seconds <= end_window:
-                # Check if already activated
-                if not hasattr(trip, 'active_trip') or trip.active_trip is None:
-                    trips_to_activate.append((trip, first_stop_time))
+        for trip in Trip.objects.select_related('route').filter(
+            start_seconds__gte=start_window,
+            start_seconds__lte=end_window,
+            frequencies__isnull=True,
+        ):
+            # Check if already activated
+            if not hasattr(trip, 'active_trip') or trip.active_trip is None:
+                trips_to_activate.append((trip, trip.start_seconds, None))
+        
+        # Frequency-based trips: one ActiveTrip per template, activated for
+        # its next instance departing in the window (instances expanded for the window only)
+        frequencies = load_frequencies()
+        for trip in Trip.objects.select_related('route').filter(
+            trip_id__in=list(frequencies),
+            active_trip__isnull=True,
+        ):
+            departure_seconds = next(instance_starts(frequencies[trip.trip_id], start_window, end_window), None)
+            if departure_seconds is not None:
+                trips_to_activate.append((trip, departure_seconds, departure_seconds))
 
         self.stdout.write(f'Found {len(trips_to_activate)} trips to activate')
 
         activated_count = 0
-        for trip, first_stop_time in trips_to_activate:
+        for trip, departure_seconds, instance_start in trips_to_activate:
             if dry_run:
-                self.stdout.write(f'  [DRY RUN] Would activate: {trip.trip_id} ({trip.route.short_name}) departing at {first_stop_time.departure_time_str}')
+                self.stdout.write(f'  [DRY RUN] Would activate: {trip.trip_id} ({trip.route.short_name}) departing at {seconds_to_gtfs_time(departure_seconds)}')
             else:
                 try:
                     ActiveTrip.objects.create(
                         trip=trip,
                         delay_seconds=0,
-                        confidence_score=0.0
+                        confidence_score=0.0,
+                        instance_start=instance_start,
                     )
                     activated_count += 1
                     self.stdout.write(self.style.SUCCESS(
-                        f'  ✓ Activated: {trip.trip_id} ({trip.route.short_name}) departing at {first_stop_time.departure_time_str}'
+                        f'  ✓ Activated: {trip.trip_id} ({trip.route.short_name}) departing at {seconds_to_gtfs_time(departure_seconds)}'
                     ))
                 except Exception as e:
                     self.stdout.write(self.style.ERROR(f'  ✗ Failed to activate {trip.trip_id}: {e}'))
@@ -134,32 +140,41 @@ class Command(BaseCommand):
 
         trips_to_cleanup = []
         
-        for active_trip in ActiveTrip.objects.select_related('trip').prefetch_related('trip__stop_times'):
-            # Get last stop time for this trip
-            last_stop_time = active_trip.trip.stop_times.order_by('-stop_sequence').first()
-            
-            if not last_stop_time:
+        frequencies = load_frequencies()
+        for active_trip in ActiveTrip.objects.select_related('trip__timing'):
+            # Arrival at the last stop: trip start + last offset of its timing
+            trip = active_trip.trip
+            if trip.timing is None or trip.start_seconds is None:
                 continue
             
-            arrival_seconds = last_stop_time.arrival_seconds
+            start_seconds = trip.start_seconds
+            if active_trip.instance_start is not None:
+                start_seconds = active_trip.instance_start
+            elif trip.trip_id in frequencies:
+                # Not following an instance: the latest that has departed; none yet means it was activated ahead
+                start_seconds = last_instance_start(frequencies[trip.trip_id], current_seconds)
+                if start_seconds is None:
+                    continue
+            
+            arrival_seconds = start_seconds + trip.timing.arrival_offsets[-1]
             
             # Check if trip has ended (including grace period)
             if arrival_seconds < cleanup_threshold_seconds:
-                trips_to_cleanup.append((active_trip, last_stop_time))
+                trips_to_cleanup.append((active_trip, arrival_seconds))
 
         self.stdout.write(f'Found {len(trips_to_cleanup)} trips to clean up')
 
         cleaned_count = 0
-        for active_trip, last_stop_time in trips_to_cleanup:
+        for active_trip, arrival_seconds in trips_to_cleanup:
             if dry_run:
-                self.stdout.write(f'  [DRY RUN] Would delete: {active_trip.trip.trip_id} (arrived at {last_stop_time.arrival_time_str})')
+                self.stdout.write(f'  [DRY RUN] Would delete: {active_trip.trip.trip_id} (arrived at {seconds_to_gtfs_time(arrival_seconds)})')
             else:
                 try:
                     trip_id = active_trip.trip.trip_id
                     active_trip.delete()
                     cleaned_count += 1
                     self.stdout.write(self.style.SUCCESS(
-                        f'  ✓ Cleaned up: {trip_id} (arrived at {last_stop_time.arrival_time_str})'
+                        f'  ✓ Cleaned up: {trip_id} (arrived at {seconds_to_gtfs_time(arrival_seconds)})'
                     ))
                 except Exception as e:
                     self.stdout.write(self.style.ERROR(f'  ✗ Failed to delete {active_trip.trip.trip_id}: {e}'))
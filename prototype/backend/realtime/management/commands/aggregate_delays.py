@@ -5,23 +5,34 @@ This command:
 1. Processes observations from a specific date (default: yesterday)
 2. Calculates average delay per trip
 3. Stores results in TripDelayHistory for pattern analysis
+4. Refreshes the RouteDelaySummary rollup for that date
+5. Merges stop-to-stop travel times from consecutive arrivals of the same
+   trip into SegmentTravelTime
 
 Designed to run daily as a cron job.
 """
 
-from django.core.management.base import BaseCommand
+from config.metrics import InstrumentedCommand
 from django.utils import timezone as django_timezone
 from django.db.models import Avg, Count
 from gtfs.models import Trip, Agency
+from gtfs.utils.patterns import load_schedules
 from gtfs.utils.time_helpers import get_current_service_time, datetime_to_service_seconds
 from evidence.models import Observation
-from realtime.models import TripDelayHistory, ActiveTrip
+from realtime.models import TripDelayHistory, ActiveTrip, RouteDelaySummary, SegmentTravelTime, segment_time_bucket
+from collections import defaultdict
 import datetime
+import statistics
 
 
-class Command(BaseCommand):
+class Command(InstrumentedCommand):
     help = 'Aggregate observations into daily delay history for pattern detection'
 
+    # Observation types that timestamp the bus at a stop
+    AT_STOP_TYPES = [Observation.ObservationType.BUS_ARRIVED, Observation.ObservationType.BUS_PASSED]
+    # Longest run of segments one pair of observations is spread over
+    MAX_SEGMENT_SPAN = 5
+
     def add_arguments(self, parser):
         parser.add_argument(
             '--date',
@@ -128,11 +139,76 @@ class Command(BaseCommand):
                         f'  ↻ Updated: {trip_id} - avg_delay={avg_delay}s ({num_obs} obs)'
                     ))
         
+        # Refresh the per-route rollup used by /active-trips/patterns/
+        summary_count = 0
+        if not dry_run:
+            summary_count = RouteDelaySummary.refresh(target_date)
+        
+        # Stop-to-stop travel times
+        segment_samples = self._collect_segment_samples(observations, agency, target_date)
+        segment_count = 0
+        if dry_run:
+            self.stdout.write(f'  [DRY RUN] {len(segment_samples)} segments with travel time samples')
+        else:
+            segment_count = SegmentTravelTime.accumulate(target_date, segment_samples)
+        
         # Summary
         self.stdout.write(self.style.SUCCESS(
-            f'\nSummary: Created {created_count}, Updated {updated_count} delay history records'
+            f'\nSummary: Created {created_count}, Updated {updated_count} delay history records, '
+            f'refreshed {summary_count} route summaries, updated {segment_count} segment travel times'
         ))
     
+    def _collect_segment_samples(self, observations, agency, target_date):
+        """
+        Travel time samples from consecutive at-stop observations of the same trip.
+        
+        Reports of the same trip at the same stop are collapsed to their median
+        time. A pair of stops a few segments apart is spread over the segments
+        in proportion to their scheduled times.
+        
+        Returns:
+            dict (from_stop_id, to_stop_id) -> dict hour-of-week bucket -> list of seconds
+        """
+        weekday = target_date.weekday()
+        
+        # trip -> stop -> observed service seconds
+        arrivals = defaultdict(lambda: defaultdict(list))
+        for trip_id, stop_id, timestamp in observations.filter(
+            type__in=self.AT_STOP_TYPES,
+            stop__isnull=False,
+        ).values_list('trip_id', 'stop_id', 'timestamp'):
+            arrivals[trip_id][stop_id].append(datetime_to_service_seconds(timestamp, agency.timezone)[1])
+        
+        schedules = defaultdict(list)
+        for trip in load_schedules(trip_ids=arrivals):
+            schedules[trip.trip_id] = list(zip(trip.stop_ids, trip.arrivals))
+        
+        samples = defaultdict(lambda: defaultdict(list))
+        for trip_id, by_stop in arrivals.items():
+            schedule = schedules[trip_id]
+            observed = [
+                (i, statistics.median(by_stop[stop_id]))
+                for i, (stop_id, _) in enumerate(schedule)
+                if stop_id in by_stop
+            ]
+            
+            for (i, t_i), (j, t_j) in zip(observed, observed[1:]):
+                scheduled_total = schedule[j][1] - schedule[i][1]
+                observed_total = t_j - t_i
+                if j - i > self.MAX_SEGMENT_SPAN or scheduled_total <= 0:
+                    continue
+                if not 0 < observed_total <= 3 * scheduled_total + 600:
+                    continue  # Out of order or implausible reports
+                
+                t = t_i
+                for k in range(i, j):
+                    seconds = observed_total * (schedule[k + 1][1] - schedule[k][1]) / scheduled_total
+                    bucket = segment_time_bucket(weekday, int(t))
+                    samples[(schedule[k][0], schedule[k + 1][0])][bucket].append(seconds)
+                    t += seconds
+        
+        return samples
+    
     def _calculate_delay(self, observation, agency):
         """
         Calculate delay for an observation.
@@ -0,0 +1,303 @@
+"""
+Management command to export observations and delay history to Parquet.
+
+This command:
+1. Picks the service dates that have not been exported yet (or the ones given)
+2. Streams each day's Observation and TripDelayHistory rows from a server-side
+   cursor, denormalizing trip/route/stop attributes into every row
+3. Writes one Parquet file per dataset per service date, hive-partitioned:
+       <output-dir>/observations/service_date=YYYY-MM-DD/part-0.parquet
+       <output-dir>/delay_history/service_date=YYYY-MM-DD/part-0.parquet
+
+Memory stays bounded by --chunk-size rows per dataset. Analysts read the files
+off-box (see data_tools/backend/analytics_loader.py) instead of querying production.
+
+Designed to run daily after aggregate_delays.
+"""
+
+import datetime
+import os
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytz
+from django.conf import settings
+from config.metrics import InstrumentedCommand
+from django.db.models import Min
+from evidence.models import Observation
+from gtfs.models import Agency, Stop
+from gtfs.utils.time_helpers import datetime_to_service_seconds
+from realtime.models import TripDelayHistory
+
+
+OBSERVATION_SCHEMA = pa.schema([
+    ('id', pa.int64()),
+    ('timestamp', pa.timestamp('us', tz='UTC')),
+    ('service_seconds', pa.int32()),
+    ('user_id', pa.string()),
+    ('type', pa.string()),
+    ('trip_id', pa.string()),
+    ('route_id', pa.string()),
+    ('route_short_name', pa.string()),
+    ('headed_to', pa.string()),
+    ('shape_id', pa.string()),
+    ('stop_id', pa.string()),
+    ('stop_name', pa.string()),
+    ('stop_lat', pa.float64()),
+    ('stop_lon', pa.float64()),
+    ('lat', pa.float64()),
+    ('lon', pa.float64()),
+    ('distance_from_trip', pa.float64()),
+    ('is_deviation', pa.bool_()),
+    ('match_score', pa.float64()),
+    ('notes', pa.string()),
+])
+
+DELAY_HISTORY_SCHEMA = pa.schema([
+    ('trip_id', pa.string()),
+    ('route_id', pa.string()),
+    ('route_short_name', pa.string()),
+    ('headed_to', pa.string()),
+    ('service_id', pa.string()),
+    ('avg_delay_seconds', pa.int32()),
+    ('num_observations', pa.int32()),
+])
+
+
+class Command(InstrumentedCommand):
+    help = 'Export observations and delay history to per-service-date Parquet files'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output-dir',
+            type=str,
+            default=str(settings.ANALYTICS_EXPORT_DIR),
+            help='Root directory of the Parquet datasets (default: settings.ANALYTICS_EXPORT_DIR)'
+        )
+        parser.add_argument(
+            '--date',
+            type=str,
+            help='Export a single service date (YYYY-MM-DD format)'
+        )
+        parser.add_argument(
+            '--since',
+            type=str,
+            help='First service date to consider (YYYY-MM-DD format, default: day after the last export)'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Re-export dates that already have files'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=10000,
+            help='Rows fetched and written per batch (default: 10000)'
+        )
+
+    def handle(self, *args, **options):
+        output_dir = options['output_dir']
+        force = options['force']
+        chunk_size = options['chunk_size']
+
+        agency = Agency.objects.first()
+        if not agency:
+            self.stdout.write(self.style.ERROR('No agency found. Run ingest_gtfs first.'))
+            return
+
+        tz = pytz.timezone(agency.timezone)
+
+        # Stop attributes are small: load once, join in Python
+        stops = {
+            stop_id: (name, geom.y, geom.x)
+            for stop_id, name, geom in Stop.objects.values_list('stop_id', 'name', 'geom')
+        }
+
+        exporters = {
+            'observations': lambda path, service_date: self._export_observations(
+                path, service_date, tz, agency, stops, chunk_size
+            ),
+            'delay_history': lambda path, service_date: self._export_delay_history(
+                path, service_date, chunk_size
+            ),
+        }
+
+        exported = {dataset: 0 for dataset in exporters}
+        skipped = 0
+
+        for dataset, export in exporters.items():
+            self.stdout.write(f'\n--- Exporting {dataset} ---')
+
+            for service_date in self._dates_to_export(output_dir, dataset, agency, options):
+                path = self._partition_path(output_dir, dataset, service_date)
+                if os.path.exists(path) and not force:
+                    skipped += 1
+                    continue
+
+                num_rows = export(path, service_date)
+                if num_rows:
+                    exported[dataset] += 1
+                    self.stdout.write(self.style.SUCCESS(f'  ✓ {service_date}: {num_rows} rows'))
+
+        # Summary
+        self.stdout.write(self.style.SUCCESS(
+            f"\nSummary: Exported {exported['observations']} observation days, "
+            f"{exported['delay_history']} delay history days, skipped {skipped} existing files"
+        ))
+
+    def _dates_to_export(self, output_dir, dataset, agency, options):
+        """
+        Service dates to export for one dataset.
+
+        Default is incremental: from the day after the last exported partition
+        (or the oldest data) up to yesterday.
+        """
+        if options['date']:
+            return [datetime.datetime.strptime(options['date'], '%Y-%m-%d').date()]
+
+        if options['since']:
+            start = datetime.datetime.strptime(options['since'], '%Y-%m-%d').date()
+        else:
+            last = self._last_exported_date(output_dir, dataset)
+            start = last + datetime.timedelta(days=1) if last else self._oldest_service_date(agency)
+
+        if start is None:
+            return []
+
+        yesterday = datetime.date.today() - datetime.timedelta(days=1)
+        return [start + datetime.timedelta(days=i) for i in range((yesterday - start).days + 1)]
+
+    def _last_exported_date(self, output_dir, dataset):
+        dataset_dir = os.path.join(output_dir, dataset)
+        if not os.path.isdir(dataset_dir):
+            return None
+
+        dates = [
+            datetime.datetime.strptime(name.split('=', 1)[1], '%Y-%m-%d').date()
+            for name in os.listdir(dataset_dir)
+            if name.startswith('service_date=')
+        ]
+        return max(dates) if dates else None
+
+    def _oldest_service_date(self, agency):
+        """Earliest service date present in either source table."""
+        candidates = []
+
+        oldest_obs = Observation.objects.aggregate(oldest=Min('timestamp'))['oldest']
+        if oldest_obs:
+            candidates.append(datetime_to_service_seconds(oldest_obs, agency.timezone)[0])
+
+        oldest_history = TripDelayHistory.objects.aggregate(oldest=Min('date'))['oldest']
+        if oldest_history:
+            candidates.append(oldest_history)
+
+        return min(candidates) if candidates else None
+
+    def _partition_path(self, output_dir, dataset, service_date):
+        return os.path.join(output_dir, dataset, f'service_date={service_date.isoformat()}', 'part-0.parquet')
+
+    def _write_batches(self, path, schema, rows, chunk_size):
+        """
+        Stream row dicts into a Parquet file in batches of `chunk_size`.
+
+        Writes to a temporary file and renames it into place, so readers never
+        see a half-written partition. Nothing is written for an empty day.
+
+        Returns:
+            Number of rows written
+        """
+        names = schema.names
+        columns = {name: [] for name in names}
+        writer = None
+        # Dot-prefixed so dataset readers ignore it while it is being written
+        tmp_path = os.path.join(os.path.dirname(path), '.' + os.path.basename(path) + '.tmp')
+        num_rows = 0
+
+        def flush():
+            nonlocal writer
+            if writer is None:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                writer = pq.ParquetWriter(tmp_path, schema, compression='zstd')
+            writer.write_batch(pa.RecordBatch.from_pydict(columns, schema=schema))
+            for values in columns.values():
+                values.clear()
+
+        try:
+            for row in rows:
+                for name in names:
+                    columns[name].append(row[name])
+                num_rows += 1
+                if num_rows % chunk_size == 0:
+                    flush()
+            if num_rows % chunk_size:
+                flush()
+        finally:
+            if writer is not None:
+                writer.close()
+
+        if writer is not None:
+            os.replace(tmp_path, path)
+        return num_rows
+
+    def _export_observations(self, path, service_date, tz, agency, stops, chunk_size):
+        # Service day runs 3 AM to 3 AM local time
+        start_dt = tz.localize(datetime.datetime.combine(service_date, datetime.time(3, 0))).astimezone(pytz.UTC)
+        end_dt = start_dt + datetime.timedelta(days=1)
+
+        queryset = Observation.objects.filter(
+            timestamp__gte=start_dt,
+            timestamp__lt=end_dt,
+        ).order_by('timestamp', 'id').values(
+            'id', 'timestamp', 'user_id', 'type', 'trip_id', 'stop_id',
+            'lat', 'lon', 'distance_from_trip', 'is_deviation', 'match_score', 'notes',
+            'trip__route_id', 'trip__route__short_name', 'trip__headed_to', 'trip__shape_id',
+        )
+
+        def rows():
+            for obs in queryset.iterator(chunk_size=chunk_size):
+                stop_name, stop_lat, stop_lon = stops.get(obs['stop_id'], (None, None, None))
+                yield {
+                    'id': obs['id'],
+                    'timestamp': obs['timestamp'],
+                    'service_seconds': datetime_to_service_seconds(obs['timestamp'], agency.timezone)[1],
+                    'user_id': obs['user_id'],
+                    'type': obs['type'],
+                    'trip_id': obs['trip_id'],
+                    'route_id': obs['trip__route_id'],
+                    'route_short_name': obs['trip__route__short_name'],
+                    'headed_to': obs['trip__headed_to'],
+                    'shape_id': obs['trip__shape_id'],
+                    'stop_id': obs['stop_id'],
+                    'stop_name': stop_name,
+                    'stop_lat': stop_lat,
+                    'stop_lon': stop_lon,
+                    'lat': obs['lat'],
+                    'lon': obs['lon'],
+                    'distance_from_trip': obs['distance_from_trip'],
+                    'is_deviation': obs['is_deviation'],
+                    'match_score': obs['match_score'],
+                    'notes': obs['notes'],
+                }
+
+        return self._write_batches(path, OBSERVATION_SCHEMA, rows(), chunk_size)
+
+    def _export_delay_history(self, path, service_date, chunk_size):
+        queryset = TripDelayHistory.objects.filter(date=service_date).order_by('trip_id').values(
+            'trip_id', 'avg_delay_seconds', 'num_observations',
+            'trip__route_id', 'trip__route__short_name', 'trip__headed_to', 'trip__service_id',
+        )
+
+        def rows():
+            for record in queryset.iterator(chunk_size=chunk_size):
+                yield {
+                    'trip_id': record['trip_id'],
+                    'route_id': record['trip__route_id'],
+                    'route_short_name': record['trip__route__short_name'],
+                    'headed_to': record['trip__headed_to'],
+                    'service_id': record['trip__service_id'],
+                    'avg_delay_seconds': record['avg_delay_seconds'],
+                    'num_observations': record['num_observations'],
+                }
+
+        return self._write_batches(path, DELAY_HISTORY_SCHEMA, rows(), chunk_size)
@@ -0,0 +1,396 @@
+"""
+Implicit Trip Matching
+
+Guesses which trip an observation is about when the user did not say
+(Scenario B in llm_docs/deviation_design.md).
+
+Given (lat, lon, service seconds):
+1. A grid index over shape segments finds the paths (shapes) within
+   SEARCH_RADIUS of the point, and how far along each path the point is.
+2. For every trip on those paths that could be running now (bisect on trip
+   start times), the schedule is interpolated at that along-path distance
+   using the trip's stop_time arrays, giving the delay the trip would have
+   if the user were on it. Frequency-based trips are kept as templates and
+   only the instances that could be running are computed, per match.
+3. Each candidate is scored by distance from the path and by how plausible
+   that delay is; the best candidate is returned.
+4. If an earlier fix from the same user is given, the candidate must also
+   explain it with a consistent delay (this is what tells the direction).
+
+Everything is in memory and built once per feed version, so a match costs a
+few grid cells and a handful of interpolations - well under a few milliseconds.
+"""
+
+import bisect
+import itertools
+import math
+import threading
+from array import array
+from collections import namedtuple
+
+from gtfs.utils.frequencies import InstanceStarts
+from gtfs.utils.spatial_index import GridIndex, LocalProjection, point_segment_projection
+
+MatchResult = namedtuple('MatchResult', [
+    'trip_id',          # Best matching trip
+    'score',            # Likelihood score in (0, 1]
+    'probability',      # Share of the total score of all candidates
+    'distance_meters',  # Distance from the trip's path
+    'delay_seconds',    # Delay implied by the match (positive = late)
+    'start_seconds',    # Scheduled first departure of the matched trip (of the instance, if frequency-based)
+])
+
+
+class TripMatcher:
+    SEGMENT_CELL_SIZE = 250.0   # meters
+    SEARCH_RADIUS = 150.0       # meters; GPS noise plus road width
+    DISTANCE_SIGMA = 50.0       # meters
+    DELAY_SIGMA = 300.0         # seconds; prior on the delay of a trip nobody has reported
+    FIX_DELAY_SIGMA = 120.0     # seconds; error of the delay read off one fix (estimator's MATCHED)
+    MAX_EARLY = 600             # a bus may run up to 10 min ahead of schedule
+    MAX_LATE = 1800             # ...or up to 30 min behind it
+    CONSISTENCY_SIGMA = 90.0    # seconds of delay drift allowed between two fixes
+    OFF_PATH_PENALTY = 0.05     # previous fix was not on this path at all
+    # Assign a trip only if the best candidate is this likely (with no delay
+    # residual: within ~90 m of the path)...
+    MIN_SCORE = 0.2
+    # ...and holds this share of all candidates' score. bench_trip_matcher at the
+    # default size: two-fix traces 92% precision / 12% recall with no trip
+    # reported yet, 99.8% / 38% with the running trips' delays known; 0.5 gains
+    # 8 points of recall on unreported trips for 3 of precision, and a wrong
+    # trip puts a fresh ActiveTrip a headway off. A single fix almost never
+    # qualifies - it cannot tell consecutive trips of a route apart.
+    MIN_PROBABILITY = 0.6
+
+    @classmethod
+    def is_confident(cls, result):
+        """Whether a MatchResult is good enough to assign its trip."""
+        return result.score >= cls.MIN_SCORE and result.probability >= cls.MIN_PROBABILITY
+
+    _cache_lock = threading.Lock()
+    _cached_version = None
+    _cached_matcher = None
+
+    def __init__(self, stops, shapes, trips, timezone=None, frequencies=None):
+        """
+        Build the index.
+
+        Args:
+            stops: dict stop_id -> (lat, lon)
+            shapes: dict shape_id -> list of (lat, lon) points in order
+            trips: iterable of (trip_id, shape_id, stop_ids, arrivals, departures),
+                   stop_times ordered by stop_sequence. Trips without a shape
+                   (shape_id None) follow straight lines between their stops.
+            timezone: Agency timezone the service seconds are in, kept with the
+                      matcher so callers need not look it up per match
+            frequencies: Optional dict trip_id -> sorted list of (start, end, headway seconds)
+                         for frequency-based (template) trips. Their instances are
+                         computed per match, never stored.
+        """
+        frequencies = frequencies or {}
+        self.timezone = timezone
+        self.projection = LocalProjection.around(stops.values())
+        self.grid = GridIndex(self.SEGMENT_CELL_SIZE)
+
+        # Per path (shape or stop-to-stop polyline): projected points and cumulative length
+        self.path_xs = []
+        self.path_ys = []
+        self.path_cum = []
+        path_index = {}
+
+        # Per path: trips sorted by start time, and frequency templates
+        path_trip_rows = []
+        path_template_rows = []
+        stop_xy = {sid: self.projection.project(lat, lon) for sid, (lat, lon) in stops.items()}
+        stop_distance_cache = {}
+
+        for trip_id, shape_id, stop_ids, arrivals, departures in trips:
+            if not stop_ids:
+                continue
+            stop_ids = tuple(stop_ids)
+
+            if shape_id and shape_id in shapes:
+                key = ('shape', shape_id)
+                coords = shapes[shape_id]
+            else:
+                key = ('stops', stop_ids)
+                coords = [stops[sid] for sid in stop_ids if sid in stops]
+
+            p = path_index.get(key)
+            if p is None:
+                if len(coords) < 2:
+                    continue
+                p = path_index[key] = self._add_path(coords)
+                path_trip_rows.append([])
+                path_template_rows.append([])
+
+            dist_key = (p, stop_ids)
+            stop_dist = stop_distance_cache.get(dist_key)
+            if stop_dist is None:
+                stop_dist = stop_distance_cache[dist_key] = self._stop_distances(p, stop_ids, stop_xy)
+
+            windows = frequencies.get(trip_id)
+            if windows is not None:
+                starts = InstanceStarts(windows)
+                if len(starts):
+                    # Template: times relative to the instance start
+                    start = departures[0]
+                    path_template_rows[p].append((
+                        trip_id, stop_dist,
+                        array('i', [arrival - start for arrival in arrivals]),
+                        array('i', [departure - start for departure in departures]),
+                        starts,
+                    ))
+                continue
+
+            path_trip_rows[p].append((
+                departures[0],
+                (trip_id, stop_dist, array('i', arrivals), array('i', departures)),
+            ))
+
+        self.path_trip_starts = []
+        self.path_trips = []
+        self.path_max_duration = []
+        for rows in path_trip_rows:
+            rows.sort(key=lambda row: row[0])
+            self.path_trip_starts.append(array('i', [row[0] for row in rows]))
+            self.path_trips.append([row[1] for row in rows])
+            self.path_max_duration.append(
+                max((trip[2][-1] - trip[3][0] for _, trip in rows), default=0)
+            )
+        self.path_templates = path_template_rows
+
+    def _add_path(self, coords):
+        p = len(self.path_xs)
+        xs = array('d')
+        ys = array('d')
+        cum = array('d')
+        total = 0.0
+        for lat, lon in coords:
+            x, y = self.projection.project(lat, lon)
+            if xs:
+                total += math.hypot(x - xs[-1], y - ys[-1])
+            xs.append(x)
+            ys.append(y)
+            cum.append(total)
+
+        for i in range(len(xs) - 1):
+            self.grid.insert_bbox(
+                (p, i),
+                min(xs[i], xs[i + 1]), min(ys[i], ys[i + 1]),
+                max(xs[i], xs[i + 1]), max(ys[i], ys[i + 1]),
+            )
+
+        self.path_xs.append(xs)
+        self.path_ys.append(ys)
+        self.path_cum.append(cum)
+        return p
+
+    def _stop_distances(self, p, stop_ids, stop_xy):
+        """
+        Distance along path p of each stop. Searches forward from the previous
+        stop's segment so loops and out-and-back shapes stay in order.
+        """
+        xs, ys, cum = self.path_xs[p], self.path_ys[p], self.path_cum[p]
+        distances = array('d')
+        start_seg = 0
+        for sid in stop_ids:
+            if sid not in stop_xy:
+                distances.append(distances[-1] if distances else 0.0)
+                continue
+            px, py = stop_xy[sid]
+            best = None
+            for i in range(start_seg, len(xs) - 1):
+                d2, t = point_segment_projection(px, py, xs[i], ys[i], xs[i + 1], ys[i + 1])
+                if best is None or d2 < best[0]:
+                    best = (d2, i, t)
+            _, i, t = best
+            start_seg = i
+            distances.append(cum[i] + t * (cum[i + 1] - cum[i]))
+        return distances
+
+    @staticmethod
+    def _scheduled_time_at(stop_dist, arrivals, departures, along):
+        """Scheduled service seconds at which the trip passes `along` meters."""
+        j = bisect.bisect_right(stop_dist, along)
+        if j == 0:
+            return departures[0]
+        if j >= len(stop_dist):
+            return arrivals[-1]
+        i = j - 1
+        span = stop_dist[j] - stop_dist[i]
+        frac = (along - stop_dist[i]) / span if span > 0 else 0.0
+        return departures[i] + frac * (arrivals[j] - departures[i])
+
+    def _nearby_paths(self, lat, lon):
+        """
+        Nearest point on each path within SEARCH_RADIUS.
+
+        Returns:
+            dict path index -> (squared distance, distance along path)
+        """
+        x, y = self.projection.project(lat, lon)
+        radius_sq = self.SEARCH_RADIUS * self.SEARCH_RADIUS
+
+        nearby = {}
+        for p, i in self.grid.query_radius(x, y, self.SEARCH_RADIUS):
+            xs, ys = self.path_xs[p], self.path_ys[p]
+            d2, t = point_segment_projection(x, y, xs[i], ys[i], xs[i + 1], ys[i + 1])
+            if d2 <= radius_sq:
+                best = nearby.get(p)
+                if best is None or d2 < best[0]:
+                    cum = self.path_cum[p]
+                    nearby[p] = (d2, cum[i] + t * (cum[i + 1] - cum[i]))
+        return nearby
+
+    def match(self, lat, lon, service_seconds, expected_delays=None, previous=None):
+        """
+        Find the most likely trip for a position at a point in time.
+
+        Args:
+            lat, lon: Observed position
+            service_seconds: Seconds since 00:00:00 of the service day
+            expected_delays: Optional callable, set of candidate trip_ids -> dict
+                             trip_id -> (currently estimated delay, its std or None,
+                             start_seconds of the instance it is for or None if not
+                             frequency-based); called once with the trips that could
+                             be there. Those are scored against their estimate, with
+                             its uncertainty plus FIX_DELAY_SIGMA, instead of against
+                             0 with DELAY_SIGMA
+            previous: Optional earlier fix of the same user, (lat, lon, service_seconds).
+                      A trip that explains both fixes with a consistent delay is
+                      strongly preferred - this separates directions and
+                      routes sharing a street, which one point cannot.
+
+        Returns:
+            MatchResult, or None if no trip could be there at that time
+        """
+        nearby = self._nearby_paths(lat, lon)
+        previous_nearby = self._nearby_paths(previous[0], previous[1]) if previous else None
+
+        # Trips on the nearby paths that could be there now, with the score
+        # that does not depend on their expected delay
+        two_sigma_d_sq = 2.0 * self.DISTANCE_SIGMA * self.DISTANCE_SIGMA
+        two_sigma_t_sq = 2.0 * self.DELAY_SIGMA * self.DELAY_SIGMA
+        two_sigma_c_sq = 2.0 * self.CONSISTENCY_SIGMA * self.CONSISTENCY_SIGMA
+        candidates = []
+
+        for p, (d2, along) in nearby.items():
+            starts = self.path_trip_starts[p]
+            lo = bisect.bisect_left(starts, service_seconds - self.path_max_duration[p] - self.MAX_LATE)
+            hi = bisect.bisect_right(starts, service_seconds + self.MAX_EARLY)
+            distance_score = math.exp(-d2 / two_sigma_d_sq)
+
+            previous_along = None
+            if previous_nearby is not None:
+                if p in previous_nearby:
+                    previous_along = previous_nearby[p][1]
+                else:
+                    distance_score *= self.OFF_PATH_PENALTY
+
+            for trip_id, stop_dist, arrivals, departures in itertools.islice(self.path_trips[p], lo, hi):
+                delay = service_seconds - self._scheduled_time_at(stop_dist, arrivals, departures, along)
+                if delay < -self.MAX_EARLY or delay > self.MAX_LATE:
+                    continue
+
+                score = distance_score
+                if previous_along is not None:
+                    previous_delay = previous[2] - self._scheduled_time_at(
+                        stop_dist, arrivals, departures, previous_along
+                    )
+                    drift = delay - previous_delay
+                    score *= math.exp(-(drift * drift) / two_sigma_c_sq)
+
+                candidates.append((score, trip_id, d2, delay, departures[0]))
+
+            # Frequency templates: the instances that could be here now, from their windows
+            for trip_id, stop_dist, arrivals, departures, starts in self.path_templates[p]:
+                offset = self._scheduled_time_at(stop_dist, arrivals, departures, along)
+                if previous_along is not None:
+                    previous_offset = self._scheduled_time_at(stop_dist, arrivals, departures, previous_along)
+                for i in range(starts.bisect_left(math.ceil(service_seconds - offset - self.MAX_LATE)), len(starts)):
+                    start = starts[i]
+                    delay = service_seconds - start - offset
+                    if delay < -self.MAX_EARLY:
+                        break
+
+                    score = distance_score
+                    if previous_along is not None:
+                        drift = delay - (previous[2] - start - previous_offset)
+                        score *= math.exp(-(drift * drift) / two_sigma_c_sq)
+
+                    candidates.append((score, trip_id, d2, delay, start))
+
+        if not candidates:
+            return None
+
+        expected = expected_delays({candidate[1] for candidate in candidates}) if expected_delays else {}
+        fix_variance = self.FIX_DELAY_SIGMA * self.FIX_DELAY_SIGMA
+        best = None
+        total_score = 0.0
+        for score, trip_id, d2, delay, start in candidates:
+            estimate = expected.get(trip_id)
+            if estimate is None or (estimate[2] is not None and estimate[2] != start):
+                # Not reported yet (or only another instance of the template): the prior
+                residual = delay
+                two_sigma_sq = two_sigma_t_sq
+            else:
+                expected_delay, std, _ = estimate
+                residual = delay - expected_delay
+                two_sigma_sq = 2.0 * (fix_variance + (self.DELAY_SIGMA if std is None else std) ** 2)
+            score *= math.exp(-(residual * residual) / two_sigma_sq)
+            total_score += score
+            if best is None or score > best[0]:
+                best = (score, trip_id, math.sqrt(d2), delay, start)
+
+        score, trip_id, distance, delay, start = best
+        return MatchResult(
+            trip_id=trip_id,
+            score=score,
+            probability=score / total_score if total_score > 0 else 0.0,
+            distance_meters=distance,
+            delay_seconds=int(round(delay)),
+            start_seconds=start,
+        )
+
+    @classmethod
+    def from_db(cls):
+        """Build a matcher from the ingested GTFS tables."""
+        from gtfs.models import Agency, Shape, Stop
+        from gtfs.utils.frequencies import load_frequencies
+        from gtfs.utils.patterns import load_schedules
+
+        stops = {
+            stop_id: (geom.y, geom.x)
+            for stop_id, geom in Stop.objects.values_list('stop_id', 'geom')
+        }
+        shapes = {
+            shape_id: [(lat, lon) for lon, lat in geometry.coords]
+            for shape_id, geometry in Shape.objects.values_list('shape_id', 'geometry')
+        }
+        timezone = Agency.objects.values_list('timezone', flat=True).first()
+        trips = (
+            (trip.trip_id, trip.shape_id, trip.stop_ids, trip.arrivals, trip.departures)
+            for trip in load_schedules()
+        )
+        return cls(stops, shapes, trips, timezone=timezone, frequencies=load_frequencies())
+
+    @classmethod
+    def current(cls):
+        """
+        Matcher for the current feed version, built on first use and rebuilt
+        within FeedVersion.CURRENT_TTL_SECONDS of every ingest. Returns None if
+        no feed has been ingested.
+        """
+        from gtfs.models import FeedVersion
+
+        version = FeedVersion.current_cached()
+        if version is None:
+            return None
+
+        if cls._cached_version != version.id:
+            with cls._cache_lock:
+                if cls._cached_version != version.id:
+                    cls._cached_matcher = cls.from_db()
+                    cls._cached_version = version.id
+        return cls._cached_matcher
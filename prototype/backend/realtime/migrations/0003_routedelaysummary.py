@@ -0,0 +1,78 @@
+# Generated by Django 5.2.10 on 2026-02-12 09:20
+
+import django.contrib.postgres.fields
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+# Frozen copies of realtime.models.DELAY_HISTOGRAM_BUCKETS / delay_bucket_filters
+# as of this migration, so later changes to the bucketing cannot change what it does
+DELAY_HISTOGRAM_BUCKETS = 31
+
+
+def delay_bucket_filters(field='avg_delay_seconds'):
+    """
+    Build one Q filter per delay histogram bucket, for conditional counts in SQL.
+
+    Returns:
+        List of Q objects, index = bucket number
+    """
+    last = DELAY_HISTOGRAM_BUCKETS - 1
+    filters = [Q(**{f'{field}__lte': 0})]
+    for i in range(1, last):
+        filters.append(Q(**{f'{field}__gt': (i - 1) * 60, f'{field}__lte': i * 60}))
+    filters.append(Q(**{f'{field}__gt': (last - 1) * 60}))
+    return filters
+
+
+def backfill_route_delay_summaries(apps, schema_editor):
+    """Materialize summaries for history that existed before this table."""
+    TripDelayHistory = apps.get_model('realtime', 'TripDelayHistory')
+    RouteDelaySummary = apps.get_model('realtime', 'RouteDelaySummary')
+
+    buckets = {f'bucket_{i}': Count('id', filter=q) for i, q in enumerate(delay_bucket_filters())}
+    rows = TripDelayHistory.objects.values('trip__route_id', 'date').annotate(
+        num_trips=Count('id'),
+        total_delay=Sum('avg_delay_seconds'),
+        **buckets
+    )
+    RouteDelaySummary.objects.bulk_create([
+        RouteDelaySummary(
+            route_id=row['trip__route_id'],
+            date=row['date'],
+            num_trips=row['num_trips'],
+            total_delay_seconds=row['total_delay'] or 0,
+            delay_histogram=[row[f'bucket_{i}'] for i in range(DELAY_HISTOGRAM_BUCKETS)],
+        )
+        for row in rows
+    ], batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gtfs', '0005_shape_remove_trip_shape_id_trip_shape'),
+        ('realtime', '0002_tripdelayhistory'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RouteDelaySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(help_text='Service date for this summary')),
+                ('num_trips', models.IntegerField(help_text='Trips with delay history on this date')),
+                ('total_delay_seconds', models.BigIntegerField(help_text='Sum of per-trip average delays')),
+                ('delay_histogram', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), help_text='Trip counts per delay bucket (0: on time/early, i: (i-1, i] min late, last: overflow)', size=31)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('route', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='delay_summaries', to='gtfs.route')),
+            ],
+            options={
+                'verbose_name_plural': 'Route Delay Summaries',
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['date'], name='realtime_ro_date_eed00a_idx')],
+                'unique_together': {('route', 'date')},
+            },
+        ),
+        migrations.RunPython(backfill_route_delay_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.10 on 2026-10-18 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('realtime', '0003_routedelaysummary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activetrip',
+            name='delay_rate',
+            field=models.FloatField(default=0.0, help_text='Estimated change of delay per second'),
+        ),
+        migrations.AddField(
+            model_name='activetrip',
+            name='delay_uncertainty_seconds',
+            field=models.FloatField(blank=True, help_text='Standard deviation of the delay estimate', null=True),
+        ),
+    ]
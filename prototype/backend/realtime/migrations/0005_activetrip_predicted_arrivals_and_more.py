@@ -0,0 +1,24 @@
+# Generated by Django 5.2.10 on 2026-10-18 12:40
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('realtime', '0004_activetrip_delay_rate_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activetrip',
+            name='predicted_arrivals',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, help_text='Predicted arrival, seconds since service day start', size=None),
+        ),
+        migrations.AddField(
+            model_name='activetrip',
+            name='predicted_sequences',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, help_text='stop_sequence of each predicted stop', size=None),
+        ),
+    ]
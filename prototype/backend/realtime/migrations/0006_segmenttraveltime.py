@@ -0,0 +1,32 @@
+# Generated by Django 5.2.10 on 2026-10-18 13:30
+
+import django.contrib.postgres.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gtfs', '0006_feedversion'),
+        ('realtime', '0005_activetrip_predicted_arrivals_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SegmentTravelTime',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('counts', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), help_text='Number of samples per hour-of-week bucket', size=168)),
+                ('means', django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), help_text='Mean travel time in seconds per bucket', size=168)),
+                ('m2s', django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), help_text='Sum of squared deviations from the mean per bucket', size=168)),
+                ('last_date', models.DateField(help_text='Latest service date merged into the statistics')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('from_stop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='segments_from', to='gtfs.stop')),
+                ('to_stop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='segments_to', to='gtfs.stop')),
+            ],
+            options={
+                'unique_together': {('from_stop', 'to_stop')},
+            },
+        ),
+    ]
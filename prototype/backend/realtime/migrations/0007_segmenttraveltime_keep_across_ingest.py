@@ -0,0 +1,24 @@
+# Generated by Django 5.2.10 on 2026-10-18 20:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('realtime', '0006_segmenttraveltime'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='segmenttraveltime',
+            name='from_stop',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='segments_from', to='gtfs.stop'),
+        ),
+        migrations.AlterField(
+            model_name='segmenttraveltime',
+            name='to_stop',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='segments_to', to='gtfs.stop'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.10 on 2026-10-18 23:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('realtime', '0007_segmenttraveltime_keep_across_ingest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activetrip',
+            name='instance_start',
+            field=models.IntegerField(blank=True, help_text='Start of the tracked frequency instance, seconds since service day start', null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.10 on 2026-10-18 23:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('realtime', '0008_activetrip_instance_start'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activetrip',
+            name='estimated_at',
+            field=models.DateTimeField(blank=True, help_text='Time the delay estimate is for (last observation folded in)', null=True),
+        ),
+    ]
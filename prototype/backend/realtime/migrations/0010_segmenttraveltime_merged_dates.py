@@ -0,0 +1,43 @@
+# Generated by Django 5.2.10 on 2026-10-18 23:55
+
+import datetime
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def merged_dates_from_last_date(apps, schema_editor):
+    """
+    Existing rows only record a high-water mark: which dates up to last_date
+    were merged is not known. Mark all of them (from the first aggregated
+    service date on) as merged, so none is counted twice.
+    """
+    SegmentTravelTime = apps.get_model('realtime', 'SegmentTravelTime')
+    TripDelayHistory = apps.get_model('realtime', 'TripDelayHistory')
+
+    first_date = TripDelayHistory.objects.aggregate(first=Min('date'))['first']
+    rows = []
+    for row in SegmentTravelTime.objects.only('id', 'last_date').iterator(chunk_size=2000):
+        start = min(first_date, row.last_date) if first_date else row.last_date
+        row.merged_dates = [
+            start + datetime.timedelta(days=i) for i in range((row.last_date - start).days + 1)
+        ]
+        rows.append(row)
+    SegmentTravelTime.objects.bulk_update(rows, ['merged_dates'], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('realtime', '0009_activetrip_estimated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='segmenttraveltime',
+            name='merged_dates',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.DateField(), blank=True, default=list, help_text='Every service date merged into the statistics', size=None),
+        ),
+        migrations.RunPython(merged_dates_from_last_date, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,8 @@
-from django.db import models
-from gtfs.models import Trip
+from django.contrib.postgres.fields import ArrayField
+from django.db import models, transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+from gtfs.models import Route, Stop, Trip
 
 class ActiveTrip(models.Model):
     trip = models.OneToOneField(Trip, on_delete=models.CASCADE, related_name='active_trip')
@@ -7,6 +10,20 @@ class ActiveTrip(models.Model):
     last_observed_at = models.DateTimeField(auto_now=True)
     delay_seconds = models.IntegerField(default=0)
     confidence_score = models.FloatField(default=0.0)
+    # Delay filter state (see realtime/estimator.py), persisted so other workers can pick it up
+    delay_rate = models.FloatField(default=0.0, help_text="Estimated change of delay per second")
+    delay_uncertainty_seconds = models.FloatField(null=True, blank=True,
+                                                  help_text="Standard deviation of the delay estimate")
+    estimated_at = models.DateTimeField(null=True, blank=True,
+                                        help_text="Time the delay estimate is for (last observation folded in)")
+    # Downstream predictions (see realtime/propagation.py): parallel arrays, remaining stops only
+    predicted_sequences = ArrayField(models.IntegerField(), default=list, blank=True,
+                                     help_text="stop_sequence of each predicted stop")
+    predicted_arrivals = ArrayField(models.IntegerField(), default=list, blank=True,
+                                    help_text="Predicted arrival, seconds since service day start")
+    # Frequency-based trips: the template's ActiveTrip follows one instance at a time
+    instance_start = models.IntegerField(null=True, blank=True,
+                                         help_text="Start of the tracked frequency instance, seconds since service day start")
 
     def __str__(self):
         return f"Active: {self.trip_id} (Delay: {self.delay_seconds}s)"
@@ -41,3 +58,207 @@ class TripDelayHistory(models.Model):
     
     def __str__(self):
         return f"{self.trip_id} on {self.date}: {self.avg_delay_seconds}s avg ({self.num_observations} obs)"
+
+
+# Route delay histogram: bucket 0 = on time or early, bucket i = ((i-1), i] minutes late,
+# last bucket = more than DELAY_HISTOGRAM_BUCKETS - 2 minutes late
+DELAY_HISTOGRAM_BUCKETS = 31
+
+
+def delay_bucket_filters(field='avg_delay_seconds'):
+    """
+    Build one Q filter per delay histogram bucket, for conditional counts in SQL.
+    
+    Returns:
+        List of Q objects, index = bucket number
+    """
+    last = DELAY_HISTOGRAM_BUCKETS - 1
+    filters = [Q(**{f'{field}__lte': 0})]
+    for i in range(1, last):
+        filters.append(Q(**{f'{field}__gt': (i - 1) * 60, f'{field}__lte': i * 60}))
+    filters.append(Q(**{f'{field}__gt': (last - 1) * 60}))
+    return filters
+
+
+class RouteDelaySummary(models.Model):
+    """
+    Materialized per-route, per-day rollup of TripDelayHistory.
+    Refreshed by aggregate_delays so /active-trips/patterns/ never scans raw history.
+    """
+    route = models.ForeignKey(Route, on_delete=models.CASCADE, related_name='delay_summaries')
+    date = models.DateField(help_text="Service date for this summary")
+    num_trips = models.IntegerField(help_text="Trips with delay history on this date")
+    total_delay_seconds = models.BigIntegerField(help_text="Sum of per-trip average delays")
+    delay_histogram = ArrayField(
+        models.IntegerField(),
+        size=DELAY_HISTOGRAM_BUCKETS,
+        help_text="Trip counts per delay bucket (0: on time/early, i: (i-1, i] min late, last: overflow)"
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['route', 'date']
+        ordering = ['-date']
+        indexes = [
+            models.Index(fields=['date']),
+        ]
+        verbose_name_plural = "Route Delay Summaries"
+
+    def __str__(self):
+        return f"{self.route_id} on {self.date}: {self.num_trips} trips"
+
+    def trips_delayed_over(self, minutes):
+        """Number of trips on this date with average delay > `minutes` minutes."""
+        minutes = max(0, min(minutes, DELAY_HISTOGRAM_BUCKETS - 2))
+        return sum(self.delay_histogram[minutes + 1:])
+
+    @classmethod
+    def refresh(cls, date):
+        """
+        Recompute the summaries for one service date from TripDelayHistory.
+        
+        Grouping happens in the database (GROUP BY route with conditional counts),
+        so only one row per route comes back.
+        
+        Returns:
+            Number of route summaries written
+        """
+        buckets = {f'bucket_{i}': Count('id', filter=q) for i, q in enumerate(delay_bucket_filters())}
+        rows = TripDelayHistory.objects.filter(date=date).values('trip__route_id').annotate(
+            num_trips=Count('id'),
+            total_delay=Sum('avg_delay_seconds'),
+            **buckets
+        )
+        
+        summaries = [
+            cls(
+                route_id=row['trip__route_id'],
+                date=date,
+                num_trips=row['num_trips'],
+                total_delay_seconds=row['total_delay'] or 0,
+                delay_histogram=[row[f'bucket_{i}'] for i in range(DELAY_HISTOGRAM_BUCKETS)],
+            )
+            for row in rows
+        ]
+        
+        with transaction.atomic():
+            cls.objects.filter(date=date).delete()
+            cls.objects.bulk_create(summaries)
+        
+        return len(summaries)
+
+
+# Segment travel time buckets: one per hour of the week, index = weekday * 24 + hour
+SEGMENT_TIME_BUCKETS = 7 * 24
+
+
+def segment_time_bucket(weekday, service_seconds):
+    """
+    Hour-of-week bucket of a moment on a service day.
+    Hours past midnight (service_seconds >= 86400) stay on the service date's weekday.
+    """
+    return weekday * 24 + (service_seconds // 3600) % 24
+
+
+class SegmentTravelTime(models.Model):
+    """
+    Observed travel time between two consecutive stops (arrival to arrival, so
+    the dwell at from_stop is included), as running statistics per hour of the week.
+    
+    Statistics are Welford accumulators (count, mean, M2) stored as three
+    parallel arrays of SEGMENT_TIME_BUCKETS, so a whole week of history for a
+    segment is one row. Updated incrementally by aggregate_delays; read through
+    realtime.segments.SegmentTimeStore.
+    """
+    # No database constraint: ingest_gtfs deletes and recreates every Stop, and the
+    # history must outlive that. Rows of stops gone from the feed are simply never looked up.
+    from_stop = models.ForeignKey(Stop, on_delete=models.DO_NOTHING, db_constraint=False, related_name='segments_from')
+    to_stop = models.ForeignKey(Stop, on_delete=models.DO_NOTHING, db_constraint=False, related_name='segments_to')
+    counts = ArrayField(models.IntegerField(), size=SEGMENT_TIME_BUCKETS,
+                        help_text="Number of samples per hour-of-week bucket")
+    means = ArrayField(models.FloatField(), size=SEGMENT_TIME_BUCKETS,
+                       help_text="Mean travel time in seconds per bucket")
+    m2s = ArrayField(models.FloatField(), size=SEGMENT_TIME_BUCKETS,
+                     help_text="Sum of squared deviations from the mean per bucket")
+    last_date = models.DateField(help_text="Latest service date merged into the statistics")
+    merged_dates = ArrayField(models.DateField(), default=list, blank=True,
+                              help_text="Every service date merged into the statistics")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['from_stop', 'to_stop']
+
+    def __str__(self):
+        return f"{self.from_stop_id} -> {self.to_stop_id}: {sum(self.counts)} samples"
+
+    def merge(self, bucket, count, mean, m2):
+        """
+        Merge a batch's statistics into one bucket (Chan et al. parallel update).
+        """
+        n_a, mean_a = self.counts[bucket], self.means[bucket]
+        n = n_a + count
+        delta = mean - mean_a
+        self.means[bucket] = mean_a + delta * count / n
+        self.m2s[bucket] = self.m2s[bucket] + m2 + delta * delta * n_a * count / n
+        self.counts[bucket] = n
+
+    @classmethod
+    def accumulate(cls, date, samples):
+        """
+        Merge one service date's samples into the statistics.
+        
+        Rows that already include this date (in merged_dates) are left alone,
+        so re-running a day does not count it twice; an older day that was
+        missed or is backfilled is merged like any other.
+        
+        Args:
+            date: Service date of the samples
+            samples: dict (from_stop_id, to_stop_id) -> dict bucket -> list of seconds
+        
+        Returns:
+            Number of segments written
+        """
+        empty = [0] * SEGMENT_TIME_BUCKETS
+        now = timezone.now()  # bulk_update skips auto_now
+        
+        with transaction.atomic():
+            existing = {
+                (row.from_stop_id, row.to_stop_id): row
+                for row in cls.objects.select_for_update().filter(
+                    from_stop_id__in={pair[0] for pair in samples},
+                ).filter(to_stop_id__in={pair[1] for pair in samples})
+            }
+            
+            to_create = []
+            to_update = []
+            for (from_stop_id, to_stop_id), buckets in samples.items():
+                row = existing.get((from_stop_id, to_stop_id))
+                if row is None:
+                    row = cls(
+                        from_stop_id=from_stop_id,
+                        to_stop_id=to_stop_id,
+                        counts=list(empty),
+                        means=[0.0] * SEGMENT_TIME_BUCKETS,
+                        m2s=[0.0] * SEGMENT_TIME_BUCKETS,
+                        last_date=date,
+                        merged_dates=[date],
+                    )
+                    to_create.append(row)
+                elif date in row.merged_dates:
+                    continue
+                else:
+                    row.last_date = max(row.last_date, date)
+                    row.merged_dates.append(date)
+                    row.updated_at = now
+                    to_update.append(row)
+                
+                for bucket, values in buckets.items():
+                    count = len(values)
+                    mean = sum(values) / count
+                    m2 = sum((v - mean) ** 2 for v in values)
+                    row.merge(bucket, count, mean, m2)
+            
+            cls.objects.bulk_create(to_create, batch_size=1000)
+            cls.objects.bulk_update(to_update, ['counts', 'means', 'm2s', 'last_date', 'merged_dates', 'updated_at'], batch_size=1000)
+        
+        return len(to_create) + len(to_update)
@@ -0,0 +1,112 @@
+"""
+Downstream ETA Propagation
+
+Turns a trip's current delay estimate into predicted arrival times at every
+remaining stop, so readers (upcoming, active trip detail) just look them up.
+
+Walking the remaining stop_times in order:
+    arrival[first] = scheduled arrival + current delay
+    arrival[i+1]   = arrival[i] + segment travel time (i -> i+1)
+
+Segment travel time is arrival to arrival, i.e. it includes the dwell at i -
+that is what consecutive crowd observations measure.
+
+Segment travel times come from a pluggable source. ScheduledSegmentTimes
+returns the timetable's own segment time, which keeps the delay constant
+along the route; a historical source lets delay recover or grow where buses
+habitually run faster or slower than scheduled.
+
+On top of that, the delay rate from the trip's filter (realtime/estimator.py)
+is extrapolated with exponential damping: a bus losing time right now will
+keep losing some, but not forever.
+"""
+
+import bisect
+import math
+
+
+class ScheduledSegmentTimes:
+    """Segment travel time as scheduled."""
+
+    def travel_time(self, from_stop, to_stop, scheduled_seconds, service_seconds, weekday):
+        """
+        Args:
+            from_stop, to_stop: stop_ids of the segment
+            scheduled_seconds: Scheduled arrival-to-arrival time of the segment
+            service_seconds: When the bus is expected at from_stop
+            weekday: Service date weekday (0 = Monday)
+
+        Returns:
+            Expected travel time in seconds
+        """
+        return scheduled_seconds
+
+
+RATE_DAMPING_SECONDS = 600  # horizon over which the current delay rate fades out
+
+
+def predict_arrivals(stop_times, delay_seconds, now_seconds, weekday, rate=0.0,
+                     after_sequence=None, segment_times=None):
+    """
+    Predict arrival times at the remaining stops of a trip.
+
+    Args:
+        stop_times: List of (stop_sequence, stop_id, arrival_seconds, departure_seconds),
+                    ordered by stop_sequence
+        delay_seconds: Current delay estimate
+        now_seconds: Current service-day seconds
+        weekday: Service date weekday (0 = Monday)
+        rate: Current delay rate (s/s) from the delay filter
+        after_sequence: If the bus is known to have reached this stop, only
+                        stops after it are predicted
+        segment_times: Segment travel time source (default: ScheduledSegmentTimes)
+
+    Returns:
+        Tuple of (stop sequences, predicted arrival seconds), both lists, same length
+    """
+    segment_times = segment_times or ScheduledSegmentTimes()
+
+    # First stop the bus has not reached yet
+    first = None
+    for i, (sequence, _, arrival, _) in enumerate(stop_times):
+        if after_sequence is not None and sequence <= after_sequence:
+            continue
+        if arrival + delay_seconds >= now_seconds:
+            first = i
+            break
+    if first is None:
+        return [], []
+
+    sequences = []
+    arrivals = []
+    predicted_arrival = stop_times[first][2] + delay_seconds
+
+    for i in range(first, len(stop_times)):
+        sequence, stop_id, arrival, departure = stop_times[i]
+        if i > first:
+            _, prev_stop, prev_arrival, _ = stop_times[i - 1]
+            predicted_arrival += segment_times.travel_time(
+                prev_stop, stop_id, arrival - prev_arrival, predicted_arrival, weekday
+            )
+
+        horizon = max(0.0, predicted_arrival - now_seconds)
+        drift = rate * RATE_DAMPING_SECONDS * (1.0 - math.exp(-horizon / RATE_DAMPING_SECONDS))
+
+        sequences.append(sequence)
+        arrivals.append(int(round(predicted_arrival + drift)))
+
+    return sequences, arrivals
+
+
+def predicted_arrival_at(active_trip, stop_sequence):
+    """
+    Predicted arrival seconds of an ActiveTrip at one stop, or None if there is
+    no prediction for it (not predicted yet, or already passed).
+    """
+    sequences = active_trip.predicted_sequences
+    if not sequences:
+        return None
+    lo = bisect.bisect_left(sequences, stop_sequence)
+    if lo < len(sequences) and sequences[lo] == stop_sequence:
+        return active_trip.predicted_arrivals[lo]
+    return None
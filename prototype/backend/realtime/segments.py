@@ -0,0 +1,117 @@
+"""
+Segment Travel Time Store
+
+In-memory, read-only view of SegmentTravelTime for hot paths (ETA
+propagation, skip detection, anomaly checks).
+
+Stops are integer-coded and a segment key is from_code * num_stops + to_code,
+so a lookup is one dict probe plus an index into flat arrays:
+    counts[row * SEGMENT_TIME_BUCKETS + bucket]
+    means[row * SEGMENT_TIME_BUCKETS + bucket]
+    stds[row * SEGMENT_TIME_BUCKETS + bucket]
+
+The store is reloaded at most every RELOAD_SECONDS; the statistics only
+change once a day (aggregate_delays), so a short TTL is plenty.
+"""
+
+import math
+import threading
+import time
+from array import array
+
+from .models import SEGMENT_TIME_BUCKETS, SegmentTravelTime, segment_time_bucket
+
+
+class SegmentTimeStore:
+    RELOAD_SECONDS = 600
+
+    _cache_lock = threading.Lock()
+    _cached_store = None
+    _cached_at = 0.0
+
+    def __init__(self, rows):
+        """
+        Args:
+            rows: iterable of (from_stop_id, to_stop_id, counts, means, m2s)
+        """
+        self.stop_codes = {}
+        self.segment_rows = {}
+        self.counts = array('i')
+        self.means = array('f')
+        self.stds = array('f')
+
+        pending = []
+        for from_stop_id, to_stop_id, counts, means, m2s in rows:
+            for stop_id in (from_stop_id, to_stop_id):
+                if stop_id not in self.stop_codes:
+                    self.stop_codes[stop_id] = len(self.stop_codes)
+            pending.append((self.stop_codes[from_stop_id], self.stop_codes[to_stop_id], counts, means, m2s))
+
+        self.num_stops = len(self.stop_codes)
+        for from_code, to_code, counts, means, m2s in pending:
+            self.segment_rows[from_code * self.num_stops + to_code] = len(self.segment_rows)
+            self.counts.extend(counts)
+            self.means.extend(means)
+            self.stds.extend(
+                math.sqrt(m2 / (n - 1)) if n > 1 else 0.0
+                for n, m2 in zip(counts, m2s)
+            )
+
+    def __len__(self):
+        return len(self.segment_rows)
+
+    def lookup(self, from_stop_id, to_stop_id, weekday, service_seconds):
+        """
+        Statistics of one segment at one hour of the week.
+
+        Returns:
+            (count, mean seconds, std seconds), or None if the segment was never observed
+        """
+        from_code = self.stop_codes.get(from_stop_id)
+        to_code = self.stop_codes.get(to_stop_id)
+        if from_code is None or to_code is None:
+            return None
+        row = self.segment_rows.get(from_code * self.num_stops + to_code)
+        if row is None:
+            return None
+        i = row * SEGMENT_TIME_BUCKETS + segment_time_bucket(weekday, service_seconds)
+        return self.counts[i], self.means[i], self.stds[i]
+
+    @classmethod
+    def from_db(cls):
+        return cls(SegmentTravelTime.objects.values_list(
+            'from_stop_id', 'to_stop_id', 'counts', 'means', 'm2s'
+        ).iterator(chunk_size=5000))
+
+    @classmethod
+    def current(cls):
+        """Store loaded from the database, reloaded every RELOAD_SECONDS."""
+        now = time.monotonic()
+        if cls._cached_store is None or now - cls._cached_at > cls.RELOAD_SECONDS:
+            with cls._cache_lock:
+                if cls._cached_store is None or now - cls._cached_at > cls.RELOAD_SECONDS:
+                    cls._cached_store = cls.from_db()
+                    cls._cached_at = now
+        return cls._cached_store
+
+
+class HistoricalSegmentTimes:
+    """
+    Segment travel time source for realtime.propagation backed by a SegmentTimeStore.
+
+    The historical mean is shrunk towards the scheduled time by PRIOR_SAMPLES
+    pseudo-observations, so a bucket with two samples barely moves the
+    prediction and one with fifty mostly replaces the timetable.
+    """
+
+    PRIOR_SAMPLES = 5
+
+    def __init__(self, store):
+        self.store = store
+
+    def travel_time(self, from_stop, to_stop, scheduled_seconds, service_seconds, weekday):
+        stats = self.store.lookup(from_stop, to_stop, weekday, service_seconds)
+        if stats is None or stats[0] == 0:
+            return scheduled_seconds
+        count, mean, _ = stats
+        return (count * mean + self.PRIOR_SAMPLES * scheduled_seconds) / (count + self.PRIOR_SAMPLES)
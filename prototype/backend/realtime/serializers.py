@@ -22,7 +22,8 @@ class ActiveTripSerializer(serializers.ModelSerializer):
     class Meta:
         model = ActiveTrip
         fields = ['id', 'trip', 'trip_details', 'started_at', 'last_observed_at', 
-                  'delay_seconds', 'confidence_score', 'position',
+                  'delay_seconds', 'confidence_score', 'delay_uncertainty_seconds', 'instance_start', 'position',
+                  'predicted_sequences', 'predicted_arrivals',
                   'predicted_delay_seconds', 'prediction_confidence']
     
     def get_predicted_delay_seconds(self, obj):
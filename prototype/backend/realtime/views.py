@@ -1,86 +1,116 @@
 from rest_framework import viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from .models import ActiveTrip, TripDelayHistory
+from .models import ActiveTrip, RouteDelaySummary, DELAY_HISTOGRAM_BUCKETS
 from .serializers import ActiveTripSerializer
-from gtfs.models import Route, StopTime, Trip
-from django.db.models import Avg, Count, Q
-from django.utils import timezone
+from gtfs.models import Agency, Stop, StopTime, Trip
+from gtfs.utils.frequencies import last_instance_start, load_frequencies, nearest_instance_start
+from gtfs.utils.time_helpers import datetime_to_service_seconds, get_current_service_time
+from evidence.models import Observation
+from django.core.cache import cache
+from django.db.models import CharField, Count, DateTimeField, ExpressionWrapper, F, Value
+from django.db.models.functions import Cast, Concat, TruncDate
 import datetime
+import pytz
 
 
 class ActiveTripViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = ActiveTrip.objects.all()
     serializer_class = ActiveTripSerializer
     
+    # Skipped stop detection: flag stops observed on <70% of scheduled visits
+    SKIPPED_STOP_MIN_RATE = 0.7
+    SKIPPED_STOP_MIN_VISITS = 5
+    PATTERNS_CACHE_SECONDS = 24 * 60 * 60
+    
     @action(detail=False, methods=['get'])
     def patterns(self, request):
         """
         Detect patterns in delay data:
         - Routes with >50% of trips delayed >5 min
         - Stops that are skipped >30% of the time
+        
+        Query params (all optional):
+        - days: analysis window in days (default: 7, max: 90)
+        - delay_minutes: a trip counts as delayed above this many minutes (default: 5)
+        - min_pct_delayed: flag routes with more than this share of delayed trips (default: 0.5)
         """
-        # Look at last 7 days of data
-        cutoff_date = timezone.now().date() - datetime.timedelta(days=7)
+        try:
+            days = int(request.query_params.get('days', 7))
+            delay_minutes = int(request.query_params.get('delay_minutes', 5))
+            min_pct_delayed = float(request.query_params.get('min_pct_delayed', 0.5))
+        except ValueError:
+            return Response({"error": "days and delay_minutes must be integers, min_pct_delayed a number"}, status=400)
+        
+        if not 1 <= days <= 90:
+            return Response({"error": "days must be between 1 and 90"}, status=400)
+        if not 0 <= delay_minutes <= DELAY_HISTOGRAM_BUCKETS - 2:
+            return Response({"error": f"delay_minutes must be between 0 and {DELAY_HISTOGRAM_BUCKETS - 2}"}, status=400)
+        if not 0.0 <= min_pct_delayed <= 1.0:
+            return Response({"error": "min_pct_delayed must be between 0 and 1"}, status=400)
+        
+        agency = Agency.objects.first()
+        if not agency:
+            return Response({"error": "No agency configured. Run GTFS ingestion first."}, status=500)
+        
+        # Service dates in the agency's timezone, like the history they are compared with
+        today, _ = get_current_service_time(agency.timezone)
+        cutoff_date = today - datetime.timedelta(days=days)
         
         # 1. Delayed Routes Analysis
-        delayed_routes = self._analyze_delayed_routes(cutoff_date)
+        delayed_routes = self._analyze_delayed_routes(cutoff_date, delay_minutes, min_pct_delayed)
         
         # 2. Skipped Stops Analysis  
-        skipped_stops = self._analyze_skipped_stops(cutoff_date)
+        skipped_stops = self._analyze_skipped_stops(cutoff_date, today, agency)
         
         return Response({
             'delayed_routes': delayed_routes,
             'skipped_stops': skipped_stops,
             'analysis_period': {
                 'start_date': cutoff_date.isoformat(),
-                'end_date': timezone.now().date().isoformat(),
-                'days': 7
+                'end_date': today.isoformat(),
+                'days': days
+            },
+            'thresholds': {
+                'delay_minutes': delay_minutes,
+                'min_pct_delayed': min_pct_delayed
             }
         })
     
-    def _analyze_delayed_routes(self, cutoff_date):
+    def _analyze_delayed_routes(self, cutoff_date, delay_minutes=5, min_pct_delayed=0.5):
         """
-        Find routes where >50% of trips have avg delay >300s (5 min).
+        Find routes where more than `min_pct_delayed` of trips have avg delay
+        above `delay_minutes`.
+        
+        Reads the materialized RouteDelaySummary table (one row per route per day,
+        refreshed by aggregate_delays), so the cost depends on the window length
+        and number of routes, not on how much history is stored.
         """
         delayed_routes = []
         
-        # Get all delay history from last 7 days
-        history = TripDelayHistory.objects.filter(
-            date__gte=cutoff_date
-        ).select_related('trip__route')
-        
-        # Group by route
         route_data = {}
-        for record in history:
-            route_id = record.trip.route.route_id
-            if route_id not in route_data:
-                route_data[route_id] = {
-                    'route_id': route_id,
-                    'route_name': record.trip.route.short_name,
-                    'total_trips': 0,
-                    'delayed_trips': 0,
-                    'total_delay': 0,
-                }
-            
-            route_data[route_id]['total_trips'] += 1
-            route_data[route_id]['total_delay'] += record.avg_delay_seconds
-            
-            # Count as delayed if avg delay > 300 seconds (5 min)
-            if record.avg_delay_seconds > 300:
-                route_data[route_id]['delayed_trips'] += 1
+        for summary in RouteDelaySummary.objects.filter(date__gte=cutoff_date).select_related('route'):
+            data = route_data.setdefault(summary.route_id, {
+                'route_name': summary.route.short_name,
+                'total_trips': 0,
+                'delayed_trips': 0,
+                'total_delay': 0,
+            })
+            data['total_trips'] += summary.num_trips
+            data['delayed_trips'] += summary.trips_delayed_over(delay_minutes)
+            data['total_delay'] += summary.total_delay_seconds
         
-        # Filter routes with >50% trips delayed
         for route_id, data in route_data.items():
-            pct_delayed = data['delayed_trips'] / data['total_trips'] if data['total_trips'] > 0 else 0
+            if data['total_trips'] == 0:
+                continue
             
-            if pct_delayed > 0.5:
-                avg_delay = data['total_delay'] // data['total_trips']
+            pct_delayed = data['delayed_trips'] / data['total_trips']
+            if pct_delayed > min_pct_delayed:
                 delayed_routes.append({
                     'route_id': route_id,
                     'route_name': data['route_name'],
                     'pct_trips_delayed': round(pct_delayed, 2),
-                    'avg_delay_seconds': avg_delay,
+                    'avg_delay_seconds': data['total_delay'] // data['total_trips'],
                     'total_trips_analyzed': data['total_trips']
                 })
         
@@ -89,19 +119,164 @@ class ActiveTripViewSet(viewsets.ReadOnlyModelViewSet):
         
         return delayed_routes
     
-    def _analyze_skipped_stops(self, cutoff_date):
+    def _analyze_skipped_stops(self, cutoff_date, today, agency):
         """
         Find stops that are frequently skipped based on observation data.
         
         Logic: Compare scheduled stop_times vs actual observations.
         If a stop has significantly fewer observations than expected, it may be skipped.
+        
+        Observations are sparse crowdsourced reports, so a stop is only judged
+        on the trips somebody was actually reporting on:
+        - Evidence: a (trip, service day) with any report of the trip; for a
+          frequency-based trip a (trip, service day, instance), the instance
+          taken from the report's time (see _frequency_evidence)
+        - Scheduled visits: per stop, the evidence units whose trip serves it
+        - Observed visits: the evidence units with an ARRIVED or PASSED report
+          at the stop
+        - Flag stops whose observation rate is below 70%
+        
+        Explicit trips are grouped in the database; only the reports on
+        frequency-based trips are read row by row. Results are cached per day.
+        
+        Args:
+            cutoff_date: First service date of the window
+            today: Current service date in the agency's timezone (excluded)
+            agency: Agency whose timezone defines the service days
         """
-        # This is complex - for MVP, return placeholder
-        # Full implementation would:
-        # 1. Get all trips that should have stopped at each stop
-        # 2. Count observations at each stop
-        # 3. Calculate observation rate (actual / expected)
-        # 4. Flag stops with <70% observation rate
-        
-        # For now, return empty array with note
-        return []
+        cache_key = f'patterns:skipped_stops:{cutoff_date.isoformat()}:{today.isoformat()}'
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        tz = pytz.timezone(agency.timezone)
+        
+        # Service days run 3 AM to 3 AM; only look at completed service days
+        window_start = tz.localize(datetime.datetime.combine(cutoff_date, datetime.time(3, 0)))
+        window_end = tz.localize(datetime.datetime.combine(today, datetime.time(3, 0)))
+        
+        service_date = TruncDate(
+            ExpressionWrapper(F('timestamp') - datetime.timedelta(hours=3), output_field=DateTimeField()),
+            tzinfo=tz,
+        )
+        reports = Observation.objects.filter(
+            timestamp__gte=window_start,
+            timestamp__lt=window_end,
+            trip__isnull=False,
+        ).order_by()
+        frequencies = load_frequencies()
+        explicit_reports = reports.exclude(trip_id__in=list(frequencies))
+        
+        # 1. Evidence units per trip
+        evidence = dict(explicit_reports.values('trip_id').annotate(
+            days=Count(service_date, distinct=True)
+        ).values_list('trip_id', 'days'))
+        instances_by_trip, observed_instances_by_stop = self._frequency_evidence(reports, frequencies, agency)
+        evidence.update(instances_by_trip)
+        if not evidence:
+            return []
+        
+        # 2. Scheduled visits per stop: the evidence of every trip serving it (loops count once)
+        scheduled = {}
+        for trip_id, stop_id in StopTime.objects.filter(
+            trip_id__in=list(evidence),
+        ).order_by().values_list('trip_id', 'stop_id').distinct():
+            scheduled[stop_id] = scheduled.get(stop_id, 0) + evidence[trip_id]
+        
+        # 3. Observed visits per stop, counted once per (trip, service day)
+        trip_day = Concat('trip_id', Value(':'), Cast(service_date, CharField()))
+        passed = [Observation.ObservationType.BUS_ARRIVED, Observation.ObservationType.BUS_PASSED]
+        observed = explicit_reports.filter(stop__isnull=False, type__in=passed).values('stop_id').annotate(
+            observed_visits=Count(trip_day, distinct=True),
+        )
+        observed_by_stop = dict(observed_instances_by_stop)
+        for row in observed:
+            observed_by_stop[row['stop_id']] = observed_by_stop.get(row['stop_id'], 0) + row['observed_visits']
+        no_shows = dict(reports.filter(
+            stop__isnull=False, type=Observation.ObservationType.BUS_DIDNT_COME,
+        ).values('stop_id').annotate(reports=Count('id')).values_list('stop_id', 'reports'))
+        
+        # 4. Flag stops under the observation-rate threshold (one row per stop)
+        skipped_stops = []
+        for stop_id, scheduled_visits in scheduled.items():
+            if scheduled_visits < self.SKIPPED_STOP_MIN_VISITS:
+                continue
+            observed_visits = observed_by_stop.get(stop_id, 0)
+            rate = min(1.0, observed_visits / scheduled_visits)
+            
+            if rate < self.SKIPPED_STOP_MIN_RATE:
+                skipped_stops.append({
+                    'stop_id': stop_id,
+                    'observation_rate': round(rate, 2),
+                    'scheduled_visits': scheduled_visits,
+                    'observed_visits': observed_visits,
+                    'no_show_reports': no_shows.get(stop_id, 0),
+                })
+        names = dict(Stop.objects.filter(
+            stop_id__in=[row['stop_id'] for row in skipped_stops],
+        ).values_list('stop_id', 'name'))
+        for row in skipped_stops:
+            row['stop_name'] = names.get(row['stop_id'])
+        
+        # Sort by observation rate (most skipped first)
+        skipped_stops.sort(key=lambda x: x['observation_rate'])
+        
+        cache.set(cache_key, skipped_stops, timeout=self.PATTERNS_CACHE_SECONDS)
+        
+        return skipped_stops
+    
+    def _frequency_evidence(self, reports, frequencies, agency):
+        """
+        Evidence on frequency-based trips, per instance. A report at a stop
+        belongs to the instance scheduled there nearest the report; one
+        without a stop to the latest instance that had started.
+        
+        Args:
+            reports: Observations in the window (with a trip)
+            frequencies: dict trip_id -> windows (load_frequencies)
+            agency: Agency whose timezone defines the service days
+        
+        Returns:
+            (dict trip_id -> number of (service day, instance) with reports,
+             dict stop_id -> number of (trip, service day, instance) with an
+             ARRIVED or PASSED report at the stop)
+        """
+        if not frequencies:
+            return {}, {}
+        reports = reports.filter(trip_id__in=list(frequencies))
+        trip_ids = set(reports.values_list('trip_id', flat=True).distinct())
+        if not trip_ids:
+            return {}, {}
+        
+        # Arrival offset of each stop from the instance start (first visit on loops)
+        starts = dict(Trip.objects.filter(trip_id__in=trip_ids).values_list('trip_id', 'start_seconds'))
+        offsets = {}
+        for trip_id, stop_id, arrival in StopTime.objects.filter(trip_id__in=trip_ids).order_by(
+            'trip_id', 'stop_sequence'
+        ).values_list('trip_id', 'stop_id', 'arrival_seconds'):
+            if arrival is not None and starts.get(trip_id) is not None:
+                offsets.setdefault((trip_id, stop_id), arrival - starts[trip_id])
+        
+        passed = {Observation.ObservationType.BUS_ARRIVED, Observation.ObservationType.BUS_PASSED}
+        instances = {}
+        observed = {}
+        for trip_id, stop_id, obs_type, timestamp in reports.values_list(
+            'trip_id', 'stop_id', 'type', 'timestamp'
+        ).iterator(chunk_size=5000):
+            service_date, seconds = datetime_to_service_seconds(timestamp, agency.timezone)
+            windows = frequencies[trip_id]
+            offset = offsets.get((trip_id, stop_id)) if stop_id else None
+            if offset is not None:
+                start = nearest_instance_start(windows, seconds - offset)
+            else:
+                start = last_instance_start(windows, seconds)
+            if start is None:
+                continue
+            instances.setdefault(trip_id, set()).add((service_date, start))
+            if offset is not None and obs_type in passed:
+                observed.setdefault(stop_id, set()).add((trip_id, service_date, start))
+        
+        return (
+            {trip_id: len(units) for trip_id, units in instances.items()},
+            {stop_id: len(units) for stop_id, units in observed.items()},
+        )
@@ -1,10 +1,10 @@
 #!/bin/bash
-# Simple scheduler for running aggregate_delays daily at 4 AM
+# Simple scheduler for running aggregate_delays and manage_partitions daily at 4 AM
 #
 # TODO: For production, replace with Celery Beat or django-cron for more robust scheduling
 # This is a lightweight solution for development/prototyping
 
-echo "Scheduler started. Will run aggregate_delays daily at 4:00 AM (service timezone)"
+echo "Scheduler started. Will run aggregate_delays and manage_partitions daily at 4:00 AM (service timezone)"
 
 while true; do
     # Get current time
@@ -16,6 +16,12 @@ while true; do
         echo "[$(date)] Running aggregate_delays..."
         python manage.py aggregate_delays
         
+        # Export yesterday's observations and delay history for offline analytics
+        python manage.py export_parquet
+        
+        # Pre-create Observation partitions and archive expired months
+        python manage.py manage_partitions
+        
         # Sleep for 2 minutes to avoid running multiple times
         sleep 120
     fi
@@ -9,7 +9,7 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 django.setup()
 
 from rest_framework.test import APIClient
-from gtfs.models import Trip, Stop, StopTime
+from gtfs.models import Trip, Stop, StopPattern, PatternStop, PatternTiming
 from realtime.models import ActiveTrip
 from gtfs.utils.time_helpers import get_current_service_time
 
@@ -42,14 +42,13 @@ def run():
     
     # Schedule it for NOW + 30 mins
     scheduled_arrival = current_seconds + 1800
-    StopTime.objects.update_or_create(
-        trip=trip, stop=stop,
-        defaults={
-            'stop_sequence': 1,
-            'arrival_seconds': scheduled_arrival,
-            'departure_seconds': scheduled_arrival + 60
-        }
-    )
+    # Stop times are stored as pattern + timing offsets from the trip start
+    if trip.pattern is None:
+        trip.pattern = StopPattern.objects.create(stop_count=1)
+        PatternStop.objects.create(pattern=trip.pattern, position=0, stop=stop, stop_sequence=1)
+        trip.timing = PatternTiming.objects.create(pattern=trip.pattern, arrival_offsets=[-60], departure_offsets=[0])
+    trip.start_seconds = scheduled_arrival + 60
+    trip.save()
     print(f"Created/Updated Test Trip {trip.trip_id} at {stop.stop_id} for {scheduled_arrival}s")
 
     # 2. Create ActiveTrip with DELAY